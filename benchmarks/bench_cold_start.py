@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Cold-start benchmark of the stand-alone main.py extraction.
+
+A small synthetic database is extracted by main.extract in a fresh process, as
+an operator at a test station would run the executable. The wall time from
+process start to exit must stay within --budget seconds, and none of the heavy
+libraries (pandas, NumPy, pyarrow, tkinter) may be imported by the extraction.
+
+python benchmarks/bench_cold_start.py --runs 200 --budget 1.0
+
+The benchmark fails (exit code 1) when the budget is exceeded or a heavy library
+was imported. Reading the SQLite copy of the database uses the database package
+in place of pyodbc; its import is not counted in the extraction time.
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Script modules of the extractor
+SOURCE_FOLDER = Path(__file__).resolve().parents[1].joinpath("src", "ts_data_extractor")
+sys.path.insert(0, str(SOURCE_FOLDER))
+
+# Libraries the fast path must not import
+HEAVY_MODULES = ["pandas", "numpy", "pyarrow", "tkinter"]
+
+DEFAULT_BUDGET = 1.0
+
+
+def extract(db_filename, output_folder):
+    """Import main.py and extract <db_filename>; return the import and extraction times"""
+
+    start = time.perf_counter()
+    import main
+
+    imported = time.perf_counter()
+
+    # SQLite stand-in for the ODBC connection of main.connect_odbc
+    from database.backends import make_cursor, open_connection
+
+    crsr = make_cursor(open_connection(str(db_filename), "sqlite"))
+    connected = time.perf_counter()
+
+    exported = main.extract(crsr, str(output_folder))
+    finished = time.perf_counter()
+
+    return {
+        "import_s": imported - start,
+        "extract_s": finished - connected,
+        "csv_files": len(exported),
+        "heavy_modules": [name for name in HEAVY_MODULES if name in sys.modules],
+    }
+
+
+def run_benchmark(db_filename):
+    """Extract <db_filename> in a fresh process and return its measurements"""
+
+    with tempfile.TemporaryDirectory() as output_folder:
+        command = [sys.executable, __file__, "--child", str(db_filename), output_folder]
+
+        start = time.perf_counter()
+        result = subprocess.run(command, capture_output=True, text=True, check=True)
+        wall = time.perf_counter() - start
+
+    measurements = json.loads(result.stdout)
+    measurements["wall_s"] = wall
+
+    return measurements
+
+
+def check(result, budget):
+    """Return the reasons <result> fails the cold-start budget"""
+
+    failures = []
+    if result["wall_s"] > budget:
+        failures.append(f"cold start {result['wall_s']:.3f}s exceeds {budget:.3f}s")
+    if result["heavy_modules"]:
+        failures.append(f"imported {', '.join(result['heavy_modules'])}")
+
+    return failures
+
+
+def main(argv=None):
+    from bench_pipeline import database_file
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=200)
+    parser.add_argument("--steps", type=int, default=8, help="steps per UUT run")
+    parser.add_argument("--budget", type=float, default=DEFAULT_BUDGET)
+    parser.add_argument("--work", default=Path(tempfile.gettempdir(), "ts-bench"))
+    parser.add_argument("--child", nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        # Measurement process started by run_benchmark
+        print(json.dumps(extract(*args.child)))
+        return 0
+
+    Path(args.work).mkdir(parents=True, exist_ok=True)
+    db_filename = database_file(args.work, args.runs, args.steps, 1)
+    result = run_benchmark(db_filename)
+
+    print(
+        f"{args.runs:>6} runs  cold start {result['wall_s']:.3f}s  "
+        f"import {result['import_s'] * 1000:.1f}ms  "
+        f"extract {result['extract_s'] * 1000:.1f}ms  "
+        f"{result['csv_files']} CSV files"
+    )
+
+    failures = check(result, args.budget)
+    for failure in failures:
+        print(failure)
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
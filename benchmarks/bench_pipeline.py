@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Scaling benchmark of the extraction pipeline on synthetic TestStand databases.
+
+For each run count a synthetic database is generated (and kept in the work
+folder for later benchmarks), then extracted in a fresh process, reporting
+runs/sec, peak RSS and the time of each stage of the ts_db.main pipeline as
+measured by its PipelineMetrics (query_seq_calls, query_uut_runs, step_queries,
+transform and export).
+
+python benchmarks/bench_pipeline.py --runs 1000 100000 1000000 --save bench.json
+python benchmarks/bench_pipeline.py --runs 1000 100000 --baseline bench.json
+
+With --baseline, the benchmark fails (exit code 1) when the runs/sec of a run
+count drops by more than --tolerance from the saved results.
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+# Script modules of the extractor
+SOURCE_FOLDER = Path(__file__).resolve().parents[1].joinpath("src", "ts_data_extractor")
+sys.path.insert(0, str(SOURCE_FOLDER))
+
+DEFAULT_RUNS = [1000, 100000, 1000000]
+
+
+def database_file(work_folder, runs, steps_per_run, nesting_depth):
+    """Return the synthetic database of <runs> UUT runs, generating it if needed"""
+
+    from synthetic import generate_database
+
+    db_filename = Path(work_folder).joinpath(
+        f"synthetic-{runs}-{steps_per_run}-{nesting_depth}.db"
+    )
+    if not db_filename.is_file():
+        tmp_file = db_filename.with_suffix(".tmp")
+        generate_database(
+            tmp_file,
+            runs,
+            steps_per_run=steps_per_run,
+            nesting_depth=nesting_depth,
+        )
+        tmp_file.replace(db_filename)
+
+    return db_filename
+
+
+def extract(db_filename, output_folder, formats=("csv",), vectorized=False):
+    """Extract <db_filename> with ts_db.main and return its measurements"""
+
+    import ts_db
+    from file_io import PipelineMetrics
+
+    metrics = PipelineMetrics()
+    csv_file_count = ts_db.main(
+        str(db_filename),
+        output_folder=str(output_folder),
+        formats=formats,
+        vectorized=vectorized,
+        metrics=metrics,
+    )
+    report = metrics.report()
+    runs = report["stages"]["query_uut_runs"]["rows"]
+
+    return {
+        "runs": runs,
+        "csv_files": csv_file_count,
+        "seconds": report["wall_s"],
+        "runs_per_sec": runs / report["wall_s"] if report["wall_s"] else None,
+        "peak_rss_mb": (
+            report["peak_memory"] / 1024**2 if report["peak_memory"] else None
+        ),
+        "stages": {name: stage["wall_s"] for name, stage in report["stages"].items()},
+    }
+
+
+def run_benchmark(db_filename, formats=("csv",), vectorized=False):
+    """Extract <db_filename> in a fresh process and return its measurements"""
+
+    with tempfile.TemporaryDirectory() as output_folder:
+        command = [
+            sys.executable,
+            __file__,
+            "--child",
+            str(db_filename),
+            output_folder,
+            "--formats",
+            *formats,
+        ]
+        if vectorized:
+            command.append("--vectorized")
+
+        result = subprocess.run(command, capture_output=True, text=True, check=True)
+
+    return json.loads(result.stdout)
+
+
+def compare(results, baseline, tolerance):
+    """Return the run counts whose runs/sec dropped more than <tolerance> below <baseline>"""
+
+    regressions = []
+    for runs, result in results.items():
+        reference = baseline.get(str(runs))
+        if not reference or not reference.get("runs_per_sec"):
+            continue
+
+        ratio = result["runs_per_sec"] / reference["runs_per_sec"]
+        if ratio < 1 - tolerance:
+            regressions.append((runs, ratio))
+
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, nargs="+", default=DEFAULT_RUNS)
+    parser.add_argument("--steps", type=int, default=8, help="steps per UUT run")
+    parser.add_argument("--nesting", type=int, default=1, help="sequence call depth")
+    parser.add_argument("--formats", nargs="+", default=["csv"])
+    parser.add_argument("--vectorized", action="store_true")
+    parser.add_argument("--work", default=Path(tempfile.gettempdir(), "ts-bench"))
+    parser.add_argument("--save", help="save the results to this JSON file")
+    parser.add_argument("--baseline", help="compare with results saved by --save")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--child", nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        # Measurement process started by run_benchmark
+        db_filename, output_folder = args.child
+        print(
+            json.dumps(
+                extract(db_filename, output_folder, args.formats, args.vectorized)
+            )
+        )
+        return 0
+
+    Path(args.work).mkdir(parents=True, exist_ok=True)
+
+    results = {}
+    for runs in args.runs:
+        db_filename = database_file(args.work, runs, args.steps, args.nesting)
+        result = results[runs] = run_benchmark(
+            db_filename, args.formats, args.vectorized
+        )
+
+        stages = "  ".join(
+            f"{name} {seconds:.2f}s" for name, seconds in result["stages"].items()
+        )
+        print(
+            f"{runs:>9} runs  {result['runs_per_sec']:>10.0f} runs/s  "
+            f"peak {result['peak_rss_mb'] or 0:>7.1f} MiB  {stages}"
+        )
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for runs, ratio in regressions:
+            print(f"Regression at {runs} runs: {ratio:.0%} of baseline runs/sec")
+        if regressions:
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,17 +1,19 @@
 """
 USE CASE :: This is the top-level web application implementation of the python script.
             Uses custom file_io and database modules.
-            Calls the submodule ts_db.py script.
+            Calls the submodule ts_db.py script in background jobs (jobs.py).
+            Routes shared with web_app.py are in routes.py.
 """
 
 # importing the required libraries
-import pathlib
 from pathlib import Path
 
-from flask import Flask, render_template, request
-from werkzeug.utils import secure_filename
+from flask import Flask, render_template
 
-import ts_db
+from file_io import ExtractionCache
+from jobs import JobQueue
+from routes import register_routes
+from uploads import UploadSessions
 
 # Initialize the flask app
 app = Flask(__name__)
@@ -27,18 +29,25 @@ upload_folder = Path(current_working_directory).joinpath("uploads")
 if not Path.exists(upload_folder):
     Path.mkdir(upload_folder)
 
-# Set maximum size of the file
-app.config["MAX_CONTENT_LENGTH"] = 25 * 1024 * 1024
+# Set maximum size of the file; uploads are streamed to disk in chunks
+app.config["MAX_CONTENT_LENGTH"] = 4 * 1024 * 1024 * 1024
 
 # Configure the upload folder
 app.config["UPLOAD_FOLDER"] = upload_folder
 
-# Configure the allowed extensions
-allowed_extensions = ["mdb"]
+# Extractions of uploaded databases, reused when the same database is uploaded again
+extraction_cache = ExtractionCache(Path(current_working_directory).joinpath("cache"))
 
+# Extract uploaded databases in background jobs, one work folder per job
+job_queue = JobQueue(upload_folder, workers=2, cache=extraction_cache)
 
-def check_file_extension(filename):
-    return filename.split(".")[-1] in allowed_extensions
+# Resumable uploads of large databases, sent in parts
+upload_sessions = UploadSessions(
+    upload_folder, max_bytes=app.config["MAX_CONTENT_LENGTH"]
+)
+
+# Configure the allowed extensions
+allowed_extensions = ["mdb"]
 
 
 # Start page for web app
@@ -47,45 +56,9 @@ def index():
     return render_template("upload.html")
 
 
-# Result page after user selects file to upload
-@app.route("/upload", methods=["GET", "POST"])
-def upload_file():
-    if request.method == "POST":  # check if the method is post
-        f = request.files["file"]  # get the file from the files object
-
-        # Saving the file in the required destination
-        if check_file_extension(f.filename):
-            db_filepath = Path.joinpath(
-                app.config["UPLOAD_FOLDER"], secure_filename(f.filename)
-            )
-            f.save(db_filepath)  # this will secure the file
-
-            # =================================================================== #
-            # Execute core python script to decompose the TestStand database file #
-            # =================================================================== #
-            csv_file_count = ts_db.main(db_filepath)
-
-            # Purge contents of uploads folder after script is finished
-            for file in Path.iterdir(upload_folder):
-                Path.unlink(Path.joinpath(upload_folder, file))
-
-            return f"MDB has been processed:: {csv_file_count} CSV files exported to C:\\TestStand Results"
-
-        else:
-            return "The file extension is not allowed"
-
-
-# After core python script runs, display exported CSV files in dropdown menu and table
+# Uploads, extraction jobs, results and the result store (routes.py)
 output_folder = r"C:\TestStand Results"
-file_paths = []
-
-for p in pathlib.Path(output_folder).glob("*.csv"):
-    if p.is_file():
-        file_paths.append(p.resolve().as_posix())
-
-#
-# def update_table(user_select):
-#     ts_table = pd.read_csv(user_select)
+register_routes(app, job_queue, upload_sessions, output_folder, allowed_extensions)
 
 
 if __name__ == "__main__":
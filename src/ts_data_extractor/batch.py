@@ -0,0 +1,264 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+USE CASE :: Batch extraction of a directory (or glob) of TestStand databases, e.g. one per station.
+            Uses custom file_io and database modules.
+
+Each database is extracted in its own worker process. Rows of the same Sequence File
+from every database are merged into one CSV file per sequence, ordered by test start
+time and socket. UUT runs found in more than one database (copied or backed-up files)
+are exported once.
+
+Incremental batches also record the last exported test start of each station. A
+copy of a database that turns up in a later batch has no watermark of its own; its
+runs that are not newer than their station's last export are not exported again.
+Databases that cannot be extracted are reported once the others are exported.
+"""
+
+import glob
+import heapq
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from database import *
+from file_io import *
+
+# Database file patterns searched for when the source is a directory
+DATABASE_PATTERNS = ["*.mdb", "*.accdb", "*.db"]
+
+
+def find_databases(sources):
+    """Expand directories and glob patterns in <sources> to a sorted list of database files"""
+
+    if isinstance(sources, (str, Path)):
+        sources = [sources]
+
+    db_filenames = set()
+    for source in sources:
+        if Path(source).is_dir():
+            for pattern in DATABASE_PATTERNS:
+                db_filenames.update(Path(source).glob(pattern))
+        else:
+            db_filenames.update(Path(p) for p in glob.glob(str(source)))
+
+    return sorted(str(p.resolve()) for p in db_filenames if p.is_file())
+
+
+class BatchFailed(Exception):
+    """Databases of a batch that could not be extracted, {database: error}"""
+
+    def __init__(self, failures):
+        self.failures = failures
+        super().__init__(
+            "; ".join(f"{db_filename}: {e}" for db_filename, e in failures.items())
+        )
+
+
+class WatermarkRun:
+    """Picklable stand-in for the newest UUT run of a database"""
+
+    __slots__ = ("ID", "START_DATE_TIME")
+
+    def __init__(self, run):
+        self.ID = run.ID
+        self.START_DATE_TIME = run.START_DATE_TIME
+
+
+def extract_database(
+    db_filename,
+    backend,
+    watermark,
+    spill_dir,
+    vectorized=False,
+    run_filter=None,
+    all_types=False,
+):
+    """Extract one database; return its watermark runs and {sequence name: (spill path, layouts, row count)}
+
+    Only the UUT runs not exported before <watermark> (see load_watermark) are extracted.
+    """
+
+    writers = {}
+
+    with ConnectionPool().cursor(db_filename, backend) as crsr:
+        sequence_calls = query_seq_calls(crsr, run_filter)
+        seq_list = create_sequence_list(sequence_calls)
+        routes = create_sequence_routes(sequence_calls)
+        if run_filter:
+            seq_list, routes = run_filter.select_sequences(seq_list, routes)
+        since_id = watermark["ID"] if watermark else None
+        uut_runs = query_uut_runs(crsr, since_id, run_filter=run_filter)
+        uut_runs = unexported_runs(uut_runs, watermark)
+
+        iter_rows = test_row_iterator(vectorized, all_types)
+        for seq_name, record in iter_rows(
+            crsr, uut_runs, routes, run_filter=run_filter
+        ):
+            writer = writers.get(seq_name)
+            if writer is None:
+                writer = writers[seq_name] = SequenceWriter(None, spill_dir=spill_dir)
+            writer.write(record)
+
+    # Only the newest run is needed to advance the watermark; filtered extractions
+    # record every exported run instead (see save_watermark)
+    if run_filter:
+        watermark_runs = [WatermarkRun(run) for run in uut_runs]
+    else:
+        last_run = max(uut_runs, key=lambda run: run.ID, default=None)
+        watermark_runs = [] if last_run is None else [WatermarkRun(last_run)]
+
+    return watermark_runs, {
+        seq_name: writer.detach() for seq_name, writer in writers.items()
+    }
+
+
+def iter_spill_records(spill_path, layouts, source=None):
+    """Yield the RunRecords of a detached spill file of the database <source>"""
+
+    for index, values, run_id, statuses in read_spill(spill_path):
+        yield RunRecord(layouts[index], values, run_id, statuses, source)
+
+
+def run_sort_key(record):
+    """Merge order of UUT runs across databases: test start, then test socket"""
+
+    values = record.values
+    return values[0], values[3]
+
+
+def dedup_runs(records, exported=None):
+    """Drop UUT runs repeated in the merged, start-ordered <records>
+
+    <exported> maps station IDs to the test start (text) of their last exported run;
+    runs of a station that are not newer were exported by an earlier batch.
+    """
+
+    exported = exported or {}
+
+    # Duplicates share the test start, so only keys of the current start are kept
+    current_start = None
+    seen = set()
+
+    for record in records:
+        start, station, serial, socket = record.values[:4]
+        last_start = exported.get(station)
+        if last_start is not None and str(start) <= last_start:
+            continue
+
+        if start != current_start:
+            current_start = start
+            seen.clear()
+
+        key = (station, serial, socket)
+        if key in seen:
+            continue
+
+        seen.add(key)
+        yield record
+
+
+def main(
+    sources,
+    output_folder=OUTPUT_FOLDER,
+    backend=None,
+    workers=None,
+    incremental=False,
+    formats=("csv",),
+    vectorized=False,
+    run_filter=None,
+    all_types=False,
+):
+    """Extract every database of <sources> and export one merged output file per sequence
+
+    <run_filter> is a RunFilter selecting the UUT runs and steps of every database
+    <all_types> extracts the measurements of every step type, not only numeric limit tests
+
+    Raises BatchFailed, once the other databases are exported, when some could not be
+    extracted.
+    """
+
+    require_pyarrow(formats)
+    db_filenames = find_databases(sources)
+    Path(output_folder).mkdir(parents=True, exist_ok=True)
+
+    # Last exported UUT run of each database
+    watermarks = {}
+    for db_filename in db_filenames:
+        if incremental:
+            watermarks[db_filename] = load_watermark(db_filename, output_folder)
+
+    # Last exported test start of each station, for copies without a watermark;
+    # filtered batches do not export every run of a station, so they do not record it
+    track_stations = incremental and not run_filter
+    exported = load_station_watermarks(output_folder) if track_stations else {}
+    last_starts = {}
+
+    with tempfile.TemporaryDirectory() as spill_dir:
+        extracted = {}
+        failures = {}
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                db_filename: executor.submit(
+                    extract_database,
+                    db_filename,
+                    backend,
+                    watermarks.get(db_filename),
+                    spill_dir,
+                    vectorized,
+                    run_filter,
+                    all_types,
+                )
+                for db_filename in db_filenames
+            }
+
+            for db_filename, future in futures.items():
+                try:
+                    extracted[db_filename] = future.result()
+                except Exception as e:
+                    print(f"Failed {db_filename}: {e}", file=sys.stderr)
+                    failures[db_filename] = e
+
+        # Merge each sequence across databases in test start order
+        seq_names = {}
+        for db_filename, (watermark_runs, segments) in extracted.items():
+            for seq_name, segment in segments.items():
+                seq_names.setdefault(seq_name, []).append((db_filename, segment))
+
+        writers = []
+        for seq_name, segments in seq_names.items():
+            writer = SequenceWriter(
+                Path(output_folder).joinpath(seq_name + ".csv"), formats=formats
+            )
+            streams = [
+                iter_spill_records(spill_path, layouts, watermark_key(db_filename))
+                for db_filename, (spill_path, layouts, row_count) in segments
+            ]
+            records = heapq.merge(*streams, key=run_sort_key)
+            for record in dedup_runs(records, exported):
+                writer.write(record)
+                start, station = record.values[:2]
+                last_starts[station] = max(last_starts.get(station, ""), str(start))
+            writer.close()
+            writers.append(writer)
+
+    # Advance the watermarks only once the new runs are exported; filtered batches
+    # do not export every run, so they only record the runs they exported
+    for db_filename, (watermark_runs, segments) in extracted.items():
+        save_watermark(db_filename, watermark_runs, output_folder, bool(run_filter))
+    if track_stations:
+        save_station_watermarks(last_starts, output_folder)
+
+    if failures:
+        raise BatchFailed(failures)
+
+    return count_csv_files(writers)
+
+
+if __name__ == "__main__":
+    try:
+        main(import_source_folder())
+    except BatchFailed:
+        sys.exit(1)
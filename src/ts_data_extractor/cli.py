@@ -0,0 +1,268 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+USE CASE :: Headless command line extraction, e.g. scheduled or on a Linux server.
+            Uses custom file_io and database modules and the ts_db.py pipeline.
+
+Extract TestStand databases (files, directories or glob patterns) without any
+dialog, with the output folder, formats and run/step filters as arguments:
+
+python cli.py "//station1/results/*.mdb" station2.db -o /mnt/analytics --format csv parquet
+python cli.py results/ -o out --start 2024-01-01 --station STATION1 --step Vcc Icc
+python cli.py "SERVER=tsdb;DATABASE=TestStand;Trusted_Connection=yes" --backend sqlserver
+
+With --watch, the sources are polled every --interval seconds. A database whose
+modification time or size changed (and that has not been written to for --settle
+seconds) is extracted again incrementally: only its UUT runs newer than its
+watermark are appended to the outputs. Each extraction saves its run report to
+the ".reports" folder of the output folder; in watch mode, only the latest
+--keep-reports reports of each database are kept. SQL Server databases have no
+file to poll; their new runs are extracted at every poll. With filters, only the
+selected runs are extracted, each of them once (see save_watermark).
+"""
+
+import argparse
+import re
+import sys
+import time
+from pathlib import Path
+
+from database import *
+from file_io import *
+
+import ts_db
+from batch import find_databases
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument(
+        "sources",
+        nargs="+",
+        help="database files, directories or glob patterns "
+        "(ODBC connection strings with --backend sqlserver)",
+    )
+    parser.add_argument("-o", "--output", default=OUTPUT_FOLDER, help="output folder")
+    parser.add_argument(
+        "--format",
+        dest="formats",
+        nargs="+",
+        choices=OUTPUT_FORMATS,
+        default=["csv"],
+    )
+    parser.add_argument("--backend", choices=["access", "sqlserver", "sqlite"])
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="only extract UUT runs newer than the previous export (always on with --watch)",
+    )
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--vectorized", action="store_true")
+    parser.add_argument(
+        "--all-types",
+        action="store_true",
+        help="also extract pass/fail, string value and multiple numeric limit steps",
+    )
+
+    filters = parser.add_argument_group("filters")
+    filters.add_argument("--start", help="first test start date/time (ISO 8601)")
+    filters.add_argument("--end", help="test start date/time limit (ISO 8601)")
+    for name, dest in [
+        ("--station", "stations"),
+        ("--serial", "serial_numbers"),
+        ("--status", "statuses"),
+        ("--user", "users"),
+        ("--sequence-file", "sequence_files"),
+        ("--step", "step_names"),
+    ]:
+        filters.add_argument(name, dest=dest, nargs="+", action="extend", default=[])
+
+    reports = parser.add_argument_group("run reports")
+    reports.add_argument(
+        "--prometheus", action="store_true", help="also write Prometheus metrics"
+    )
+    reports.add_argument(
+        "--profile", type=float, metavar="SECONDS", help="sampling profiler interval"
+    )
+
+    watch = parser.add_argument_group("watch mode")
+    watch.add_argument("--watch", action="store_true", help="keep extracting changes")
+    watch.add_argument("--interval", type=float, default=15.0, metavar="SECONDS")
+    watch.add_argument("--settle", type=float, default=5.0, metavar="SECONDS")
+    watch.add_argument(
+        "--keep-reports",
+        type=int,
+        default=100,
+        metavar="COUNT",
+        help="run reports kept per database",
+    )
+
+    return parser
+
+
+def run_filter_of(args):
+    """RunFilter of the filter arguments, or None without filters"""
+
+    run_filter = RunFilter(
+        start=args.start,
+        end=args.end,
+        stations=args.stations,
+        serial_numbers=args.serial_numbers,
+        statuses=args.statuses,
+        users=args.users,
+        sequence_files=args.sequence_files,
+        step_names=args.step_names,
+    )
+
+    return run_filter or None
+
+
+def extract(db_filename, args, incremental=False):
+    """Extract <db_filename> with the options of <args>; return True on success"""
+
+    metrics = PipelineMetrics(args.profile)
+    started = time.time()
+
+    try:
+        csv_file_count = ts_db.main(
+            db_filename,
+            backend=args.backend,
+            incremental=incremental or args.incremental,
+            output_folder=args.output,
+            workers=args.workers,
+            formats=args.formats,
+            vectorized=args.vectorized,
+            metrics=metrics,
+            run_filter=run_filter_of(args),
+            all_types=args.all_types,
+        )
+    except Exception as e:
+        print(f"Failed {db_filename}: {e}", file=sys.stderr)
+        return False
+    finally:
+        metrics.finish()
+        metrics.save(report_file(args.output, db_filename), args.prometheus)
+
+        # Databases copied from the stations replace the file; reconnect next time
+        connection_pool.discard(db_filename)
+
+    runs = metrics.report()["stages"].get("query_uut_runs", {}).get("rows", 0)
+    print(
+        f"Extracted {db_filename}: {runs} UUT runs, {csv_file_count} CSV files "
+        f"in {time.time() - started:.1f}s"
+    )
+
+    return True
+
+
+def prune_reports(output_folder, db_filename, keep):
+    """Delete all but the <keep> latest run reports of <db_filename>"""
+
+    # Report names are "<database name>-<sortable time stamp>" (see report_file)
+    pattern = re.compile(re.escape(source_name(db_filename)) + r"-\d{8}-\d{6}")
+    report_folder = Path(output_folder).joinpath(REPORT_FOLDER)
+    names = sorted(
+        {p.stem for p in report_folder.glob("*.json") if pattern.fullmatch(p.stem)}
+    )
+    for name in names[: max(len(names) - keep, 0)]:
+        for path in report_folder.glob(f"{name}.*"):
+            path.unlink(missing_ok=True)
+
+
+def find_sources(args):
+    """Databases of the sources of <args>
+
+    SQL Server sources are ODBC connection strings (or DSNs), used as given.
+    """
+
+    if args.backend == "sqlserver":
+        return list(args.sources)
+
+    return find_databases(args.sources)
+
+
+def file_signature(db_filename):
+    """(modification time, size) of <db_filename>, or None if it is gone"""
+
+    try:
+        stat = Path(db_filename).stat()
+    except OSError:
+        return None
+
+    return stat.st_mtime_ns, stat.st_size
+
+
+def changed_databases(sources, signatures, settle=0.0):
+    """Return the databases of <sources> changed since <signatures>, with their new signatures
+
+    Databases written to in the last <settle> seconds are left for a later poll.
+    """
+
+    changed = {}
+    now = time.time_ns()
+    for db_filename in find_databases(sources):
+        signature = file_signature(db_filename)
+        if signature is None or signature == signatures.get(db_filename):
+            continue
+        if now - signature[0] < settle * 1e9:
+            continue
+        changed[db_filename] = signature
+
+    return changed
+
+
+def watch(args, passes=None):
+    """Extract the changed databases of the sources every <args.interval> seconds
+
+    Runs until interrupted, or for <passes> polls.
+    """
+
+    signatures = {}
+    count = 0
+
+    while passes is None or count < passes:
+        if args.backend == "sqlserver":
+            # Servers have no file to poll; every poll extracts their new runs
+            changed = dict.fromkeys(find_sources(args))
+        else:
+            changed = changed_databases(args.sources, signatures, args.settle)
+
+        for db_filename, signature in changed.items():
+            # Failed extractions are retried at the next poll
+            if extract(db_filename, args, incremental=True):
+                signatures[db_filename] = signature
+            prune_reports(args.output, db_filename, args.keep_reports)
+
+        count += 1
+        if passes is None or count < passes:
+            time.sleep(args.interval)
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    try:
+        require_pyarrow(args.formats)
+    except ImportError as e:
+        parser.error(str(e))
+
+    if args.watch:
+        try:
+            watch(args)
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    db_filenames = find_sources(args)
+    if not db_filenames:
+        print("No databases found", file=sys.stderr)
+        return 1
+
+    results = [extract(db_filename, args) for db_filename in db_filenames]
+
+    return 0 if all(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,3 +1,7 @@
 __version__ = "0.1.0"
 
+from .backends import *
 from .database import *
+from .filters import *
+from .layout import *
+from .vectorized import *
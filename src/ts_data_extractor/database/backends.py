@@ -0,0 +1,249 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Database connection backends and connection pooling.
+
+Supported backends -
+* access    - Microsoft Access .mdb/.accdb file through ODBC
+* sqlserver - SQL Server through ODBC; source is an ODBC connection string
+* sqlite    - SQLite file holding the default TestStand schema (e.g. an exported copy)
+
+All backends return cursors that accept qmark (?) parameters and rows that allow
+attribute access by column name (run.ID, step.STEP_NAME) and item assignment.
+"""
+
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from threading import Lock
+
+ACCESS_DRIVER = "{Microsoft Access Driver (*.mdb, *.accdb)}"
+SQL_SERVER_DRIVER = "{ODBC Driver 17 for SQL Server}"
+
+ACCESS_EXTENSIONS = [".mdb", ".accdb"]
+SQLITE_EXTENSIONS = [".db", ".sqlite", ".sqlite3"]
+
+
+class Row(list):
+    """Mutable result row with attribute access by column name"""
+
+    __slots__ = ("_columns",)
+
+    def __init__(self, columns, values):
+        super().__init__(values)
+        self._columns = columns
+
+    def __getattr__(self, name):
+        try:
+            return self[self._columns[name]]
+        except KeyError:
+            raise AttributeError(name) from None
+
+
+class SQLiteCursor:
+    """Cursor over a sqlite3 connection returning Row objects"""
+
+    def __init__(self, cnxn):
+        self.connection = cnxn
+        self._crsr = cnxn.cursor()
+        self._columns = {}
+
+    @property
+    def description(self):
+        return self._crsr.description
+
+    def execute(self, sql, params=()):
+        # sqlite3 keeps a per-connection cache of prepared statements keyed by SQL text
+        self._crsr.execute(sql, params)
+        self._columns = {
+            col[0]: i for i, col in enumerate(self._crsr.description or ())
+        }
+        return self
+
+    def fetchone(self):
+        row = self._crsr.fetchone()
+        return None if row is None else Row(self._columns, row)
+
+    def fetchmany(self, size=1):
+        columns = self._columns
+        return [Row(columns, row) for row in self._crsr.fetchmany(size)]
+
+    def fetchall(self):
+        columns = self._columns
+        return [Row(columns, row) for row in self._crsr.fetchall()]
+
+    def __iter__(self):
+        columns = self._columns
+        for row in self._crsr:
+            yield Row(columns, row)
+
+    def close(self):
+        self._crsr.close()
+
+
+def detect_backend(source):
+    """Guess the backend name from the database <source>"""
+
+    source = str(source)
+    if "DRIVER=" in source.upper() or "SERVER=" in source.upper():
+        return "sqlserver"
+
+    suffix = Path(source).suffix.lower()
+    if suffix in SQLITE_EXTENSIONS:
+        return "sqlite"
+
+    if suffix in ACCESS_EXTENSIONS:
+        return "access"
+
+    # Fall back on the file header for files without a known extension
+    try:
+        with open(source, "rb") as f:
+            if f.read(16) == b"SQLite format 3\x00":
+                return "sqlite"
+    except OSError:
+        pass
+
+    return "access"
+
+
+def connection_string(source, backend):
+    """Build the ODBC connection string for <source>"""
+
+    if backend == "access":
+        return f"DRIVER={ACCESS_DRIVER};DBQ={source};"
+
+    if backend == "sqlserver":
+        source = str(source)
+        if "DRIVER=" in source.upper():
+            return source
+        return f"DRIVER={SQL_SERVER_DRIVER};{source}"
+
+    raise ValueError(f"No ODBC connection string for backend '{backend}'")
+
+
+def _convert_datetime(value):
+    return datetime.fromisoformat(value.decode())
+
+
+def open_connection(source, backend=None):
+    """Open a new connection to <source> using <backend> (detected when None)"""
+
+    backend = backend or detect_backend(source)
+
+    if backend == "sqlite":
+        import sqlite3
+
+        sqlite3.register_converter("DATETIME", _convert_datetime)
+        sqlite3.register_converter("TIMESTAMP", _convert_datetime)
+
+        return sqlite3.connect(
+            source,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            check_same_thread=False,
+            cached_statements=256,
+        )
+
+    if backend in ("access", "sqlserver"):
+        import pyodbc
+
+        return pyodbc.connect(connection_string(source, backend))
+
+    raise ValueError(f"Unknown database backend '{backend}'")
+
+
+def make_cursor(cnxn):
+    """Return a cursor with attribute-access rows for connection <cnxn>"""
+
+    if type(cnxn).__module__ == "sqlite3":
+        return SQLiteCursor(cnxn)
+
+    # pyodbc reuses the prepared statement when the same SQL text is executed again
+    return cnxn.cursor()
+
+
+def cursor_backend(crsr):
+    """Backend name ("access", "sqlserver" or "sqlite") of the cursor <crsr>"""
+
+    cnxn = crsr.connection
+    if type(cnxn).__module__ == "sqlite3":
+        return "sqlite"
+
+    import pyodbc
+
+    dbms_name = cnxn.getinfo(pyodbc.SQL_DBMS_NAME)
+    return "sqlserver" if "SQL SERVER" in dbms_name.upper() else "access"
+
+
+class ConnectionPool:
+    """Small pool of open connections keyed by (backend, source)"""
+
+    def __init__(self, max_idle=4):
+        self.max_idle = max_idle
+        self._idle = {}
+        self._keys = {}
+        self._lock = Lock()
+
+    def acquire(self, source, backend=None):
+        """Return an idle connection to <source> or open a new one"""
+
+        key = (backend or detect_backend(source), str(source))
+
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                cnxn = idle.pop()
+                self._keys[id(cnxn)] = key
+                return cnxn
+
+        cnxn = open_connection(source, key[0])
+        with self._lock:
+            self._keys[id(cnxn)] = key
+
+        return cnxn
+
+    def release(self, cnxn):
+        """Return <cnxn> to the pool, closing it if the pool is full"""
+
+        with self._lock:
+            key = self._keys.pop(id(cnxn), None)
+            if key is not None:
+                idle = self._idle.setdefault(key, [])
+                if len(idle) < self.max_idle:
+                    idle.append(cnxn)
+                    return
+
+        cnxn.close()
+
+    def discard(self, source, backend=None):
+        """Close the idle connections to <source> (e.g. before deleting the file)"""
+
+        key = (backend or detect_backend(source), str(source))
+        with self._lock:
+            idle = self._idle.pop(key, [])
+
+        for cnxn in idle:
+            cnxn.close()
+
+    def close_all(self):
+        """Close every idle connection"""
+
+        with self._lock:
+            idle, self._idle = self._idle, {}
+
+        for connections in idle.values():
+            for cnxn in connections:
+                cnxn.close()
+
+    @contextmanager
+    def cursor(self, source, backend=None):
+        """Context manager yielding a cursor on a pooled connection"""
+
+        cnxn = self.acquire(source, backend)
+        try:
+            yield make_cursor(cnxn)
+        finally:
+            self.release(cnxn)
+
+
+# Process-wide pool shared by the extraction entry points
+connection_pool = ConnectionPool()
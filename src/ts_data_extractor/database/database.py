@@ -4,34 +4,118 @@
 Database querying, extracting, and processing.
 """
 
+from itertools import groupby
+from operator import attrgetter
+
+from .backends import cursor_backend, make_cursor, open_connection
+from .filters import with_predicates
+from .layout import METADATA_COLUMNS, build_record, layout_cache
+from .layout import measure_steps, metadata_values
+
+# Numeric step results of a single UUT run
+SQL_STEPS_BY_RUN = """
+SELECT  STEP_RESULT.ID,
+        STEP_RESULT.STEP_PARENT,
+        STEP_RESULT.STEP_NAME,
+        STEP_RESULT.STEP_TYPE,
+        STEP_RESULT.STATUS,
+        STEP_RESULT.ORDER_NUMBER,
+        PROP_RESULT.ID AS PROP_ID,
+        PROP_RESULT.TYPE_NAME,
+        PROP_RESULT.DATA,
+        PROP_RESULT.NAME,
+        PROP_NUMERICLIMIT.COMP_OPERATOR AS COP,
+        PROP_NUMERICLIMIT.HIGH_LIMIT AS HL,
+        PROP_NUMERICLIMIT.LOW_LIMIT AS LL,
+        PROP_NUMERICLIMIT.UNITS AS UNITS
+FROM (STEP_RESULT LEFT JOIN PROP_RESULT ON STEP_RESULT.ID = PROP_RESULT.STEP_RESULT)
+     LEFT JOIN PROP_NUMERICLIMIT ON PROP_RESULT.ID = PROP_NUMERICLIMIT.PROP_RESULT
+WHERE STEP_RESULT.UUT_RESULT = ?
+     and STEP_RESULT.STEP_TYPE = 'NumericLimitTest'
+     and PROP_RESULT.TYPE_NAME = 'NumericLimitTest'
+ORDER BY STEP_RESULT.ORDER_NUMBER ASC
+"""
 
-def connect_odbc(db_filename):
-    """Connect to database located at input filename"""
+# Numeric step results of a range of UUT runs, ordered for grouping by run
+SQL_RUN_STEPS = """
+SELECT  STEP_RESULT.UUT_RESULT,
+        STEP_RESULT.ID,
+        STEP_RESULT.STEP_PARENT,
+        STEP_RESULT.STEP_NAME,
+        STEP_RESULT.STEP_TYPE,
+        STEP_RESULT.STATUS,
+        STEP_RESULT.ORDER_NUMBER,
+        PROP_RESULT.TYPE_NAME,
+        PROP_RESULT.DATA,
+        PROP_NUMERICLIMIT.COMP_OPERATOR AS COP,
+        PROP_NUMERICLIMIT.HIGH_LIMIT AS HL,
+        PROP_NUMERICLIMIT.LOW_LIMIT AS LL,
+        PROP_NUMERICLIMIT.UNITS AS UNITS
+FROM (STEP_RESULT LEFT JOIN PROP_RESULT ON STEP_RESULT.ID = PROP_RESULT.STEP_RESULT)
+     LEFT JOIN PROP_NUMERICLIMIT ON PROP_RESULT.ID = PROP_NUMERICLIMIT.PROP_RESULT
+WHERE STEP_RESULT.UUT_RESULT >= ? and STEP_RESULT.UUT_RESULT <= ?
+     and STEP_RESULT.STEP_TYPE = 'NumericLimitTest'
+     and PROP_RESULT.TYPE_NAME = 'NumericLimitTest'
+ORDER BY STEP_RESULT.UUT_RESULT ASC, STEP_RESULT.ORDER_NUMBER ASC
+"""
 
-    import pyodbc
+# Measurement results of every step type, of a range of UUT runs ordered for grouping
+# by run: the numeric result of numeric limit tests, each limit-checked measurement of
+# multiple numeric limit tests and the PassFail/String result of pass/fail and string
+# value tests, in a single scan of the step results
+SQL_RUN_MEASUREMENTS = """
+SELECT  STEP_RESULT.UUT_RESULT,
+        STEP_RESULT.ID,
+        STEP_RESULT.STEP_PARENT,
+        STEP_RESULT.STEP_NAME,
+        STEP_RESULT.STEP_TYPE,
+        STEP_RESULT.STATUS,
+        STEP_RESULT.ORDER_NUMBER,
+        PROP_RESULT.NAME,
+        PROP_RESULT.TYPE_NAME,
+        PROP_RESULT.DATA,
+        PROP_NUMERICLIMIT.COMP_OPERATOR AS COP,
+        PROP_NUMERICLIMIT.HIGH_LIMIT AS HL,
+        PROP_NUMERICLIMIT.LOW_LIMIT AS LL,
+        PROP_NUMERICLIMIT.UNITS AS UNITS
+FROM (STEP_RESULT INNER JOIN PROP_RESULT ON STEP_RESULT.ID = PROP_RESULT.STEP_RESULT)
+     LEFT JOIN PROP_NUMERICLIMIT ON PROP_RESULT.ID = PROP_NUMERICLIMIT.PROP_RESULT
+WHERE STEP_RESULT.UUT_RESULT >= ? and STEP_RESULT.UUT_RESULT <= ?
+     and STEP_RESULT.STEP_TYPE IN ('NumericLimitTest', 'NI_MultipleNumericLimitTest',
+                                   'PassFailTest', 'StringValueTest')
+     and ((STEP_RESULT.STEP_TYPE = 'NumericLimitTest'
+               and PROP_RESULT.TYPE_NAME = 'NumericLimitTest')
+          or (STEP_RESULT.STEP_TYPE = 'NI_MultipleNumericLimitTest'
+               and PROP_NUMERICLIMIT.COMP_OPERATOR is not NULL)
+          or (STEP_RESULT.STEP_TYPE = 'PassFailTest' and PROP_RESULT.NAME = 'PassFail')
+          or (STEP_RESULT.STEP_TYPE = 'StringValueTest' and PROP_RESULT.NAME = 'String'))
+ORDER BY STEP_RESULT.UUT_RESULT ASC, STEP_RESULT.ORDER_NUMBER ASC, PROP_RESULT.ID ASC
+"""
 
-    # The DRIVER curly brackets are doubled up to escape themselves
-    # The DBQ curly brackets are NOT doubled up because they are placeholders
-    con_string = (
-        "DRIVER={{Microsoft Access Driver (*.mdb, *.accdb)}};" "DBQ={};"
-    ).format(db_filename)
 
-    cnxn = pyodbc.connect(con_string)
-    crsr = cnxn.cursor()
+def connect_odbc(db_filename):
+    """Connect to Access database located at input filename"""
 
-    return crsr
+    # Not pooled: the caller owns the connection for the lifetime of the cursor
+    return make_cursor(open_connection(db_filename, "access"))
 
 
-def query_seq_calls(crsr):
-    """Query Step_SeqCalls Table"""
+def query_seq_calls(crsr, run_filter=None):
+    """Query Step_SeqCalls Table (only calls of the UUT runs selected by <run_filter>)"""
 
+    # STEP_PARENT of the calling step links nested sequence calls to their caller
     sql_string2 = """
-    SELECT STEP_SEQCALL.STEP_RESULT, STEP_SEQCALL.SEQUENCE_FILE_PATH 
-    FROM STEP_SEQCALL
+    SELECT STEP_SEQCALL.STEP_RESULT, STEP_SEQCALL.SEQUENCE_FILE_PATH, STEP_RESULT.STEP_PARENT
+    FROM STEP_SEQCALL LEFT JOIN STEP_RESULT ON STEP_SEQCALL.STEP_RESULT = STEP_RESULT.ID
     ORDER BY STEP_SEQCALL.STEP_RESULT ASC
     """
 
-    crsr.execute(sql_string2)
+    params = ()
+    if run_filter:
+        predicates, params = run_filter.step_run_predicates(cursor_backend(crsr))
+        sql_string2 = with_predicates(sql_string2, predicates)
+
+    crsr.execute(sql_string2, tuple(params))
     sequence_calls = crsr.fetchall()
 
     return sequence_calls
@@ -40,19 +124,48 @@ def query_seq_calls(crsr):
 def create_sequence_list(sequence_calls):
     """Create list of tuples (x,y) mapping x = Step_Parent to y = Sequence_Name"""
 
-    from pathlib import Path
+    from pathlib import PureWindowsPath
 
-    seq_list = []
+    # Insertion-ordered dict of each unique sequence in the .mdb table
+    seq_names = {}
 
     for sequence in sequence_calls:
-        # Update raw filepaths to final table names
-        sequence[1] = "Test Data " + Path(sequence[1]).stem
+        # Update raw filepaths to final table names (TestStand logs Windows paths)
+        sequence[1] = "Test Data " + PureWindowsPath(sequence[1]).stem
+        seq_names[sequence[1]] = None
 
-        # Create list containing each unique sequence in the .mdb table
-        while sequence[1] not in seq_list:
-            seq_list.append(sequence[1])
+    return list(seq_names)
 
-    return seq_list
+
+def create_sequence_routes(sequence_calls):
+    """Map each sequence call step ID to the table name of its root sequence call
+
+    Steps are routed by their STEP_PARENT. Nested sequence calls resolve to the
+    outermost sequence call, so every step of a UUT run lands in the same table.
+    Call after create_sequence_list so that sequence names are table names.
+    """
+
+    names = {}
+    parents = {}
+    for sequence in sequence_calls:
+        names[sequence[0]] = sequence[1]
+        parents[sequence[0]] = sequence[2]
+
+    routes = {}
+    for call_id in names:
+        # Walk up to the first caller that is not itself called from a sequence call
+        chain = []
+        root = call_id
+        while root not in routes and parents[root] in names and root not in chain:
+            chain.append(root)
+            root = parents[root]
+
+        seq_name = routes.get(root, names[root])
+        routes[root] = seq_name
+        for x in chain:
+            routes[x] = seq_name
+
+    return routes
 
 
 def create_table_dict(seq_list):
@@ -67,35 +180,37 @@ def create_table_dict(seq_list):
     return tbl_dict
 
 
-def query_uut_runs(crsr):
-    """Query UUT_Results Table"""
-
-    # from tkinter import simpledialog
+def query_uut_runs(crsr, since_id=None, until_id=None, run_filter=None):
+    """Query UUT_Results Table (only runs with <since_id> < ID <= <until_id> when given)
 
-    # # Get all desired test runs filtered by start-date and optional user-name
-    # start_date = simpledialog.askstring(
-    #     "OPTIONAL FILTER",
-    #     "Enter start-date filter with format\nYYYY-MM-DD HH:mm\n(leave blank to get all dates) ::",
-    # )
-    # user_name = simpledialog.askstring(
-    #     "OPTIONAL FILTER", "Enter user-name filter\n(leave blank to get all users) ::"
-    # )
+    <run_filter> is a RunFilter whose date, station, serial number, status, user and
+    sequence file predicates are added to the query
+    """
 
     sql_string = (
         "SELECT ID, STATION_ID, START_DATE_TIME, EXECUTION_TIME, TEST_SOCKET_INDEX, UUT_SERIAL_NUMBER, UUT_STATUS "
         "FROM UUT_RESULT "
         "WHERE UUT_STATUS <> 'Terminated' and STATION_ID is not NULL"
     )
-    #
-    # if start_date:
-    #     sql_string += " WHERE START_DATE_TIME >= #{}#".format(start_date)
-    #
-    # if user_name:
-    #     sql_string += " AND USER_LOGIN_NAME = '{}'".format(user_name)
+
+    params = ()
+    if since_id is not None:
+        sql_string += " AND ID > ?"
+        params += (since_id,)
+
+    if until_id is not None:
+        sql_string += " AND ID <= ?"
+        params += (until_id,)
+
+    if run_filter:
+        predicates, filter_params = run_filter.run_predicates(cursor_backend(crsr))
+        for predicate in predicates:
+            sql_string += f" AND {predicate}"
+        params += tuple(filter_params)
 
     sql_string += " ORDER BY START_DATE_TIME, TEST_SOCKET_INDEX"
 
-    crsr.execute(sql_string)
+    crsr.execute(sql_string, params)
     uut_runs = crsr.fetchall()
 
     return uut_runs
@@ -104,106 +219,166 @@ def query_uut_runs(crsr):
 def generate_test_table(crsr, uut_runs, tbl_dict, sequence_calls):
     """Construct Test Results Data Table"""
 
+    routes = create_sequence_routes(sequence_calls)
+
     for run in uut_runs:
         # Identifying Metadata for each Test Run
-        data = {
-            "Test Start": run.START_DATE_TIME,
-            "Station ID": run.STATION_ID,
-            "Serial Number": run.UUT_SERIAL_NUMBER,
-            "Test Socket": run.TEST_SOCKET_INDEX,
-            "Test Status": run.UUT_STATUS,
-            "Test Time (s)": round(run.EXECUTION_TIME, None),
-        }
+        data = run_metadata(run)
 
         # Query individual step results inside each Test Run
-        crsr.execute(
-            f"""
-                    SELECT  STEP_RESULT.ID, 
-                            STEP_RESULT.STEP_PARENT, 
-                            STEP_RESULT.STEP_NAME, 
-                            STEP_RESULT.STEP_TYPE, 
-                            STEP_RESULT.STATUS, 
-                            STEP_RESULT.ORDER_NUMBER,
-                            PROP_RESULT.ID AS PROP_ID, 
-                            PROP_RESULT.TYPE_NAME, 
-                            PROP_RESULT.DATA, 
-                            PROP_RESULT.NAME,
-                            PROP_NUMERICLIMIT.COMP_OPERATOR AS COP, 
-                            PROP_NUMERICLIMIT.HIGH_LIMIT AS HL, 
-                            PROP_NUMERICLIMIT.LOW_LIMIT AS LL, 
-                            PROP_NUMERICLIMIT.UNITS AS UNITS
-                    FROM (STEP_RESULT LEFT JOIN PROP_RESULT ON STEP_RESULT.ID = PROP_RESULT.STEP_RESULT)
-                         LEFT JOIN PROP_NUMERICLIMIT ON PROP_RESULT.ID = PROP_NUMERICLIMIT.PROP_RESULT
-                    WHERE STEP_RESULT.UUT_RESULT = {run.ID} 
-                         and STEP_RESULT.STEP_TYPE = 'NumericLimitTest' 
-                         and PROP_RESULT.TYPE_NAME = 'NumericLimitTest'
-                    ORDER BY STEP_RESULT.ORDER_NUMBER ASC
-                    """
-        )
+        crsr.execute(SQL_STEPS_BY_RUN, (run.ID,))
         run_steps = crsr.fetchall()
 
         # Extract, construct, and append Test Data values to key-defined Test Data Tables
-        for step in run_steps:
-            # Convert data to Python types
-            val = None
-            if step.TYPE_NAME == "Boolean":
-                val = bool(step.DATA)
-
-            elif step.TYPE_NAME == "Number" or step.TYPE_NAME == "NumericLimitTest":
-                try:
-                    val = float(step.DATA)
-                except ValueError:
-                    print("Data is not a valid number.")
-
-            # Extract desired data
-            if (
-                step.STEP_TYPE == "NumericLimitTest"
-                and step.STATUS != "Skipped"
-                and val is not None
-            ):
-                # Construct limit info string based on comparison type
-                if step.COP == "LT":
-                    limit_info = f"< {step.LL}"
-                elif step.COP == "LE":
-                    limit_info = f"<= {step.LL}"
-                elif step.COP == "GT":
-                    limit_info = f"> {step.LL}"
-                elif step.COP == "GE":
-                    limit_info = f">= {step.LL}"
-                elif step.COP == "GTLT":
-                    limit_info = f"{step.LL} < x < {step.HL}"
-                elif step.COP == "GELE":
-                    limit_info = f"{step.LL} <= x <= {step.HL}"
-                elif step.COP == "EQT":
-                    limit_info = f"{step.LL} <= x <= {step.HL}"
-                elif step.COP == "EQ":
-                    limit_info = f" == {step.LL}"
-                else:
-                    break
-
-                # Different step runs will have repeated step name.
-                repeat_index = 0
-                key_name = (
-                    f"{step.STEP_NAME} ({step.UNITS}) {limit_info} [{repeat_index}]"
-                )
-
-                # Append numeric suffix to distinguish.
-                while key_name in data:
-                    repeat_index += 1
-                    key_name = (
-                        f"{step.STEP_NAME} ({step.UNITS}) {limit_info} [{repeat_index}]"
-                    )
-
-                # Add new key-value pair with precision of 3 decimal places
-                data[key_name] = round(val, 3)
-
-        # Convert STEP_PARENT index to the corresponding sequence file dictionary value
-        dict_val = ""
-        for x, y in sequence_calls:
-            if x == step.STEP_PARENT:
-                dict_val = y
+        add_step_values(data, run_steps)
 
         # Append data to the appropriate output table according to dictionary value
-        tbl_dict[f"{dict_val}"].append(data)
+        seq_name = route_run(routes, run_steps)
+        if seq_name is not None:
+            tbl_dict[f"{seq_name}"].append(data)
 
     # print("---- Test Data generated ----")
+
+
+def generate_test_table_bulk(
+    crsr, uut_runs, tbl_dict, sequence_calls, chunk_size=2000, fetch_size=5000
+):
+    """Construct Test Results Data Table with one step query per chunk of UUT runs"""
+
+    routes = create_sequence_routes(sequence_calls)
+
+    for seq_name, record in iter_test_rows(
+        crsr, uut_runs, routes, chunk_size, fetch_size
+    ):
+        tbl_dict[f"{seq_name}"].append(record.as_dict())
+
+
+def iter_test_rows(
+    crsr,
+    uut_runs,
+    routes,
+    chunk_size=2000,
+    fetch_size=5000,
+    run_filter=None,
+    all_types=False,
+):
+    """Yield (sequence name, RunRecord) for each finished UUT run, in <uut_runs> order
+
+    <routes> is the routing table built by create_sequence_routes
+    <run_filter> restricts the step query to the selected runs and step names
+    <all_types> extracts the measurements of every step type, not only numeric limit tests
+    """
+
+    def build_chunk(chunk):
+        run_ids = {run.ID for run in chunk}
+
+        # Group step rows by UUT run (rows arrive ordered by UUT_RESULT, ORDER_NUMBER)
+        steps_by_run = {}
+        rows = iter_fetchmany(
+            query_run_steps(crsr, chunk[0].ID, chunk[-1].ID, run_filter, all_types),
+            fetch_size,
+        )
+        for run_id, run_steps in groupby(rows, key=attrgetter("UUT_RESULT")):
+            if run_id in run_ids:
+                steps_by_run[run_id] = list(run_steps)
+
+        records = {}
+        for run in chunk:
+            run_steps = steps_by_run.pop(run.ID, None)
+            if not run_steps:
+                # Runs without measurement steps cannot be routed to a sequence file
+                continue
+
+            seq_name = route_run(routes, run_steps)
+            if seq_name is not None:
+                records[run.ID] = seq_name, build_record(run, run_steps)
+
+        return records
+
+    yield from iter_chunks_in_order(uut_runs, chunk_size, build_chunk)
+
+
+def iter_chunks_in_order(uut_runs, chunk_size, build_chunk):
+    """Yield the results of <build_chunk> for chunks of <uut_runs> by ID, in <uut_runs> order
+
+    The UUT runs are ordered by start time, but each step query covers the ID range
+    of one chunk: the runs are chunked in ID order so that the ranges stay dense when
+    IDs are not in start time order (merged or restored databases, identity gaps).
+    <build_chunk> maps a chunk of runs (ascending IDs) to {run ID: result}; results
+    are only held back until the runs before them in <uut_runs> are built.
+    """
+
+    if not chunk_size:
+        chunk_size = max(len(uut_runs), 1)
+
+    runs_by_id = sorted(uut_runs, key=attrgetter("ID"))
+    results = {}
+    position = 0
+
+    for i in range(0, len(runs_by_id), chunk_size):
+        chunk = runs_by_id[i : i + chunk_size]
+        results.update(build_chunk(chunk))
+
+        # Every run with an ID up to the end of this chunk is built
+        last_id = chunk[-1].ID
+        while position < len(uut_runs) and uut_runs[position].ID <= last_id:
+            result = results.pop(uut_runs[position].ID, None)
+            position += 1
+            if result is not None:
+                yield result
+
+
+def query_run_steps(crsr, first_id, last_id, run_filter=None, all_types=False):
+    """Query numeric step results of all UUT runs with IDs in [first_id, last_id]
+
+    Only steps of the runs and step names selected by <run_filter> are returned.
+    With <all_types>, the measurements of every step type are returned instead.
+    """
+
+    sql_string = SQL_RUN_MEASUREMENTS if all_types else SQL_RUN_STEPS
+    params = (first_id, last_id)
+    if run_filter:
+        predicates, filter_params = run_filter.step_predicates(cursor_backend(crsr))
+        sql_string = with_predicates(sql_string, predicates)
+        params += tuple(filter_params)
+
+    crsr.execute(sql_string, params)
+
+    return crsr
+
+
+def iter_fetchmany(crsr, fetch_size=5000):
+    """Yield rows of the executed query in batches of <fetch_size>"""
+
+    while True:
+        rows = crsr.fetchmany(fetch_size)
+        if not rows:
+            break
+        yield from rows
+
+
+def run_metadata(run):
+    """Identifying Metadata for a Test Run"""
+
+    return dict(zip(METADATA_COLUMNS, metadata_values(run)))
+
+
+def add_step_values(data, run_steps):
+    """Add the measurements of <run_steps> to <data> and return the last step processed"""
+
+    signature, values, statuses, step = measure_steps(run_steps)
+    layout = layout_cache.get(signature)
+    data.update(zip(layout.columns[len(METADATA_COLUMNS) :], values))
+
+    return step
+
+
+def route_run(routes, run_steps):
+    """Return the table name of the UUT run made of <run_steps>, or None if it cannot be routed"""
+
+    for step in run_steps:
+        seq_name = routes.get(step.STEP_PARENT)
+        if seq_name is not None:
+            return seq_name
+
+    return None
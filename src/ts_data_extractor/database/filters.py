@@ -0,0 +1,261 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Selection of the UUT runs and steps to extract, pushed down to the database.
+
+A RunFilter adds parameterized predicates to the UUT run, sequence call and step
+queries, so the database only returns the selected rows:
+
+* start, end - test start date range (start included, end excluded)
+* stations, statuses, users - STATION_ID, UUT_STATUS and USER_LOGIN_NAME values
+* serial_numbers - serial number patterns; "*" matches any characters, "?" one
+  (other characters, LIKE wildcards included, match themselves)
+* sequence_files - sequence files (file names, with or without ".seq") whose runs are
+  extracted; a run is selected by the root sequence call it is routed to, so sequence
+  files only ever called from other sequence files select no runs
+* step_names - allowlist of the step names, and so the measurement columns, extracted
+"""
+
+import datetime
+from pathlib import PureWindowsPath
+
+# Escape character of the SQLite LIKE patterns. Access (Jet/ACE) SQL has no ESCAPE
+# clause; its patterns, and those of SQL Server, escape wildcards in brackets ("[%]")
+LIKE_ESCAPE = "\\"
+
+# Fields of a RunFilter holding lists of values
+LIST_FIELDS = (
+    "stations",
+    "serial_numbers",
+    "statuses",
+    "users",
+    "sequence_files",
+    "step_names",
+)
+
+
+def parse_datetime(value):
+    """Return <value> (datetime, date or ISO 8601 string) as a datetime, or None"""
+
+    if value is None or value == "":
+        return None
+    if isinstance(value, datetime.datetime):
+        return value
+    if isinstance(value, datetime.date):
+        return datetime.datetime(value.year, value.month, value.day)
+
+    return datetime.datetime.fromisoformat(str(value))
+
+
+def escape_like(text, backend=None):
+    """Escape the LIKE wildcards in <text> for the <backend> SQL dialect
+
+    SQLite patterns escape with LIKE_ESCAPE (see like_predicate); the others in brackets.
+    """
+
+    if backend == "sqlite":
+        for char in (LIKE_ESCAPE, "%", "_"):
+            text = text.replace(char, LIKE_ESCAPE + char)
+        return text
+
+    # "[" first, so the brackets of the other escapes are not escaped again
+    for char in ("[", "%", "_"):
+        text = text.replace(char, f"[{char}]")
+
+    return text
+
+
+def like_pattern(pattern, backend=None):
+    """Translate a "*"/"?" wildcard pattern to a SQL LIKE pattern for <backend>"""
+
+    return escape_like(pattern, backend).replace("*", "%").replace("?", "_")
+
+
+def like_predicate(column, backend=None):
+    """Return the LIKE predicate of <column> for patterns escaped for <backend>"""
+
+    if backend == "sqlite":
+        return f"{column} LIKE ? ESCAPE '{LIKE_ESCAPE}'"
+
+    return f"{column} LIKE ?"
+
+
+def sequence_file_stem(name):
+    """Sequence file name of a path or name, without the ".seq" extension"""
+
+    stem = PureWindowsPath(name).name
+    if stem.lower().endswith(".seq"):
+        stem = stem[:-4]
+
+    return stem
+
+
+def sql_placeholders(values):
+    return ", ".join("?" * len(values))
+
+
+def with_predicates(sql_string, predicates):
+    """Add <predicates> to the WHERE clause of <sql_string>, before its ORDER BY"""
+
+    if not predicates:
+        return sql_string
+
+    head, order_by, order = sql_string.rpartition("ORDER BY")
+    if not order_by:
+        head, order = sql_string, ""
+
+    keyword = "and" if "WHERE" in head.upper() else "WHERE"
+    clause = "\n     and ".join(predicates)
+
+    return f"{head.rstrip()}\n     {keyword} {clause}\n{order_by}{order}"
+
+
+class RunFilter:
+    """UUT runs and steps selected for extraction"""
+
+    def __init__(
+        self,
+        start=None,
+        end=None,
+        stations=(),
+        serial_numbers=(),
+        statuses=(),
+        users=(),
+        sequence_files=(),
+        step_names=(),
+    ):
+        self.start = parse_datetime(start)
+        self.end = parse_datetime(end)
+        self.stations = tuple(stations)
+        self.serial_numbers = tuple(serial_numbers)
+        self.statuses = tuple(statuses)
+        self.users = tuple(users)
+        self.sequence_files = tuple(sequence_file_stem(name) for name in sequence_files)
+        self.step_names = tuple(step_names)
+
+    def __bool__(self):
+        return bool(self.run_predicates()[0] or self.step_names)
+
+    def __repr__(self):
+        return f"RunFilter({self.as_dict()})"
+
+    @classmethod
+    def from_dict(cls, data):
+        """RunFilter of a dict of field values (e.g. parsed JSON or request arguments)"""
+
+        fields = {}
+        for name in ("start", "end"):
+            fields[name] = data.get(name)
+        for name in LIST_FIELDS:
+            values = data.get(name) or ()
+            fields[name] = [values] if isinstance(values, str) else values
+
+        return cls(**fields)
+
+    def as_dict(self):
+        data = {
+            "start": self.start.isoformat() if self.start else None,
+            "end": self.end.isoformat() if self.end else None,
+        }
+        for name in LIST_FIELDS:
+            data[name] = list(getattr(self, name))
+
+        return data
+
+    def run_predicates(self, backend=None):
+        """Return the predicates on UUT_RESULT columns and their parameters
+
+        <backend> is the SQL dialect of the LIKE patterns (see escape_like)
+        """
+
+        predicates = []
+        params = []
+
+        if self.start is not None:
+            predicates.append("UUT_RESULT.START_DATE_TIME >= ?")
+            params.append(self.start)
+        if self.end is not None:
+            predicates.append("UUT_RESULT.START_DATE_TIME < ?")
+            params.append(self.end)
+
+        for column, values in [
+            ("UUT_RESULT.STATION_ID", self.stations),
+            ("UUT_RESULT.UUT_STATUS", self.statuses),
+            ("UUT_RESULT.USER_LOGIN_NAME", self.users),
+        ]:
+            if values:
+                predicates.append(f"{column} IN ({sql_placeholders(values)})")
+                params.extend(values)
+
+        if self.serial_numbers:
+            patterns = " or ".join(
+                like_predicate("UUT_RESULT.UUT_SERIAL_NUMBER", backend)
+                for _ in self.serial_numbers
+            )
+            predicates.append(f"({patterns})")
+            params.extend(
+                like_pattern(pattern, backend) for pattern in self.serial_numbers
+            )
+
+        if self.sequence_files:
+            # Runs whose root sequence call (not called from another sequence call,
+            # see create_sequence_routes) is one of the sequence files
+            patterns = " or ".join(
+                like_predicate("STEP_SEQCALL.SEQUENCE_FILE_PATH", backend)
+                for _ in self.sequence_files
+            )
+            predicates.append(
+                "UUT_RESULT.ID IN (SELECT STEP_RESULT.UUT_RESULT "
+                "FROM STEP_SEQCALL INNER JOIN STEP_RESULT "
+                "ON STEP_SEQCALL.STEP_RESULT = STEP_RESULT.ID "
+                f"WHERE ({patterns}) "
+                "and NOT EXISTS (SELECT CALLER.STEP_RESULT FROM STEP_SEQCALL AS CALLER "
+                "WHERE CALLER.STEP_RESULT = STEP_RESULT.STEP_PARENT))"
+            )
+            params.extend(
+                f"%{escape_like(stem, backend)}.seq" for stem in self.sequence_files
+            )
+
+        return predicates, params
+
+    def step_run_predicates(self, backend=None):
+        """Return predicates selecting the STEP_RESULT rows of the selected runs"""
+
+        predicates, params = self.run_predicates(backend)
+        if not predicates:
+            return [], []
+
+        where = " and ".join(predicates)
+        return [
+            "STEP_RESULT.UUT_RESULT IN "
+            f"(SELECT UUT_RESULT.ID FROM UUT_RESULT WHERE {where})"
+        ], params
+
+    def step_predicates(self, backend=None):
+        """Return predicates selecting the measurement steps of the selected runs"""
+
+        predicates, params = self.step_run_predicates(backend)
+        if self.step_names:
+            predicates.append(
+                f"STEP_RESULT.STEP_NAME IN ({sql_placeholders(self.step_names)})"
+            )
+            params = params + list(self.step_names)
+
+        return predicates, params
+
+    def select_sequences(self, seq_list, routes):
+        """Return <seq_list> and <routes> restricted to the selected sequence files"""
+
+        if not self.sequence_files:
+            return seq_list, routes
+
+        # Table names are "Test Data <sequence file name>" (see create_sequence_list)
+        selected = {f"Test Data {stem}".lower() for stem in self.sequence_files}
+        seq_list = [seq_name for seq_name in seq_list if seq_name.lower() in selected]
+        routes = {
+            call_id: seq_name
+            for call_id, seq_name in routes.items()
+            if seq_name.lower() in selected
+        }
+
+        return seq_list, routes
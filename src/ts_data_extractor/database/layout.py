@@ -0,0 +1,222 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Column layouts of the test results tables.
+
+A UUT run is reduced to its step signature - the (step name, units, comparison
+operator, low limit, high limit) of each measurement in execution order - and a
+tuple of values. Test programs rarely change, so the column names of a signature
+are built once and shared by every run with the same signature.
+
+Numeric limit tests give float values. Multiple numeric limit tests give one
+float column per measurement, named "<step name>.<measurement name>". Pass/fail
+tests give bool values, and string value tests give str values. Their pseudo
+comparison types are "PASSFAIL" and "STRING", and they have no units or limits.
+"""
+
+# Identifying Metadata columns of each Test Run
+METADATA_COLUMNS = (
+    "Test Start",
+    "Station ID",
+    "Serial Number",
+    "Test Socket",
+    "Test Status",
+    "Test Time (s)",
+)
+
+# Limit info string for each comparison type
+LIMIT_FORMATS = {
+    "LT": "< {LL}",
+    "LE": "<= {LL}",
+    "GT": "> {LL}",
+    "GE": ">= {LL}",
+    "GTLT": "{LL} < x < {HL}",
+    "GELE": "{LL} <= x <= {HL}",
+    "EQT": "{LL} <= x <= {HL}",
+    "EQ": " == {LL}",
+}
+
+# Step types with measurements
+NUMERIC_LIMIT_TEST = "NumericLimitTest"
+MULTI_NUMERIC_LIMIT_TEST = "NI_MultipleNumericLimitTest"
+PASS_FAIL_TEST = "PassFailTest"
+STRING_VALUE_TEST = "StringValueTest"
+
+# Pseudo comparison types of pass/fail and string value measurements
+PASS_FAIL = "PASSFAIL"
+STRING_VALUE = "STRING"
+
+# Column suffix and output column type of the measurements of each pseudo comparison type
+VALUE_FORMATS = {PASS_FAIL: "(Pass/Fail)", STRING_VALUE: "(String)"}
+VALUE_TYPES = {PASS_FAIL: "bool", STRING_VALUE: "string"}
+
+
+class ColumnLayout:
+    """Column names of one step signature, metadata columns first"""
+
+    __slots__ = ("columns", "measurements", "column_types")
+
+    def __init__(self, signature):
+        columns = list(METADATA_COLUMNS)
+        measurements = []
+        column_types = {}
+
+        # Different step runs will have repeated step name; count them to append a suffix
+        repeat_count = {}
+        for step_name, units, cop, ll, hl in signature:
+            value_format = VALUE_FORMATS.get(cop)
+            if value_format is None:
+                limit_info = LIMIT_FORMATS[cop].format(LL=ll, HL=hl)
+                base_name = f"{step_name} ({units}) {limit_info}"
+            else:
+                base_name = f"{step_name} {value_format}"
+            repeat_index = repeat_count.get(base_name, 0)
+            repeat_count[base_name] = repeat_index + 1
+
+            column = f"{base_name} [{repeat_index}]"
+            columns.append(column)
+            measurements.append((step_name, units, cop, ll, hl, repeat_index))
+            if cop in VALUE_TYPES:
+                column_types[column] = VALUE_TYPES[cop]
+
+        self.columns = tuple(columns)
+        self.measurements = tuple(measurements)
+        # Type of the measurement columns not holding floats
+        self.column_types = column_types
+
+
+class RunRecord:
+    """Row of a test results table: a shared layout and a tuple of values
+
+    <run_id> is the UUT_RESULT ID and <statuses> the step status of each measurement.
+    <source> identifies the database of the run when rows of several are merged.
+    """
+
+    __slots__ = ("layout", "values", "run_id", "statuses", "source")
+
+    def __init__(self, layout, values, run_id=None, statuses=(), source=None):
+        self.layout = layout
+        self.values = values
+        self.run_id = run_id
+        self.statuses = statuses
+        self.source = source
+
+    def as_dict(self):
+        return dict(zip(self.layout.columns, self.values))
+
+
+class LayoutCache:
+    """Map step signatures to their column layouts"""
+
+    def __init__(self, max_size=4096):
+        self.max_size = max_size
+        self._layouts = {}
+
+    def get(self, signature):
+        layout = self._layouts.get(signature)
+        if layout is None:
+            # Start over rather than grow without bound on ever-changing test programs
+            if len(self._layouts) >= self.max_size:
+                self._layouts.clear()
+            layout = self._layouts[signature] = ColumnLayout(signature)
+
+        return layout
+
+
+# Process-wide cache shared by the extraction entry points
+layout_cache = LayoutCache()
+
+
+def metadata_values(run):
+    """Identifying Metadata values for a Test Run, in METADATA_COLUMNS order"""
+
+    return (
+        run.START_DATE_TIME,
+        run.STATION_ID,
+        run.UUT_SERIAL_NUMBER,
+        run.TEST_SOCKET_INDEX,
+        run.UUT_STATUS,
+        round(run.EXECUTION_TIME, None),
+    )
+
+
+def parse_bool(data):
+    """Boolean value of the DATA of a step result ("True"/"False" text or a number)"""
+
+    if isinstance(data, str):
+        return data.strip().lower() in ("true", "1", "-1")
+
+    return bool(data)
+
+
+def step_value(step):
+    """Convert the DATA of <step> to a Python value according to its TYPE_NAME, or None"""
+
+    if step.TYPE_NAME == "Boolean":
+        return parse_bool(step.DATA)
+    if step.TYPE_NAME == "String":
+        return step.DATA
+
+    try:
+        return float(step.DATA)
+    except (TypeError, ValueError):
+        print("Data is not a valid number.")
+        return None
+
+
+def measure_steps(run_steps):
+    """Return the step signature, measured values, step statuses and last step processed of <run_steps>"""
+
+    signature = []
+    values = []
+    statuses = []
+    step = None
+
+    for step in run_steps:
+        if step.STATUS == "Skipped":
+            continue
+
+        step_type = step.STEP_TYPE
+        if step_type == NUMERIC_LIMIT_TEST or step_type == MULTI_NUMERIC_LIMIT_TEST:
+            # Convert data to Python types
+            val = step_value(step)
+            if val is None or isinstance(val, str):
+                continue
+
+            # Unknown comparison types end the run's measurements
+            if step.COP not in LIMIT_FORMATS:
+                break
+
+            step_name = step.STEP_NAME
+            if step_type == MULTI_NUMERIC_LIMIT_TEST:
+                step_name = f"{step_name}.{step.NAME}"
+            signature.append((step_name, step.UNITS, step.COP, step.LL, step.HL))
+
+            # Precision of 3 decimal places
+            values.append(round(val, 3))
+
+        elif step_type == PASS_FAIL_TEST:
+            signature.append((step.STEP_NAME, None, PASS_FAIL, None, None))
+            values.append(parse_bool(step.DATA))
+
+        elif step_type == STRING_VALUE_TEST and step.DATA is not None:
+            signature.append((step.STEP_NAME, None, STRING_VALUE, None, None))
+            values.append(str(step.DATA))
+
+        else:
+            continue
+
+        statuses.append(step.STATUS)
+
+    return tuple(signature), values, statuses, step
+
+
+def build_record(run, run_steps, cache=layout_cache):
+    """Return the RunRecord of <run> made of <run_steps>"""
+
+    signature, values, statuses, step = measure_steps(run_steps)
+    layout = cache.get(signature)
+
+    return RunRecord(
+        layout, metadata_values(run) + tuple(values), run.ID, tuple(statuses)
+    )
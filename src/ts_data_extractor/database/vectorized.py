@@ -0,0 +1,228 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Vectorized transform of step results with pandas/NumPy.
+
+The step rows of each chunk of UUT runs are loaded into one DataFrame. Type
+conversion, skipped-step filtering, comparison type checks and rounding are done
+as column operations; only the grouping of the measurements into one RunRecord per
+UUT run is done in Python.
+
+Produces the same rows as iter_test_rows, except that values are rounded with
+NumPy (round half to even on the binary value), which can differ from Python's
+round() in the last decimal for values exactly halfway between.
+"""
+
+from functools import partial
+
+from .database import iter_chunks_in_order, query_run_steps
+from .layout import LIMIT_FORMATS, RunRecord, layout_cache, metadata_values
+from .layout import parse_bool
+
+# Columns identifying a measurement column of the wide table (with its order in the run)
+KEY_COLUMNS = ["STEP_NAME", "UNITS", "COP", "LL", "HL"]
+
+
+def load_run_steps(crsr, first_id, last_id, run_filter=None):
+    """Return the step results of UUT runs with IDs in [first_id, last_id] as a DataFrame"""
+
+    import pandas as pd
+
+    query_run_steps(crsr, first_id, last_id, run_filter)
+    columns = [col[0] for col in crsr.description]
+    rows = crsr.fetchall()
+    steps = pd.DataFrame.from_records(rows, columns=columns)
+
+    # Keep NULL DATA apart from NaN (a float column would hold both as NaN)
+    data = columns.index("DATA")
+    steps["DATA"] = pd.Series([row[data] for row in rows], dtype=object)
+
+    return steps
+
+
+def transform_steps(steps):
+    """Return the measured rows of <steps> with a VALUE column, in UUT_RESULT/ORDER_NUMBER order"""
+
+    import pandas as pd
+
+    run_ids = steps["UUT_RESULT"]
+
+    # Convert data to Python types
+    type_name = steps["TYPE_NAME"]
+    is_boolean = type_name == "Boolean"
+    numeric = pd.to_numeric(steps["DATA"], errors="coerce")
+    is_number = numeric.notna()
+
+    # NaN is a number, as for float() in the scalar path; NULL and text are not
+    missing = ~is_number
+    if missing.any():
+        is_number[missing] = [is_float(data) for data in steps.loc[missing, "DATA"]]
+
+    has_value = (type_name.isin(["Number", "NumericLimitTest"]) & is_number) | (
+        is_boolean
+    )
+
+    # Extract desired data
+    keep = (
+        (steps["STEP_TYPE"] == "NumericLimitTest")
+        & (steps["STATUS"] != "Skipped")
+        & has_value
+    )
+
+    # Unknown comparison types end the run's measurements
+    unknown = keep & ~steps["COP"].isin(list(LIMIT_FORMATS))
+    stopped = unknown.groupby(run_ids, sort=False).cummax()
+    keep &= ~stopped
+
+    # Precision of 3 decimal places
+    value = numeric.round(3).astype(object)
+    # Booleans as in the scalar path: "True"/"False" text or a number, written as 1/0
+    if is_boolean.any():
+        booleans = steps.loc[is_boolean, "DATA"].map(parse_bool)
+        value[is_boolean] = [int(val) for val in booleans]
+
+    measured = steps.loc[keep, ["UUT_RESULT", *KEY_COLUMNS, "STATUS"]]
+    measured = measured.astype(object).where(measured.notna(), None)
+    measured["VALUE"] = value[keep]
+
+    return measured
+
+
+def is_float(data):
+    """True if the DATA of a step result converts to a float (see step_value)"""
+
+    try:
+        float(data)
+    except (TypeError, ValueError):
+        return False
+
+    return True
+
+
+class SignatureCodes:
+    """Stable integer codes for the (step name, units, operator, limits) of measurements"""
+
+    def __init__(self):
+        self.codes = {}
+        self.keys = []
+
+    def encode(self, measured):
+        """Return the code of each row of <measured> as a NumPy array"""
+
+        import numpy as np
+
+        # Codes local to this chunk, in order of first appearance
+        local_codes = measured.groupby(KEY_COLUMNS, sort=False, dropna=False).ngroup()
+        unique_keys = measured[KEY_COLUMNS].drop_duplicates()
+
+        global_codes = np.array(
+            [self.code(key) for key in unique_keys.itertuples(index=False, name=None)],
+            dtype=np.int64,
+        )
+
+        return global_codes[local_codes.to_numpy()]
+
+    def code(self, key):
+        code = self.codes.get(key)
+        if code is None:
+            code = self.codes[key] = len(self.keys)
+            self.keys.append(key)
+
+        return code
+
+    def signature(self, codes):
+        """Return the step signature of a run with measurement <codes>"""
+
+        return tuple(self.keys[code] for code in codes)
+
+
+def group_measurements(measured, signature_codes):
+    """Map each UUT run ID to its (measurement codes, values, statuses)"""
+
+    import numpy as np
+
+    if measured.empty:
+        return {}
+
+    codes = signature_codes.encode(measured).tolist()
+    values = measured["VALUE"].tolist()
+    statuses = measured["STATUS"].tolist()
+
+    # Rows are ordered by UUT run; find where each run's rows start and end
+    run_ids = measured["UUT_RESULT"].to_numpy()
+    starts = np.flatnonzero(np.r_[True, run_ids[1:] != run_ids[:-1]])
+    ends = np.r_[starts[1:], len(run_ids)]
+
+    return {
+        run_id: (tuple(codes[s:e]), tuple(values[s:e]), tuple(statuses[s:e]))
+        for run_id, s, e in zip(
+            run_ids[starts].tolist(), starts.tolist(), ends.tolist()
+        )
+    }
+
+
+def iter_test_rows_vectorized(
+    crsr, uut_runs, routes, chunk_size=2000, cache=layout_cache, run_filter=None
+):
+    """Yield (sequence name, RunRecord) for each finished UUT run, in <uut_runs> order
+
+    Vectorized equivalent of iter_test_rows; requires pandas.
+    """
+
+    # Layouts of the measurement code tuples seen in this extraction
+    signature_codes = SignatureCodes()
+    layouts = {}
+
+    def build_chunk(chunk):
+        run_ids = {run.ID for run in chunk}
+
+        steps = load_run_steps(crsr, chunk[0].ID, chunk[-1].ID, run_filter)
+        steps = steps[steps["UUT_RESULT"].isin(run_ids)].reset_index(drop=True)
+        if steps.empty:
+            return {}
+
+        # Route each run by the first of its steps with a known parent sequence call
+        seq_names = (
+            steps["STEP_PARENT"].map(routes).groupby(steps["UUT_RESULT"]).first()
+        )
+        seq_names = seq_names[seq_names.notna()].to_dict()
+
+        measurements = group_measurements(transform_steps(steps), signature_codes)
+
+        records = {}
+        for run in chunk:
+            seq_name = seq_names.get(run.ID)
+            if seq_name is None:
+                # Runs without numeric steps cannot be routed to a sequence file
+                continue
+
+            codes, values, statuses = measurements.get(run.ID, ((), (), ()))
+            layout = layouts.get(codes)
+            if layout is None:
+                layout = layouts[codes] = cache.get(signature_codes.signature(codes))
+
+            records[run.ID] = seq_name, RunRecord(
+                layout, metadata_values(run) + values, run.ID, statuses
+            )
+
+        return records
+
+    yield from iter_chunks_in_order(uut_runs, chunk_size, build_chunk)
+
+
+def test_row_iterator(vectorized=False, all_types=False):
+    """Return iter_test_rows_vectorized if <vectorized>, else iter_test_rows
+
+    The vectorized transform handles numeric limit tests only; with <all_types>, the
+    measurements of every step type are extracted by iter_test_rows.
+    """
+
+    if vectorized and not all_types:
+        return iter_test_rows_vectorized
+
+    from .database import iter_test_rows
+
+    if all_types:
+        return partial(iter_test_rows, all_types=True)
+
+    return iter_test_rows
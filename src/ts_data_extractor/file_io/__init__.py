@@ -1,3 +1,11 @@
 __version__ = "0.1.0"
 
+from .cache import *
+from .columnar import *
 from .file_io import *
+from .manifest import *
+from .metrics import *
+from .stats import *
+from .store import *
+from .viewer import *
+from .writers import *
@@ -0,0 +1,349 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+On-disk cache of extracted test results, keyed by database content.
+
+Each entry holds the spilled rows of every sequence of one database (the same
+compact pickle format as SequenceWriter spill files) together with their column
+layouts. Entries are found by the SHA-256 of the database file, so an unchanged
+re-upload is exported straight from the cache.
+
+A database that only gained UUT runs since it was cached (same runs up to the
+entry's last UUT_RESULT ID) reuses the entry's rows and extracts the newer runs
+only; the result is stored as a new entry.
+
+Entries are evicted least recently used first once the cache exceeds max_bytes.
+Entries pinned by get, find_prefix or put (until released) are in use by an export
+of this process and are not evicted.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from .file_io import OUTPUT_FOLDER
+from .writers import SequenceWriter, count_csv_files
+
+# Default cache folder, kept apart from the exported files
+CACHE_FOLDER = os.path.join(OUTPUT_FOLDER, ".cache")
+
+# Index of the cache entries in the cache folder
+CACHE_INDEX_FILE = "index.json"
+
+# Entry file holding the layouts and run digest of one cache entry
+ENTRY_FILE = "entry.pickle"
+
+
+def hash_file(file_path, block_size=1024 * 1024):
+    """Return the SHA-256 hex digest of the contents of <file_path>"""
+
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+
+def iter_run_digests(uut_runs):
+    """Yield (run ID, digest of the runs up to it) for <uut_runs> in ID order"""
+
+    digest = hashlib.sha256()
+    for run in sorted(uut_runs, key=lambda run: run.ID):
+        digest.update(repr(tuple(run)).encode())
+        digest.update(b"\n")
+        yield run.ID, digest.hexdigest()
+
+
+class CacheEntry:
+    """Cached rows of one database
+
+    <tables> maps sequence names to lists of (spill file name, layouts, row count)
+    segments; <last_run> is the newest UUT run as {"ID", "START_DATE_TIME"}.
+    """
+
+    __slots__ = ("folder", "seq_list", "tables", "last_run", "runs_digest")
+
+    def __init__(self, folder, seq_list, tables, last_run, runs_digest):
+        self.folder = Path(folder)
+        self.seq_list = seq_list
+        self.tables = tables
+        self.last_run = last_run
+        self.runs_digest = runs_digest
+
+    def iter_segments(self, seq_name):
+        """Yield the (spill path, layouts, row count) of <seq_name> for SequenceWriter.add_segment"""
+
+        for spill_name, layouts, row_count in self.tables.get(seq_name, ()):
+            yield self.folder.joinpath(spill_name), layouts, row_count
+
+    @property
+    def key(self):
+        return self.folder.name
+
+    def row_counts(self):
+        """Return {sequence name: number of cached rows}"""
+
+        return {
+            seq_name: sum(row_count for spill_name, layouts, row_count in segments)
+            for seq_name, segments in self.tables.items()
+        }
+
+    def watermark_runs(self):
+        """Return the newest cached run as a list for save_watermark"""
+
+        if self.last_run is None:
+            return []
+
+        return [CachedRun(**self.last_run)]
+
+
+class CachedRun:
+    """ID and start of a cached UUT run"""
+
+    __slots__ = ("ID", "START_DATE_TIME")
+
+    def __init__(self, ID, START_DATE_TIME):
+        self.ID = ID
+        self.START_DATE_TIME = START_DATE_TIME
+
+
+class ExtractionCache:
+    """Size-bounded LRU cache of extracted databases in <folder>"""
+
+    def __init__(self, folder=CACHE_FOLDER, max_bytes=2 * 1024**3):
+        self.folder = Path(folder)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # Number of users of each pinned entry, by key
+        self._pins = {}
+
+    def get(self, key, pin=False):
+        """Return the CacheEntry of database content hash <key> or None
+
+        A <pin>ned entry is not evicted until it is released.
+        """
+
+        with self._lock:
+            index = self._load_index()
+            if key not in index:
+                return None
+
+            entry = self._load_entry(key)
+            if entry is None:
+                del index[key]
+            else:
+                index[key]["last_used"] = time.time()
+                if pin:
+                    self._pin(key)
+            self._save_index(index)
+
+        return entry
+
+    def release(self, entry):
+        """Release an <entry> pinned by get, find_prefix or put"""
+
+        with self._lock:
+            count = self._pins.pop(entry.key, 0) - 1
+            if count > 0:
+                self._pins[entry.key] = count
+
+    def find_prefix(self, uut_runs, pin=False):
+        """Return the cached entry with the most runs that are all unchanged in <uut_runs>, or None"""
+
+        with self._lock:
+            index = self._load_index()
+
+        # Entries by the ID of their last run; the latest matching prefix wins
+        candidates = {}
+        for key, info in index.items():
+            candidates.setdefault(info["last_id"], []).append((key, info))
+        if not candidates:
+            return None
+
+        matches = []
+        for run_id, runs_digest in iter_run_digests(uut_runs):
+            for key, info in candidates.get(run_id, ()):
+                if info["runs_digest"] == runs_digest:
+                    matches.append(key)
+
+        for key in reversed(matches):
+            entry = self.get(key, pin)
+            if entry is not None:
+                return entry
+
+        return None
+
+    def create_folder(self):
+        """Return a new, empty folder to spill the rows of an entry into"""
+
+        self.folder.mkdir(parents=True, exist_ok=True)
+
+        return Path(tempfile.mkdtemp(prefix="entry-", dir=self.folder))
+
+    def put(self, key, folder, seq_list, tables, uut_runs, base=None, pin=False):
+        """Store the rows spilled to <folder> as the entry of <key>
+
+        <tables> maps sequence names to (spill path, layouts, row count) segments
+        of the runs extracted on top of the cached (and pinned) <base> entry.
+        A <pin>ned entry is not evicted until it is released.
+        """
+
+        folder = Path(folder)
+
+        # Keep the base entry's rows in the new entry so that it outlives the base
+        merged = {}
+        if base is not None:
+            for seq_name, segments in base.tables.items():
+                for spill_name, layouts, row_count in segments:
+                    _link_or_copy(
+                        base.folder.joinpath(spill_name), folder.joinpath(spill_name)
+                    )
+                    merged.setdefault(seq_name, []).append(
+                        (spill_name, layouts, row_count)
+                    )
+
+        for seq_name, (spill_path, layouts, row_count) in tables.items():
+            if spill_path is None:
+                continue
+            merged.setdefault(seq_name, []).append(
+                (Path(spill_path).name, layouts, row_count)
+            )
+
+        # Digest of all the runs, the prefix a larger copy of the database must match
+        runs_digest = None
+        for run_id, runs_digest in iter_run_digests(uut_runs):
+            continue
+
+        last_run = None
+        if uut_runs:
+            run = max(uut_runs, key=lambda run: run.ID)
+            last_run = {"ID": run.ID, "START_DATE_TIME": str(run.START_DATE_TIME)}
+
+        entry = CacheEntry(folder, seq_list, merged, last_run, runs_digest)
+        with open(folder.joinpath(ENTRY_FILE), "wb") as f:
+            pickle.dump(
+                (seq_list, merged, last_run, runs_digest), f, pickle.HIGHEST_PROTOCOL
+            )
+
+        with self._lock:
+            index = self._load_index()
+
+            # Same content stored concurrently; keep the existing entry
+            if key in index:
+                shutil.rmtree(folder, ignore_errors=True)
+                index[key]["last_used"] = time.time()
+                if pin:
+                    self._pin(key)
+                self._save_index(index)
+                return self._load_entry(key)
+
+            final_folder = self.folder.joinpath(key)
+            shutil.rmtree(final_folder, ignore_errors=True)
+            folder.replace(final_folder)
+            entry.folder = final_folder
+
+            index[key] = {
+                "last_id": last_run["ID"] if last_run else None,
+                "runs_digest": runs_digest,
+                "size": _folder_size(final_folder),
+                "last_used": time.time(),
+            }
+            if pin:
+                self._pin(key)
+            self._evict(index, keep=key, base=base.key if base else None)
+            self._save_index(index)
+
+        return entry
+
+    def discard(self, folder):
+        """Remove an entry folder that was never stored"""
+
+        shutil.rmtree(folder, ignore_errors=True)
+
+    def _pin(self, key):
+        self._pins[key] = self._pins.get(key, 0) + 1
+
+    def _evict(self, index, keep=None, base=None):
+        total = sum(info["size"] for info in index.values())
+
+        for key in sorted(index, key=lambda key: index[key]["last_used"]):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            # Entries being exported are evicted by a later put, once released; the
+            # caller's pin of the <base> entry is not counted, its rows are linked
+            if self._pins.get(key, 0) > (key == base):
+                continue
+            total -= index.pop(key)["size"]
+            shutil.rmtree(self.folder.joinpath(key), ignore_errors=True)
+
+    def _load_entry(self, key):
+        folder = self.folder.joinpath(key)
+        try:
+            with open(folder.joinpath(ENTRY_FILE), "rb") as f:
+                seq_list, tables, last_run, runs_digest = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+        return CacheEntry(folder, seq_list, tables, last_run, runs_digest)
+
+    def _load_index(self):
+        index_file = self.folder.joinpath(CACHE_INDEX_FILE)
+        if not index_file.is_file():
+            return {}
+
+        with open(index_file, "r") as f:
+            return json.load(f)
+
+    def _save_index(self, index):
+        # Replace the index in one step so an interrupted run cannot corrupt it
+        self.folder.mkdir(parents=True, exist_ok=True)
+        index_file = self.folder.joinpath(CACHE_INDEX_FILE)
+        tmp_file = index_file.with_suffix(".tmp")
+        with open(tmp_file, "w") as f:
+            json.dump(index, f, indent=2)
+        tmp_file.replace(index_file)
+
+
+def _link_or_copy(src, dst):
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+def _folder_size(folder):
+    return sum(p.stat().st_size for p in Path(folder).iterdir() if p.is_file())
+
+
+def export_entry(
+    entry, seq_list, output_folder=OUTPUT_FOLDER, formats=("csv",), source=None
+):
+    """Export the cached rows of <entry> to one output file per sequence
+
+    <source> identifies the database the rows were extracted from (see watermark_key)
+    """
+
+    Path(output_folder).mkdir(parents=True, exist_ok=True)
+
+    writers = []
+    for seq_name in dict.fromkeys([*seq_list, *entry.tables]):
+        writer = SequenceWriter(
+            Path(output_folder).joinpath(seq_name + ".csv"),
+            formats=formats,
+            source=source,
+        )
+        for spill_path, layouts, row_count in entry.iter_segments(seq_name):
+            writer.add_segment(spill_path, layouts, row_count)
+        writer.close()
+        writers.append(writer)
+
+    return count_csv_files(writers)
@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Columnar (Parquet / Arrow IPC) output of test results tables.
+
+Each sequence is written as a dataset directory next to its CSV file, e.g.
+"Test Data HL.parquet/part-00000.parquet"; every export adds one part file, so
+incremental runs never rewrite earlier parts. Read a dataset back with
+pandas.read_parquet("Test Data HL.parquet", columns=[...]) or pyarrow.dataset.
+
+Metadata columns are typed (timestamp, integers) and the repetitive string
+metadata is dictionary-encoded; measurement columns are float64, except the
+bool and string columns of pass/fail and string value tests.
+
+Requires the optional pyarrow package: pip install "ts-data-extractor[columnar]".
+"""
+
+# Output formats written with pyarrow
+COLUMNAR_FORMATS = ["parquet", "arrow"]
+
+# Arrow type names of the metadata columns; other columns are float64 unless typed by the layout
+METADATA_TYPES = {
+    "Test Start": "timestamp",
+    "Station ID": "dictionary",
+    "Serial Number": "dictionary",
+    "Test Socket": "int32",
+    "Test Status": "dictionary",
+    "Test Time (s)": "int64",
+}
+
+# Rows per record batch / Parquet row group
+BATCH_SIZE = 65536
+
+
+def require_pyarrow(formats):
+    """Raise ImportError when a columnar format of <formats> is requested without pyarrow"""
+
+    import importlib.util
+
+    requested = [name for name in formats if name in COLUMNAR_FORMATS]
+    if requested and importlib.util.find_spec("pyarrow") is None:
+        raise ImportError(
+            f"The {' and '.join(requested)} output format requires pyarrow: "
+            'pip install "ts-data-extractor[columnar]"'
+        )
+
+
+def arrow_type(type_name):
+    """Return the pyarrow type for <type_name>"""
+
+    import pyarrow as pa
+
+    if type_name == "timestamp":
+        return pa.timestamp("us")
+    if type_name == "dictionary":
+        return pa.dictionary(pa.int32(), pa.string())
+
+    return pa.type_for_alias(type_name)
+
+
+def arrow_schema(columns, column_types=None):
+    """Build the schema of a table with <columns> (name -> type name overrides in <column_types>)"""
+
+    import pyarrow as pa
+
+    column_types = column_types or {}
+
+    return pa.schema(
+        [
+            pa.field(
+                name,
+                arrow_type(
+                    column_types.get(name) or METADATA_TYPES.get(name, "float64")
+                ),
+            )
+            for name in columns
+        ]
+    )
+
+
+def to_arrow_array(values, field_type):
+    """Convert a list of Python values to an array of <field_type>"""
+
+    import pyarrow as pa
+
+    if pa.types.is_dictionary(field_type):
+        return pa.array(values, type=pa.string()).dictionary_encode()
+
+    return pa.array(values, type=field_type)
+
+
+def iter_record_batches(rows, schema, batch_size=BATCH_SIZE):
+    """Group <rows> (lists aligned to <schema>, None for missing) into record batches"""
+
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield _record_batch(batch, schema)
+            batch = []
+
+    if batch:
+        yield _record_batch(batch, schema)
+
+
+def _record_batch(batch, schema):
+    import pyarrow as pa
+
+    arrays = [
+        to_arrow_array(list(values), field.type)
+        for values, field in zip(zip(*batch), schema)
+    ]
+
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def next_part_file(dataset_folder, suffix):
+    """Return the path of the next part file in <dataset_folder>"""
+
+    from pathlib import Path
+
+    dataset_folder = Path(dataset_folder)
+    dataset_folder.mkdir(parents=True, exist_ok=True)
+    part_count = len(list(dataset_folder.glob(f"part-*{suffix}")))
+
+    return dataset_folder.joinpath(f"part-{part_count:05d}{suffix}")
+
+
+def write_parquet(rows, columns, dataset_folder, column_types=None, compression="zstd"):
+    """Write <rows> with <columns> as the next Parquet part file of <dataset_folder>"""
+
+    import pyarrow.parquet as pq
+
+    schema = arrow_schema(columns, column_types)
+    part_file = next_part_file(dataset_folder, ".parquet")
+
+    with pq.ParquetWriter(part_file, schema, compression=compression) as writer:
+        for batch in iter_record_batches(rows, schema):
+            writer.write_batch(batch)
+
+    return part_file
+
+
+def write_arrow(rows, columns, dataset_folder, column_types=None, compression="zstd"):
+    """Write <rows> with <columns> as the next Arrow IPC part file of <dataset_folder>"""
+
+    import pyarrow as pa
+
+    schema = arrow_schema(columns, column_types)
+    part_file = next_part_file(dataset_folder, ".arrow")
+    options = pa.ipc.IpcWriteOptions(compression=compression)
+
+    with pa.OSFile(str(part_file), "wb") as sink:
+        with pa.ipc.new_file(sink, schema, options=options) as writer:
+            for batch in iter_record_batches(rows, schema):
+                writer.write_batch(batch)
+
+    return part_file
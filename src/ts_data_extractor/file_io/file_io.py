@@ -4,6 +4,15 @@
 File import and results output.
 """
 
+# Generic output folder for standard input/output processing
+OUTPUT_FOLDER = r"C:\TestStand Results"
+
+# State file in the output folder holding the last exported run of each source database
+WATERMARK_FILE = ".watermarks.json"
+
+# State file in the output folder holding the last exported test start of each station
+STATION_WATERMARK_FILE = ".station_watermarks.json"
+
 
 def import_source():
     """Open TestStand database (.mdb) with user prompt"""
@@ -17,36 +26,62 @@ def import_source():
     # Show an "Open" dialog box and return the path to the selected file
     db_filename = askopenfilename(
         title="Select TestStand Database File to Open",
-        filetypes=(("MS Access", "*.mdb"), ("MS Access", "*.accdb")),
+        filetypes=(
+            ("MS Access", "*.mdb"),
+            ("MS Access", "*.accdb"),
+            ("SQLite", "*.db"),
+        ),
     )
 
     return db_filename
 
 
-def export_results(seq_list, tbl_dict):
+def import_source_folder():
+    """Select a folder of TestStand databases with user prompt"""
+
+    from tkinter import Tk
+    from tkinter.filedialog import askdirectory
+
+    # Prevent the root window from appearing
+    Tk().withdraw()
+
+    # Show a "Select Folder" dialog box and return the selected path
+    db_folder = askdirectory(title="Select Folder of TestStand Database Files")
+
+    return db_folder
+
+
+def export_results(seq_list, tbl_dict, output_folder=OUTPUT_FOLDER):
     """Export each output table to CSV file"""
 
     import pandas as pd
     import pathlib
     from pathlib import Path
 
-    # Generic output folder for standard input/output processing
+    from .manifest import ColumnManifest
+
     csv_file_count = 0
-    output_folder = r"C:\TestStand Results"
     Path(output_folder).mkdir(parents=True, exist_ok=True)
 
     # Generate exports
     for seq_name in seq_list:
         filename = seq_name + ".csv"
-        output_file = output_folder + "\\" + filename
+        output_file = Path(output_folder).joinpath(filename)
         filepath = Path(output_file)
-        if filepath.is_file():
-            write_header = False
-        else:
-            write_header = True
-        pd.DataFrame.from_records(tbl_dict[f"{seq_name}"]).to_csv(
-            output_file, mode="a", index=False, header=write_header
-        )
+
+        # Nothing new to append (e.g. incremental run without new UUT runs)
+        if filepath.is_file() and not tbl_dict[f"{seq_name}"]:
+            continue
+
+        # Align the rows to the columns of the earlier exports
+        table = pd.DataFrame.from_records(tbl_dict[f"{seq_name}"])
+        manifest = ColumnManifest(output_file)
+        write_header = manifest.prepare(table.columns)
+        if manifest.columns:
+            table = table.reindex(columns=manifest.columns)
+        table.to_csv(output_file, mode="a", index=False, header=write_header)
+        manifest.add_rows(len(table))
+        manifest.save()
 
     # Validate number of CSV files exported
     for p in pathlib.Path(output_folder).glob("*.csv"):
@@ -54,3 +89,151 @@ def export_results(seq_list, tbl_dict):
             csv_file_count += 1
 
     return csv_file_count
+
+
+def watermark_key(db_filename):
+    """Identify a source database in the watermark state file"""
+
+    from pathlib import Path
+
+    db_filename = str(db_filename)
+
+    # ODBC connection strings are used as-is; files by their absolute path
+    if "=" in db_filename:
+        return db_filename
+
+    return str(Path(db_filename).resolve())
+
+
+def source_name(db_filename):
+    """Short name of a source database, e.g. for file names
+
+    Files are named without their extension, ODBC connection strings by their
+    DATABASE (or SERVER).
+    """
+
+    from pathlib import PureWindowsPath
+
+    db_filename = str(db_filename)
+    if "=" in db_filename:
+        fields = dict(
+            field.split("=", 1) for field in db_filename.split(";") if "=" in field
+        )
+        fields = {key.strip().upper(): value.strip() for key, value in fields.items()}
+        name = fields.get("DATABASE") or fields.get("SERVER") or "sqlserver"
+        return "".join(c if c.isalnum() or c in "-_ " else "_" for c in name)
+
+    return PureWindowsPath(db_filename).stem
+
+
+def load_watermark(db_filename, output_folder=OUTPUT_FOLDER):
+    """Return the watermark of <db_filename> or None
+
+    The watermark is the last exported UUT run {"ID", "START_DATE_TIME"} (None
+    after filtered exports only) and the "exported" IDs of the newer runs already
+    exported by filtered extractions.
+    """
+
+    import json
+    from pathlib import Path
+
+    state_file = Path(output_folder).joinpath(WATERMARK_FILE)
+    if not state_file.is_file():
+        return None
+
+    with open(state_file, "r") as f:
+        watermarks = json.load(f)
+
+    return watermarks.get(watermark_key(db_filename))
+
+
+def unexported_runs(uut_runs, watermark):
+    """Return the <uut_runs> not already exported by a filtered extraction (see load_watermark)"""
+
+    exported = set(watermark.get("exported", ())) if watermark else set()
+    if not exported:
+        return uut_runs
+
+    return [run for run in uut_runs if run.ID not in exported]
+
+
+def save_watermark(db_filename, uut_runs, output_folder=OUTPUT_FOLDER, filtered=False):
+    """Record the newest of the exported <uut_runs> as the watermark of <db_filename>
+
+    <filtered> extractions do not export every run, so they do not advance the
+    watermark; the IDs of their <uut_runs> are recorded instead, so that later
+    extractions skip them.
+    """
+
+    import json
+    from pathlib import Path
+
+    if not uut_runs:
+        return
+
+    state_file = Path(output_folder).joinpath(WATERMARK_FILE)
+    watermarks = {}
+    if state_file.is_file():
+        with open(state_file, "r") as f:
+            watermarks = json.load(f)
+
+    key = watermark_key(db_filename)
+    watermark = watermarks.get(key) or {"ID": None, "START_DATE_TIME": None}
+    exported = set(watermark.get("exported", ()))
+    if filtered:
+        exported.update(run.ID for run in uut_runs)
+    else:
+        last_run = max(uut_runs, key=lambda run: run.ID)
+        watermark = {
+            "ID": last_run.ID,
+            "START_DATE_TIME": str(last_run.START_DATE_TIME),
+        }
+
+    # Runs up to the watermark are skipped by their ID already
+    if watermark["ID"] is not None:
+        exported = {run_id for run_id in exported if run_id > watermark["ID"]}
+    if exported:
+        watermark["exported"] = sorted(exported)
+    watermarks[key] = watermark
+
+    # Replace the state file in one step so an interrupted run cannot corrupt it
+    Path(output_folder).mkdir(parents=True, exist_ok=True)
+    tmp_file = state_file.with_suffix(".tmp")
+    with open(tmp_file, "w") as f:
+        json.dump(watermarks, f, indent=2)
+    tmp_file.replace(state_file)
+
+
+def load_station_watermarks(output_folder=OUTPUT_FOLDER):
+    """Return {station ID: last exported test start (text)} of the batch exports"""
+
+    import json
+    from pathlib import Path
+
+    state_file = Path(output_folder).joinpath(STATION_WATERMARK_FILE)
+    if not state_file.is_file():
+        return {}
+
+    with open(state_file, "r") as f:
+        return json.load(f)
+
+
+def save_station_watermarks(last_starts, output_folder=OUTPUT_FOLDER):
+    """Advance the station watermarks to the exported test starts <last_starts>"""
+
+    import json
+    from pathlib import Path
+
+    if not last_starts:
+        return
+
+    watermarks = load_station_watermarks(output_folder)
+    for station, start in last_starts.items():
+        watermarks[station] = max(watermarks.get(station, start), start)
+
+    # Replace the state file in one step so an interrupted run cannot corrupt it
+    state_file = Path(output_folder).joinpath(STATION_WATERMARK_FILE)
+    tmp_file = state_file.with_suffix(".tmp")
+    with open(tmp_file, "w") as f:
+        json.dump(watermarks, f, indent=2)
+    tmp_file.replace(state_file)
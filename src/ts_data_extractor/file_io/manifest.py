@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Column manifests of the output CSV files, for appends whose columns change.
+
+Each output CSV file has a sidecar manifest, e.g. "Test Data HL.manifest.json",
+with the ordered union of the columns ever exported to it and its segments.
+Appended rows are aligned to the manifest columns, so a row is never written under
+the header of another column set.
+
+A new step, changed limits or a new [repeat] suffix adds columns at the end of the
+manifest. The CSV file is then rolled over: it is moved (not rewritten) to the
+".segments" folder and a new CSV file is started with the widened header. The CSV
+file always holds the latest segment; iter_table, read_table and stitch_csv read
+all the segments back as one table.
+
+Files exported before manifests get one from their header on their next append.
+"""
+
+import csv
+import json
+import os
+from pathlib import Path
+
+# Manifest file format version
+MANIFEST_VERSION = 1
+
+# Suffix of the manifest file replacing ".csv"
+MANIFEST_SUFFIX = ".manifest.json"
+
+# Folder of the rolled over segments, next to the CSV files
+SEGMENT_FOLDER = ".segments"
+
+
+def manifest_file(csv_file):
+    return Path(csv_file).with_suffix(MANIFEST_SUFFIX)
+
+
+def read_header(csv_file):
+    """Return the column names of the header of <csv_file> (empty for an empty file)"""
+
+    with open(csv_file, "r", newline="") as f:
+        return next(csv.reader(f), [])
+
+
+class ColumnManifest:
+    """Columns and segments of one output CSV file"""
+
+    def __init__(self, csv_file):
+        self.csv_file = Path(csv_file)
+        self.columns = []
+        # {"file": path relative to the CSV folder, "rows": row count or None}
+        self.segments = []
+        self._load()
+
+    def _load(self):
+        path = manifest_file(self.csv_file)
+        if path.is_file():
+            with open(path, "r") as f:
+                data = json.load(f)
+            if data.get("version") == MANIFEST_VERSION:
+                self.columns = data["columns"]
+                self.segments = data["segments"]
+                return
+
+        # Exported before manifests: a single segment of unknown row count
+        if self.csv_file.is_file():
+            self.columns = read_header(self.csv_file)
+            self.segments = [{"file": self.csv_file.name, "rows": None}]
+
+    def prepare(self, columns):
+        """Add the new <columns> to the manifest; return True when a header must be written
+
+        A CSV file already holding rows is rolled over to a segment when <columns>
+        has columns it does not have.
+        """
+
+        known = set(self.columns)
+        new = [name for name in columns if name not in known]
+        self.columns.extend(new)
+
+        if not self.csv_file.is_file() or not known:
+            # A CSV file without columns (empty table) holds no rows to keep
+            self.csv_file.write_bytes(b"")
+            self._start_segment()
+            return True
+
+        if new:
+            self._rollover()
+            self._start_segment()
+            return True
+
+        return False
+
+    def add_rows(self, count):
+        """Count <count> rows appended to the CSV file"""
+
+        segment = self.segments[-1]
+        if segment["rows"] is not None:
+            segment["rows"] += count
+
+    def save(self):
+        data = {
+            "version": MANIFEST_VERSION,
+            "columns": self.columns,
+            "segments": self.segments,
+        }
+
+        # Replace the manifest in one step so an interrupted export cannot corrupt it
+        path = manifest_file(self.csv_file)
+        tmp_file = path.with_suffix(".tmp")
+        with open(tmp_file, "w") as f:
+            json.dump(data, f, indent=2)
+        tmp_file.replace(path)
+
+    def segment_files(self):
+        """Paths of the segments, oldest first; the last one is the CSV file itself"""
+
+        folder = self.csv_file.parent
+        return [folder.joinpath(segment["file"]) for segment in self.segments]
+
+    def _start_segment(self):
+        if self.segments and self.segments[-1]["file"] == self.csv_file.name:
+            # The CSV file was deleted or left empty
+            self.segments[-1]["rows"] = 0
+        else:
+            self.segments.append({"file": self.csv_file.name, "rows": 0})
+
+    def _rollover(self):
+        """Move the CSV file to the segment folder"""
+
+        segment_folder = self.csv_file.parent.joinpath(SEGMENT_FOLDER)
+        segment_folder.mkdir(exist_ok=True)
+
+        index = len(self.segments) - 1
+        while True:
+            segment_file = segment_folder.joinpath(
+                f"{self.csv_file.stem}.{index:05d}.csv"
+            )
+            if not segment_file.exists():
+                break
+            index += 1
+
+        os.replace(self.csv_file, segment_file)
+        self.segments[-1]["file"] = f"{SEGMENT_FOLDER}/{segment_file.name}"
+
+
+def iter_table(csv_file):
+    """Yield the manifest columns of <csv_file>, then the rows of all its segments aligned to them"""
+
+    manifest = ColumnManifest(csv_file)
+    positions = {name: i for i, name in enumerate(manifest.columns)}
+    width = len(positions)
+    yield list(manifest.columns)
+
+    for segment_file in manifest.segment_files():
+        if not segment_file.is_file():
+            continue
+
+        with open(segment_file, "r", newline="") as f:
+            reader = csv.reader(f)
+            header = next(reader, None)
+            if not header:
+                continue
+
+            segment_positions = [positions[name] for name in header]
+            if segment_positions == list(range(width)):
+                yield from reader
+                continue
+
+            for row in reader:
+                aligned = [""] * width
+                for pos, val in zip(segment_positions, row):
+                    aligned[pos] = val
+                yield aligned
+
+
+def read_table(csv_file):
+    """Return all the segments of <csv_file> as one pandas DataFrame with the manifest columns"""
+
+    import pandas as pd
+
+    manifest = ColumnManifest(csv_file)
+    frames = [
+        pd.read_csv(segment_file)
+        for segment_file in manifest.segment_files()
+        if segment_file.is_file() and segment_file.stat().st_size
+    ]
+    if not frames:
+        return pd.DataFrame(columns=manifest.columns)
+
+    return pd.concat(frames, ignore_index=True).reindex(columns=manifest.columns)
+
+
+def stitch_csv(csv_file, output_file):
+    """Write all the segments of <csv_file> to the single CSV file <output_file>"""
+
+    with open(output_file, "w", newline="") as f:
+        writer = csv.writer(f, lineterminator=os.linesep)
+        writer.writerows(iter_table(csv_file))
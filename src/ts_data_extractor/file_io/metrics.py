@@ -0,0 +1,444 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Run metrics of the extraction pipeline.
+
+PipelineMetrics measures each stage of an extraction: wall time, CPU time of the
+extracting thread, rows fetched from the database, bytes written to the output
+folder and peak memory of the process. A stage may be entered many times (once
+per chunk or per UUT run); its measurements add up. Stages interleaved in one
+loop (step queries, transform and export of the rows) are measured apart by
+excluding the time of the inner stages from the outer ones.
+
+The run report is saved as JSON and, optionally, in the Prometheus text format
+(e.g. for the textfile collector of a node exporter). An opt-in sampling profiler
+records the stacks of the extracting thread during the hot loop and saves them
+in the collapsed format read by flame graph tools.
+"""
+
+import json
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+
+from .file_io import source_name
+
+# Run report format version
+REPORT_VERSION = 1
+
+# Folder of the run reports, in the output folder
+REPORT_FOLDER = ".reports"
+
+# Stages measured while the rows are produced, excluded from the stage consuming them
+EXTRACT_STAGES = ["step_queries", "transform"]
+
+# Prefix of the Prometheus metric names
+METRIC_PREFIX = "ts_extract"
+
+# Prometheus metrics of each stage: (name, StageMetrics attribute, help text)
+STAGE_METRICS = [
+    ("stage_wall_seconds", "wall_s", "Wall time of the extraction stage"),
+    ("stage_cpu_seconds", "cpu_s", "CPU time of the extraction stage"),
+    ("stage_calls", "calls", "Times the extraction stage was entered"),
+    ("stage_rows", "rows", "Rows fetched from the database by the stage"),
+    ("stage_bytes_written", "bytes_written", "Bytes written by the stage"),
+]
+
+
+def peak_memory():
+    """Peak resident set size of this process in bytes, or None where unknown"""
+
+    try:
+        import resource
+    except ImportError:
+        return _windows_peak_memory()
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Bytes on macOS, KiB elsewhere
+    if sys.platform == "darwin":
+        return peak
+
+    return peak * 1024
+
+
+def _windows_peak_memory():
+    import ctypes
+    from ctypes import wintypes
+
+    class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+        _fields_ = [
+            ("cb", wintypes.DWORD),
+            ("PageFaultCount", wintypes.DWORD),
+            ("PeakWorkingSetSize", ctypes.c_size_t),
+            ("WorkingSetSize", ctypes.c_size_t),
+            ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+            ("PagefileUsage", ctypes.c_size_t),
+            ("PeakPagefileUsage", ctypes.c_size_t),
+        ]
+
+    counters = PROCESS_MEMORY_COUNTERS()
+    counters.cb = ctypes.sizeof(counters)
+    try:
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if not ctypes.windll.psapi.GetProcessMemoryInfo(
+            process, ctypes.byref(counters), counters.cb
+        ):
+            return None
+    except (AttributeError, OSError):
+        return None
+
+    return counters.PeakWorkingSetSize
+
+
+def report_file(output_folder, db_filename):
+    """Run report file of an extraction of <db_filename> started now"""
+
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+
+    return Path(output_folder).joinpath(
+        REPORT_FOLDER, f"{source_name(db_filename)}-{stamp}.json"
+    )
+
+
+# End of the items of PipelineMetrics.iterate
+_END = object()
+
+
+def folder_size(folder):
+    """Total size of the files in <folder> and its subfolders, 0 if it does not exist
+
+    Subfolders hold the columnar part files and the rolled over CSV segments.
+    """
+
+    folder = Path(folder)
+    if not folder.is_dir():
+        return 0
+
+    return sum(p.stat().st_size for p in folder.rglob("*") if p.is_file())
+
+
+class StageMetrics:
+    """Measurements of one stage of the pipeline"""
+
+    __slots__ = (
+        "name",
+        "calls",
+        "wall_s",
+        "cpu_s",
+        "rows",
+        "bytes_written",
+        "peak_memory",
+    )
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.wall_s = 0.0
+        self.cpu_s = 0.0
+        self.rows = 0
+        self.bytes_written = 0
+        self.peak_memory = None
+
+    def record(self, wall, cpu, rows=0, calls=1):
+        """Add <calls> passes through the stage"""
+
+        self.calls += calls
+        self.wall_s += wall
+        self.cpu_s += cpu
+        self.rows += rows
+
+    def as_dict(self):
+        return {
+            "calls": self.calls,
+            "wall_s": round(self.wall_s, 6),
+            "cpu_s": round(self.cpu_s, 6),
+            "rows": self.rows,
+            "bytes_written": self.bytes_written,
+            "peak_memory": self.peak_memory,
+        }
+
+
+class TimedCursor:
+    """Cursor wrapper adding the time and rows of every query to a StageMetrics"""
+
+    def __init__(self, crsr, stage):
+        self._crsr = crsr
+        self._stage = stage
+
+    def __getattr__(self, name):
+        return getattr(self._crsr, name)
+
+    def execute(self, sql, params=()):
+        self._timed(self._crsr.execute, sql, params)
+        return self
+
+    def fetchone(self):
+        row = self._timed(self._crsr.fetchone)
+        self._stage.rows += row is not None
+        return row
+
+    def fetchmany(self, size=1):
+        rows = self._timed(self._crsr.fetchmany, size)
+        self._stage.rows += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._timed(self._crsr.fetchall)
+        self._stage.rows += len(rows)
+        return rows
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def _timed(self, method, *args):
+        wall, cpu = time.perf_counter(), time.thread_time()
+        try:
+            return method(*args)
+        finally:
+            self._stage.record(time.perf_counter() - wall, time.thread_time() - cpu)
+
+
+class SamplingProfiler:
+    """Record the stack of one thread every <interval> seconds from a background thread"""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self, thread_id=None):
+        """Start sampling thread <thread_id> (the calling thread when None)"""
+
+        target = thread_id or threading.get_ident()
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._sample, args=(target,), name="profiler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _sample(self, target):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(target)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(
+                    f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})"
+                )
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+
+    def collapsed(self):
+        """Sampled stacks as "frame;frame;... count" lines, most frequent first"""
+
+        return "".join(
+            f"{stack} {count}\n" for stack, count in self.samples.most_common()
+        )
+
+
+class PipelineMetrics:
+    """Stage measurements and run labels of one extraction
+
+    With <profile_interval> (seconds), the loop run under profile() is sampled.
+    """
+
+    def __init__(self, profile_interval=None, **labels):
+        self.labels = labels
+        self.stages = {}
+        self.started = time.time()
+        self.finished = None
+        self.profiler = SamplingProfiler(profile_interval) if profile_interval else None
+        self._start_wall = time.perf_counter()
+        self._wall_s = None
+
+    def stage_metrics(self, name):
+        """Return the StageMetrics of stage <name>, created on first use"""
+
+        stage = self.stages.get(name)
+        if stage is None:
+            stage = self.stages[name] = StageMetrics(name)
+
+        return stage
+
+    @contextmanager
+    def stage(self, name, output_folder=None, exclude=()):
+        """Measure the enclosed block as a pass through stage <name>
+
+        Bytes added to <output_folder> are counted as written by the stage; time
+        recorded meanwhile by the stages named in <exclude> is not counted.
+        """
+
+        stage = self.stage_metrics(name)
+        size = folder_size(output_folder) if output_folder is not None else 0
+        excluded = self._excluded_time(exclude)
+        wall, cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield stage
+        finally:
+            wall = time.perf_counter() - wall
+            cpu = time.thread_time() - cpu
+            inner_wall, inner_cpu = self._excluded_time(exclude, excluded)
+            stage.record(wall - inner_wall, cpu - inner_cpu)
+            if output_folder is not None:
+                stage.bytes_written += folder_size(output_folder) - size
+            stage.peak_memory = peak_memory()
+
+    def cursor(self, crsr, name):
+        """Return <crsr> wrapped to measure its queries as stage <name>"""
+
+        return TimedCursor(crsr, self.stage_metrics(name))
+
+    def iterate(self, items, name, exclude=()):
+        """Pass the items of <items> through, measuring the time to produce each as stage <name>"""
+
+        stage = self.stage_metrics(name)
+        items = iter(items)
+        while True:
+            excluded = self._excluded_time(exclude)
+            wall, cpu = time.perf_counter(), time.thread_time()
+            item = next(items, _END)
+            wall = time.perf_counter() - wall
+            cpu = time.thread_time() - cpu
+            inner_wall, inner_cpu = self._excluded_time(exclude, excluded)
+            stage.record(wall - inner_wall, cpu - inner_cpu, calls=item is not _END)
+
+            if item is _END:
+                return
+            yield item
+
+    @contextmanager
+    def profile(self):
+        """Sample the calling thread during the enclosed block, if profiling is on"""
+
+        if self.profiler is None:
+            yield
+            return
+
+        self.profiler.start()
+        try:
+            yield
+        finally:
+            self.profiler.stop()
+
+    def finish(self):
+        """Record the end of the extraction"""
+
+        self.finished = time.time()
+        self._wall_s = time.perf_counter() - self._start_wall
+
+        # Stages measured by a cursor or iterator end with the extraction
+        for stage in self.stages.values():
+            if stage.peak_memory is None:
+                stage.peak_memory = peak_memory()
+
+    def report(self):
+        """Run report as a JSON-serializable dict"""
+
+        wall_s = self._wall_s
+        if wall_s is None:
+            wall_s = time.perf_counter() - self._start_wall
+
+        return {
+            "version": REPORT_VERSION,
+            "labels": self.labels,
+            "started": self.started,
+            "finished": self.finished,
+            "wall_s": round(wall_s, 6),
+            "peak_memory": peak_memory(),
+            "stages": {name: stage.as_dict() for name, stage in self.stages.items()},
+        }
+
+    def prometheus(self):
+        """Run report in the Prometheus text exposition format"""
+
+        report = self.report()
+        labels = "".join(
+            f',{key}="{escape_label(value)}"' for key, value in self.labels.items()
+        )
+
+        lines = []
+        for name, attribute, help_text in STAGE_METRICS:
+            lines.append(f"# HELP {METRIC_PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {METRIC_PREFIX}_{name} gauge")
+            for stage in self.stages.values():
+                lines.append(
+                    f'{METRIC_PREFIX}_{name}{{stage="{escape_label(stage.name)}"{labels}}} '
+                    f"{getattr(stage, attribute)}"
+                )
+
+        run_labels = "{" + labels[1:] + "}" if labels else ""
+        for name, value, help_text in [
+            ("wall_seconds", report["wall_s"], "Wall time of the extraction"),
+            ("peak_memory_bytes", report["peak_memory"], "Peak memory of the process"),
+        ]:
+            if value is None:
+                continue
+            lines.append(f"# HELP {METRIC_PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {METRIC_PREFIX}_{name} gauge")
+            lines.append(f"{METRIC_PREFIX}_{name}{run_labels} {value}")
+
+        return "\n".join(lines) + "\n"
+
+    def save(self, report_file, prometheus=False):
+        """Save the run report to <report_file> (JSON)
+
+        With <prometheus>, the report is also saved in the Prometheus text format
+        to "<name>.prom"; sampled stacks are saved to "<name>.folded".
+        """
+
+        report_file = Path(report_file)
+        report_file.parent.mkdir(parents=True, exist_ok=True)
+
+        outputs = [(report_file, json.dumps(self.report(), indent=2))]
+        if prometheus:
+            outputs.append((report_file.with_suffix(".prom"), self.prometheus()))
+        if self.profiler is not None and self.profiler.samples:
+            outputs.append(
+                (report_file.with_suffix(".folded"), self.profiler.collapsed())
+            )
+
+        # Replace each file in one step so a collector never reads a partial file
+        for path, text in outputs:
+            tmp_file = path.with_suffix(path.suffix + ".tmp")
+            with open(tmp_file, "w") as f:
+                f.write(text)
+            tmp_file.replace(path)
+
+        return report_file
+
+    def _excluded_time(self, names, since=None):
+        """Return the (wall, CPU) time recorded by stages <names>, minus <since>"""
+
+        wall = cpu = 0.0
+        for name in names:
+            stage = self.stages.get(name)
+            if stage is not None:
+                wall += stage.wall_s
+                cpu += stage.cpu_s
+
+        if since is not None:
+            wall -= since[0]
+            cpu -= since[1]
+
+        return wall, cpu
+
+
+def escape_label(value):
+    """Escape a Prometheus label value"""
+
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
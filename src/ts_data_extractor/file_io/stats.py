@@ -0,0 +1,373 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Summary statistics of the measurement columns of the test results tables.
+
+Each measurement column keeps streaming accumulators - count, mean and variance
+(Welford), min/max, fail count against its limits and a histogram sketch - that
+can be merged with the accumulators of other rows. They are saved next to the
+CSV file as "<sequence>.stats.json" and merged with the saved ones whenever rows
+are appended, so the file always summarizes every row of the CSV file.
+
+Non-finite values (NaN, inf) are only counted; they would poison the mean, the
+variance and the histogram.
+
+Cp/Cpk are computed from the limits of the column: two-sided comparisons
+(GTLT, GELE, EQT) give Cp and Cpk, one-sided comparisons a one-sided Cpk.
+"""
+
+import json
+import math
+from pathlib import Path
+
+# Statistics file of a CSV file: "Test Data HL.csv" -> "Test Data HL.stats.json"
+STATS_SUFFIX = ".stats.json"
+
+# Statistics file format version; files of other versions are not merged
+STATS_VERSION = 1
+
+# Comparison types with a low and a high limit
+TWO_SIDED = ("GTLT", "GELE", "EQT")
+
+# Comparison types whose low limit is an upper specification limit
+UPPER_LIMIT = ("LT", "LE")
+
+
+def limit_passed(cop, ll, hl, val):
+    """Return whether <val> passes the comparison <cop> against limits <ll>/<hl>"""
+
+    # Limits missing from the database never fail a value
+    if ll is None or (hl is None and cop in TWO_SIDED):
+        return True
+
+    if cop == "GELE" or cop == "EQT":
+        return ll <= val <= hl
+    if cop == "GTLT":
+        return ll < val < hl
+    if cop == "GE":
+        return val >= ll
+    if cop == "GT":
+        return val > ll
+    if cop == "LE":
+        return val <= ll
+    if cop == "LT":
+        return val < ll
+    if cop == "EQ":
+        return val == ll
+
+    return True
+
+
+class HistogramSketch:
+    """Mergeable histogram of fixed-width bins aligned to zero
+
+    The bin width is a power of two, doubled (merging pairs of bins) whenever
+    more than <max_bins> bins are in use.
+    """
+
+    __slots__ = ("max_bins", "width", "bins")
+
+    def __init__(self, max_bins=64, width=2.0**-10, bins=None):
+        self.max_bins = max_bins
+        self.width = width
+        self.bins = bins or {}
+
+    def add(self, val):
+        if not math.isfinite(val):
+            return
+
+        index = math.floor(val / self.width)
+        bins = self.bins
+        bins[index] = bins.get(index, 0) + 1
+        if len(bins) > self.max_bins:
+            self._coarsen(self.width)
+
+    def merge(self, other):
+        width = max(self.width, other.width)
+        self._coarsen(width)
+        ratio = round(width / other.width)
+        for index, count in other.bins.items():
+            index //= ratio
+            self.bins[index] = self.bins.get(index, 0) + count
+        self._coarsen(self.width)
+
+    def _coarsen(self, width):
+        """Rebin to <width>, then double the width until the bins fit"""
+
+        while True:
+            if width > self.width:
+                ratio = round(width / self.width)
+                bins = {}
+                for index, count in self.bins.items():
+                    bins[index // ratio] = bins.get(index // ratio, 0) + count
+                self.bins = bins
+                self.width = width
+
+            if len(self.bins) <= self.max_bins:
+                return
+            width = self.width * 2
+
+    def to_json(self):
+        return {
+            "width": self.width,
+            "edges": [index * self.width for index in sorted(self.bins)],
+            "counts": [self.bins[index] for index in sorted(self.bins)],
+        }
+
+    @classmethod
+    def from_json(cls, data, max_bins=64):
+        width = data["width"]
+        bins = {
+            round(edge / width): count
+            for edge, count in zip(data["edges"], data["counts"])
+        }
+        return cls(max_bins, width, bins)
+
+
+class ColumnStats:
+    """Streaming statistics of the values of one measurement column"""
+
+    __slots__ = (
+        "measurement",
+        "count",
+        "mean",
+        "m2",
+        "min",
+        "max",
+        "fail_count",
+        "nonfinite_count",
+        "histogram",
+    )
+
+    def __init__(self, measurement):
+        # (step name, units, comparison, low limit, high limit, repeat index)
+        self.measurement = tuple(measurement)
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = None
+        self.max = None
+        self.fail_count = 0
+        self.nonfinite_count = 0
+        self.histogram = HistogramSketch()
+
+    def add(self, val):
+        """Add one measured value"""
+
+        if not math.isfinite(val):
+            self.nonfinite_count += 1
+            return
+
+        # Welford's online mean and variance
+        self.count += 1
+        delta = val - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (val - self.mean)
+
+        if self.min is None or val < self.min:
+            self.min = val
+        if self.max is None or val > self.max:
+            self.max = val
+
+        step_name, units, cop, ll, hl, repeat_index = self.measurement
+        if not limit_passed(cop, ll, hl, val):
+            self.fail_count += 1
+
+        self.histogram.add(val)
+
+    def merge(self, other):
+        """Add the values summarized by <other>"""
+
+        self.nonfinite_count += other.nonfinite_count
+        if not other.count:
+            return
+
+        # Chan et al. pairwise combination of mean and variance
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+        self.fail_count += other.fail_count
+        self.histogram.merge(other.histogram)
+
+    def std(self):
+        """Sample standard deviation"""
+
+        if self.count < 2:
+            return None
+
+        return math.sqrt(self.m2 / (self.count - 1))
+
+    def capability(self):
+        """Return (Cp, Cpk) from the limits of the column; None where undefined"""
+
+        step_name, units, cop, ll, hl, repeat_index = self.measurement
+        std = self.std()
+        if not std or ll is None or (hl is None and cop in TWO_SIDED):
+            return None, None
+
+        if cop in TWO_SIDED:
+            cp = (hl - ll) / (6 * std)
+            cpk = min(hl - self.mean, self.mean - ll) / (3 * std)
+            return cp, cpk
+        if cop in UPPER_LIMIT:
+            return None, (ll - self.mean) / (3 * std)
+        if cop in ("GE", "GT"):
+            return None, (self.mean - ll) / (3 * std)
+
+        return None, None
+
+    def to_json(self):
+        step_name, units, cop, ll, hl, repeat_index = self.measurement
+        cp, cpk = self.capability()
+
+        return {
+            "step_name": step_name,
+            "units": units,
+            "comparison": cop,
+            "low_limit": ll,
+            "high_limit": hl,
+            "repeat_index": repeat_index,
+            "count": self.count,
+            "mean": self.mean,
+            "m2": self.m2,
+            "min": self.min,
+            "max": self.max,
+            "fail_count": self.fail_count,
+            "nonfinite_count": self.nonfinite_count,
+            "std": self.std(),
+            "yield": 1 - self.fail_count / self.count if self.count else None,
+            "cp": cp,
+            "cpk": cpk,
+            "histogram": self.histogram.to_json(),
+        }
+
+    @classmethod
+    def from_json(cls, data):
+        stats = cls(
+            (
+                data["step_name"],
+                data["units"],
+                data["comparison"],
+                data["low_limit"],
+                data["high_limit"],
+                data["repeat_index"],
+            )
+        )
+        stats.count = data["count"]
+        stats.mean = data["mean"]
+        stats.m2 = data["m2"]
+        stats.min = data["min"]
+        stats.max = data["max"]
+        stats.fail_count = data["fail_count"]
+        stats.nonfinite_count = data.get("nonfinite_count", 0)
+        stats.histogram = HistogramSketch.from_json(data["histogram"])
+
+        return stats
+
+
+class TableStats:
+    """ColumnStats of every measurement column of one results table"""
+
+    def __init__(self):
+        self.columns = {}
+        self._layout_targets = {}
+        self._layouts = []
+
+    def add_row(self, layout, values):
+        """Add the measured values of one row with column <layout>"""
+
+        targets = self._layout_targets.get(id(layout))
+        if targets is None:
+            targets = self._targets(layout)
+
+        offset = len(layout.columns) - len(layout.measurements)
+        for column, val in zip(targets, values[offset:]):
+            if column is not None:
+                column.add(val)
+
+    def merge(self, other):
+        for name, column in other.columns.items():
+            if name in self.columns:
+                self.columns[name].merge(column)
+            else:
+                self.columns[name] = column
+
+    def _targets(self, layout):
+        offset = len(layout.columns) - len(layout.measurements)
+        # Pass/fail and string value columns (typed by the layout) have no statistics
+        typed = getattr(layout, "column_types", None) or {}
+        targets = []
+        for name, measurement in zip(layout.columns[offset:], layout.measurements):
+            if name in typed:
+                targets.append(None)
+                continue
+
+            column = self.columns.get(name)
+            if column is None:
+                column = self.columns[name] = ColumnStats(measurement)
+            targets.append(column)
+
+        # Keep a reference so that id(layout) stays unique
+        self._layout_targets[id(layout)] = targets
+        self._layouts.append(layout)
+
+        return targets
+
+    def to_json(self):
+        return {
+            "version": STATS_VERSION,
+            "columns": {
+                name: column.to_json() for name, column in self.columns.items()
+            },
+        }
+
+    @classmethod
+    def from_json(cls, data):
+        stats = cls()
+        if data.get("version") == STATS_VERSION:
+            stats.columns = {
+                name: ColumnStats.from_json(column)
+                for name, column in data["columns"].items()
+            }
+
+        return stats
+
+
+def stats_file(csv_file):
+    """Statistics file of <csv_file>"""
+
+    csv_file = Path(csv_file)
+
+    return csv_file.with_name(csv_file.stem + STATS_SUFFIX)
+
+
+def load_stats(csv_file):
+    """Return the saved TableStats of <csv_file> (empty if there are none)"""
+
+    path = stats_file(csv_file)
+    if not path.is_file():
+        return TableStats()
+
+    with open(path, "r") as f:
+        return TableStats.from_json(json.load(f))
+
+
+def save_stats(csv_file, stats):
+    """Merge <stats> into the saved statistics of <csv_file>"""
+
+    merged = load_stats(csv_file)
+    merged.merge(stats)
+
+    # Replace the statistics file in one step so an interrupted run cannot corrupt it
+    path = stats_file(csv_file)
+    tmp_file = path.with_suffix(".tmp")
+    with open(tmp_file, "w") as f:
+        json.dump(merged.to_json(), f, indent=2)
+    tmp_file.replace(path)
+
+    return merged
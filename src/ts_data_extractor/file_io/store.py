@@ -0,0 +1,305 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Analytical store of test results: an indexed SQLite database next to the CSV files.
+
+The "store" output format loads every exported UUT run and its measurements into
+"Test Results.sqlite" in the output folder, so lookups such as every measurement
+of a serial number or the failures of a station in a date range are answered from
+indexes instead of reading whole CSV tables:
+
+* runs - one row per UUT run: source database, sequence (table name), serial
+  number, station, start time, socket, status and test time
+* measurements - one row per measurement of a run, as in the long output format
+
+A UUT run is identified by its source database (see watermark_key) and UUT_RESULT
+ID; loading a run again (e.g. a full export after an incremental one) replaces it
+and its measurements, and runs of different databases never collide.
+
+Rows are bulk inserted in batched transactions; the indexes are created after the
+first load and maintained by later (incremental) loads. ResultStore runs the
+lookups on a read-only connection. The file can also be attached by DuckDB
+(sqlite extension) for heavier analytics.
+"""
+
+import datetime
+import sqlite3
+from pathlib import Path
+
+from .file_io import OUTPUT_FOLDER
+
+# Store file in the output folder
+STORE_FILE = "Test Results.sqlite"
+
+# Rows inserted per transaction
+STORE_BATCH_SIZE = 50000
+
+# Rows returned by a lookup at most
+STORE_MAX_LIMIT = 100000
+
+STORE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    uut_result INTEGER,
+    sequence TEXT,
+    serial_number TEXT,
+    station_id TEXT,
+    start_time TEXT,
+    test_socket INTEGER,
+    status TEXT,
+    test_time REAL,
+    source TEXT
+);
+CREATE TABLE IF NOT EXISTS measurements (
+    run INTEGER REFERENCES runs (id),
+    step_name TEXT,
+    repeat_index INTEGER,
+    units TEXT,
+    comparison TEXT,
+    low_limit REAL,
+    high_limit REAL,
+    value,
+    status TEXT
+);
+"""
+
+STORE_INDEXES = """
+CREATE INDEX IF NOT EXISTS runs_serial_number ON runs (serial_number);
+CREATE INDEX IF NOT EXISTS runs_station_start ON runs (station_id, start_time);
+CREATE INDEX IF NOT EXISTS runs_start ON runs (start_time);
+CREATE INDEX IF NOT EXISTS runs_sequence_start ON runs (sequence, start_time);
+CREATE INDEX IF NOT EXISTS measurements_run ON measurements (run);
+CREATE INDEX IF NOT EXISTS measurements_step_name ON measurements (step_name);
+"""
+
+# Lookup arguments and the column they select
+RUN_FILTERS = {
+    "serial_number": "runs.serial_number",
+    "station": "runs.station_id",
+    "sequence": "runs.sequence",
+    "status": "runs.status",
+}
+MEASUREMENT_FILTERS = {
+    "step_name": "measurements.step_name",
+    "step_status": "measurements.status",
+}
+
+
+def store_file(output_folder=OUTPUT_FOLDER):
+    return Path(output_folder).joinpath(STORE_FILE)
+
+
+def store_time(value):
+    """Start time <value> (datetime or ISO 8601 string) as the sortable text stored"""
+
+    if value is None or value == "":
+        return None
+    if not isinstance(value, datetime.datetime):
+        try:
+            value = datetime.datetime.fromisoformat(str(value))
+        except ValueError:
+            return str(value)
+
+    return value.isoformat(sep=" ")
+
+
+def connect_store(path):
+    """Open the store <path> for loading, creating its tables"""
+
+    cnxn = sqlite3.connect(path)
+    # Readers (e.g. the web app) are not blocked while a load is running
+    cnxn.execute("PRAGMA journal_mode=WAL")
+    cnxn.execute("PRAGMA synchronous=NORMAL")
+    cnxn.executescript(STORE_SCHEMA)
+
+    # Stores loaded before runs had a source database
+    columns = [row[1] for row in cnxn.execute("PRAGMA table_info(runs)")]
+    if "source" not in columns:
+        cnxn.execute("ALTER TABLE runs ADD COLUMN source TEXT")
+    cnxn.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS runs_source_uut_result "
+        "ON runs (source, uut_result)"
+    )
+
+    return cnxn
+
+
+def load_store(
+    path, seq_name, records, layouts, sources=None, batch_size=STORE_BATCH_SIZE
+):
+    """Insert spilled (layout index, values, run id, statuses) <records> of <seq_name>
+
+    <sources> are the source databases of the layout indexes. Returns the number of
+    UUT runs inserted (or replaced).
+    """
+
+    sources = sources or [None] * len(layouts)
+
+    cnxn = connect_store(path)
+    try:
+        run_id = cnxn.execute("SELECT coalesce(max(id), 0) FROM runs").fetchone()[0]
+        first_id = run_id
+        runs = []
+        measurements = []
+
+        for index, values, uut_result, statuses in records:
+            layout = layouts[index]
+            start, station, serial, socket, status, test_time = values[:6]
+            run_id += 1
+            runs.append(
+                (
+                    run_id,
+                    uut_result,
+                    seq_name,
+                    serial,
+                    station,
+                    store_time(start),
+                    socket,
+                    status,
+                    test_time,
+                    sources[index],
+                )
+            )
+
+            offset = len(layout.columns) - len(layout.measurements)
+            for measurement, val, step_status in zip(
+                layout.measurements, values[offset:], statuses
+            ):
+                step_name, units, cop, ll, hl, repeat_index = measurement
+                measurements.append(
+                    (
+                        run_id,
+                        step_name,
+                        repeat_index,
+                        units,
+                        cop,
+                        ll,
+                        hl,
+                        val,
+                        step_status,
+                    )
+                )
+
+            if len(measurements) >= batch_size:
+                _insert(cnxn, runs, measurements)
+
+        _insert(cnxn, runs, measurements)
+
+        # Created once the first load is in; later loads maintain them
+        cnxn.executescript(STORE_INDEXES)
+        cnxn.commit()
+    finally:
+        cnxn.close()
+
+    return run_id - first_id
+
+
+def _insert(cnxn, runs, measurements):
+    """Insert one batch of rows in a single transaction, replacing runs loaded before"""
+
+    with cnxn:
+        # INSERT OR REPLACE removes the earlier run; its measurements go first
+        keys = [(run[-1], run[1]) for run in runs]
+        cnxn.executemany(
+            "DELETE FROM measurements WHERE run = "
+            "(SELECT id FROM runs WHERE source = ? and uut_result = ?)",
+            keys,
+        )
+        cnxn.executemany(
+            "INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", runs
+        )
+        cnxn.executemany(
+            "INSERT INTO measurements VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", measurements
+        )
+    runs.clear()
+    measurements.clear()
+
+
+class ResultStore:
+    """Lookups of UUT runs and measurements in the store of an output folder
+
+    Every lookup takes the same optional filters: serial_number, station,
+    sequence and status (of the UUT run), and a [start, end) range of test start
+    times. Serial numbers may use "*" and "?" wildcards.
+    """
+
+    def __init__(self, output_folder=OUTPUT_FOLDER):
+        self.path = store_file(output_folder)
+
+    def exists(self):
+        return self.path.is_file()
+
+    def runs(self, limit=1000, **filters):
+        """UUT runs selected by <filters>, latest first"""
+
+        where, params = self._where(filters, RUN_FILTERS)
+        return self._query(
+            f"SELECT * FROM runs {where} ORDER BY runs.start_time DESC LIMIT ?",
+            params,
+            limit,
+        )
+
+    def measurements(self, limit=10000, **filters):
+        """Measurements of the UUT runs selected by <filters>, latest run first
+
+        step_name and step_status also select the measurements themselves, e.g.
+        step_status="Failed" for the failed measurements.
+        """
+
+        where, params = self._where(filters, {**RUN_FILTERS, **MEASUREMENT_FILTERS})
+        return self._query(
+            "SELECT runs.uut_result, runs.sequence, runs.serial_number, "
+            "runs.station_id, runs.start_time, runs.status AS run_status, "
+            "measurements.step_name, measurements.repeat_index, measurements.units, "
+            "measurements.comparison, measurements.low_limit, "
+            "measurements.high_limit, measurements.value, measurements.status "
+            "FROM runs INNER JOIN measurements ON measurements.run = runs.id "
+            f"{where} ORDER BY runs.start_time DESC, measurements.rowid LIMIT ?",
+            params,
+            limit,
+        )
+
+    def _where(self, filters, columns):
+        """WHERE clause and parameters of the lookup <filters>"""
+
+        predicates = []
+        params = []
+
+        start = store_time(filters.pop("start", None))
+        if start is not None:
+            predicates.append("runs.start_time >= ?")
+            params.append(start)
+        end = store_time(filters.pop("end", None))
+        if end is not None:
+            predicates.append("runs.start_time < ?")
+            params.append(end)
+
+        for name, value in filters.items():
+            if name not in columns:
+                raise ValueError(f"Unknown filter {name}")
+            if value is None or value == "":
+                continue
+
+            value = str(value)
+            if name == "serial_number" and ("*" in value or "?" in value):
+                predicates.append(f"{columns[name]} GLOB ?")
+            else:
+                predicates.append(f"{columns[name]} = ?")
+            params.append(value)
+
+        if not predicates:
+            return "", params
+
+        return "WHERE " + " and ".join(predicates), params
+
+    def _query(self, sql_string, params, limit):
+        if not self.exists():
+            return []
+
+        cnxn = sqlite3.connect(f"{self.path.as_uri()}?mode=ro", uri=True)
+        cnxn.row_factory = sqlite3.Row
+        try:
+            rows = cnxn.execute(sql_string, [*params, min(int(limit), STORE_MAX_LIMIT)])
+            return [dict(row) for row in rows]
+        finally:
+            cnxn.close()
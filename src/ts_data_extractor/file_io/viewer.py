@@ -0,0 +1,464 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Paged access to exported CSV result tables.
+
+The first use of a CSV file builds an index of the byte offset of every row and
+of its metadata column values, saved to ".index/<file name>.idx" in the same
+folder. Pages are then read from a memory map of the file at the offsets of
+their rows, so only the rows of the page are parsed.
+
+The exporters only ever append rows, so an index whose file has grown is
+extended by scanning the new rows only; it is rebuilt if the indexed part of the
+file has changed. Sorting and filtering use the indexed metadata columns.
+
+A CSV file whose columns changed was rolled over to segments (see ColumnManifest);
+each segment has an index of its own and the table pages through all of them,
+oldest first, with their rows aligned to the manifest columns.
+"""
+
+import csv
+import hashlib
+import mmap
+import pickle
+import threading
+from array import array
+from bisect import bisect_right
+from pathlib import Path
+
+from .file_io import OUTPUT_FOLDER
+from .manifest import ColumnManifest
+
+# Folder of the index files, next to the CSV files
+INDEX_FOLDER = ".index"
+
+# Index file format version; older index files are rebuilt
+INDEX_VERSION = 1
+
+# Separator of the values of a metadata column in the index file
+VALUE_SEPARATOR = "\x00"
+
+# Number of leading (metadata) columns indexed for sorting and filtering
+INDEXED_COUNT = 6
+
+# Indexed columns sorted and filtered as numbers
+NUMERIC_COLUMNS = ("Test Socket", "Test Time (s)", "UUT Result ID")
+
+ENCODING = "utf-8"
+
+
+def parse_line(line):
+    """Return the fields of one CSV row of bytes"""
+
+    return next(csv.reader([line.decode(ENCODING, errors="replace")]))
+
+
+def metadata_fields(line, count=INDEXED_COUNT):
+    """Return the values of the first <count> columns of one CSV row of bytes"""
+
+    # Unquoted rows can simply be split
+    if b'"' in line:
+        fields = parse_line(line)[:count]
+    else:
+        fields = line.decode(ENCODING, errors="replace").split(",", count)[:count]
+
+    fields += [""] * (count - len(fields))
+    fields[-1] = fields[-1].rstrip("\r\n")
+
+    return fields
+
+
+def numeric_key(value):
+    """Sort key of a numeric metadata value; empty values sort first"""
+
+    try:
+        return (1, float(value))
+    except ValueError:
+        return (0, 0.0)
+
+
+class SegmentIndex:
+    """Row index of one CSV file (a segment of a result table)"""
+
+    def __init__(self, csv_file):
+        self.csv_file = Path(csv_file)
+        self.index_file = self.csv_file.parent.joinpath(
+            INDEX_FOLDER, self.csv_file.name + ".idx"
+        )
+        self.columns = []
+        self.header_size = 0
+        self.size = 0
+        self.offsets = array("Q")
+        self.metadata = {}
+        self._last_row_digest = None
+
+    @property
+    def row_count(self):
+        return len(self.offsets)
+
+    def refresh(self):
+        """Bring the index up to date with the CSV file"""
+
+        size = self.csv_file.stat().st_size
+        if size == self.size and self.size and self._prefix_unchanged():
+            return
+
+        if not self.size:
+            self._load()
+
+        if not self.size or size < self.size or not self._prefix_unchanged():
+            self._reset()
+
+        if size != self.size:
+            self._scan(size)
+            self._save()
+
+    def read_rows(self, row_indexes):
+        """Return the fields of the rows <row_indexes>, in that order"""
+
+        rows = []
+        with open(self.csv_file, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                for row_index in row_indexes:
+                    rows.append(parse_line(self._row_bytes(mm, row_index)))
+
+        return rows
+
+    def _row_bytes(self, mm, row_index):
+        start = self.offsets[row_index]
+        if row_index + 1 < len(self.offsets):
+            end = self.offsets[row_index + 1]
+        else:
+            end = self.size
+
+        return mm[start:end]
+
+    def _reset(self):
+        self.columns = []
+        self.header_size = 0
+        self.size = 0
+        self.offsets = array("Q")
+        self.metadata = {}
+        self._last_row_digest = None
+
+    def _prefix_unchanged(self):
+        """Check that the indexed part of the file was not rewritten"""
+
+        with open(self.csv_file, "rb") as f:
+            header = f.readline()
+            if len(header) != self.header_size or parse_line(header) != self.columns:
+                return False
+
+            return self._last_row_digest == self._read_last_row_digest(f)
+
+    def _read_last_row_digest(self, f):
+        if not self.offsets:
+            return None
+
+        f.seek(self.offsets[-1])
+        return hashlib.sha256(f.read(self.size - self.offsets[-1])).hexdigest()
+
+    def _scan(self, size):
+        """Index the rows between the indexed size and <size>"""
+
+        with open(self.csv_file, "rb") as f:
+            f.seek(self.size)
+            offset = self.size
+
+            if not self.header_size:
+                header = f.readline()
+                if not header.endswith(b"\n"):
+                    # Header still being written
+                    return
+                self.columns = parse_line(header)
+                self.header_size = len(header)
+                self.metadata = {name: [] for name in self.columns[:INDEXED_COUNT]}
+                offset += len(header)
+
+            offsets = self.offsets
+            metadata = list(self.metadata.values())
+            count = len(metadata)
+
+            rows = []
+            pending = b""
+            for line in f:
+                # Row still being written
+                if offset + len(pending) + len(line) > size:
+                    break
+                if not line.endswith(b"\n"):
+                    break
+
+                # Quoted fields may contain line breaks
+                if pending or b'"' in line:
+                    pending += line
+                    if pending.count(b'"') % 2:
+                        continue
+                    line, pending = pending, b""
+
+                offsets.append(offset)
+                rows.append(metadata_fields(line, count))
+                offset += len(line)
+
+            for column, values in zip(metadata, zip(*rows)):
+                column.extend(values)
+
+            self.size = offset
+            self._last_row_digest = self._read_last_row_digest(f)
+
+    def _load(self):
+        if not self.index_file.is_file():
+            return
+
+        try:
+            with open(self.index_file, "rb") as f:
+                state = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return
+
+        if state.get("version") != INDEX_VERSION:
+            return
+
+        self.columns = state["columns"]
+        self.header_size = state["header_size"]
+        self.size = state["size"]
+        self.offsets = state["offsets"]
+        self.metadata = {
+            name: values.split(VALUE_SEPARATOR) if self.offsets else []
+            for name, values in state["metadata"].items()
+        }
+        self._last_row_digest = state["last_row_digest"]
+
+    def _save(self):
+        state = {
+            "version": INDEX_VERSION,
+            "columns": self.columns,
+            "header_size": self.header_size,
+            "size": self.size,
+            "offsets": self.offsets,
+            # One string per column pickles much faster than lists of strings
+            "metadata": {
+                name: VALUE_SEPARATOR.join(values)
+                for name, values in self.metadata.items()
+            },
+            "last_row_digest": self._last_row_digest,
+        }
+
+        # Replace the index file in one step so an interrupted run cannot corrupt it
+        self.index_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.index_file.with_suffix(".tmp")
+        with open(tmp_file, "wb") as f:
+            pickle.dump(state, f, pickle.HIGHEST_PROTOCOL)
+        tmp_file.replace(self.index_file)
+
+
+class ResultTable:
+    """Rows of one exported CSV file and of the segments it was rolled over from"""
+
+    def __init__(self, csv_file):
+        self.csv_file = Path(csv_file)
+        self.columns = []
+        self.segments = []
+        self.metadata = {}
+        # First row index of each segment
+        self._starts = []
+        self._state = None
+        self._orders = {}
+        self._lock = threading.RLock()
+
+    @property
+    def row_count(self):
+        return sum(segment.row_count for segment in self.segments)
+
+    def refresh(self):
+        """Bring the indexes up to date with the manifest and the segment files"""
+
+        with self._lock:
+            manifest = ColumnManifest(self.csv_file)
+            indexes = {segment.csv_file: segment for segment in self.segments}
+            segments = []
+            for segment_file in manifest.segment_files():
+                if segment_file.is_file():
+                    segment = indexes.get(segment_file) or SegmentIndex(segment_file)
+                    segment.refresh()
+                    segments.append(segment)
+
+            state = tuple((s.csv_file, s.size, s.row_count) for s in segments)
+            if state == self._state and manifest.columns == self.columns:
+                return
+
+            self.columns = list(manifest.columns)
+            self.segments = segments
+            self._state = state
+            self._orders = {}
+
+            self._starts = []
+            start = 0
+            for segment in segments:
+                self._starts.append(start)
+                start += segment.row_count
+
+            # Metadata columns lead every segment; a single segment's lists are shared
+            names = self.columns[:INDEXED_COUNT]
+            if len(segments) == 1:
+                self.metadata = {
+                    name: segments[0].metadata.get(name, []) for name in names
+                }
+            else:
+                self.metadata = {name: [] for name in names}
+                for segment in segments:
+                    for name, values in self.metadata.items():
+                        values.extend(
+                            segment.metadata.get(name, [""] * segment.row_count)
+                        )
+
+    def page(
+        self,
+        page=0,
+        page_size=100,
+        columns=None,
+        sort=None,
+        descending=False,
+        filters=None,
+    ):
+        """Return one page of the table as {"columns", "rows", "total_rows", "matched_rows"}
+
+        <columns> selects a subset of the columns, <sort> is an indexed column and
+        <filters> maps indexed columns to a value (or a (low, high) range of values)
+        """
+
+        with self._lock:
+            self.refresh()
+
+            order = self.row_order(sort, descending, filters)
+            selected = order[page * page_size : (page + 1) * page_size]
+
+            positions = list(range(len(self.columns)))
+            if columns:
+                unknown = [name for name in columns if name not in self.columns]
+                if unknown:
+                    raise KeyError(f"Unknown columns: {', '.join(unknown)}")
+                positions = [self.columns.index(name) for name in columns]
+
+            rows = [
+                [fields[pos] for pos in positions] for fields in self._read(selected)
+            ]
+
+            return {
+                "columns": [self.columns[pos] for pos in positions],
+                "rows": rows,
+                "total_rows": self.row_count,
+                "matched_rows": len(order),
+            }
+
+    def row_order(self, sort=None, descending=False, filters=None):
+        """Return the indexes of the rows matching <filters>, in <sort> order"""
+
+        for name in [sort, *(filters or {})]:
+            if name is not None and name not in self.metadata:
+                raise KeyError(f"Column {name} cannot be sorted or filtered")
+
+        filter_items = tuple(sorted((filters or {}).items()))
+        key = (sort, descending, filter_items, self.row_count)
+        order = self._orders.get(key)
+        if order is not None:
+            return order
+
+        order = range(self.row_count)
+        for name, value in filter_items:
+            order = self._filter(order, name, value)
+
+        if sort is not None:
+            values = self.metadata[sort]
+            if sort in NUMERIC_COLUMNS:
+                sort_key = lambda i: numeric_key(values[i])
+            else:
+                sort_key = values.__getitem__
+            order = sorted(order, key=sort_key, reverse=descending)
+        elif descending:
+            order = order[::-1]
+
+        # Orders are reused while paging; a grown table has a different row count
+        order = array("Q", order)
+        self._orders = {key: order}
+
+        return order
+
+    def _filter(self, order, name, value):
+        values = self.metadata[name]
+        numeric = name in NUMERIC_COLUMNS
+
+        if isinstance(value, (tuple, list)):
+            low, high = value
+            if numeric:
+                low = None if low in (None, "") else float(low)
+                high = None if high in (None, "") else float(high)
+                convert = lambda v: numeric_key(v)[1]
+            else:
+                convert = str
+            return [
+                i
+                for i in order
+                if (low in (None, "") or convert(values[i]) >= low)
+                and (high in (None, "") or convert(values[i]) <= high)
+            ]
+
+        if numeric:
+            value = float(value)
+            return [i for i in order if numeric_key(values[i]) == (1, value)]
+
+        return [i for i in order if values[i] == value]
+
+    def _read(self, row_indexes):
+        """Return the rows <row_indexes> aligned to the manifest columns, in that order"""
+
+        # Rows are read a segment at a time, then put back in the requested order
+        by_segment = {}
+        for position, row_index in enumerate(row_indexes):
+            number = bisect_right(self._starts, row_index) - 1
+            by_segment.setdefault(number, []).append((position, row_index))
+
+        width = len(self.columns)
+        rows = [None] * len(row_indexes)
+        for number, items in by_segment.items():
+            segment = self.segments[number]
+            start = self._starts[number]
+            positions = [self.columns.index(name) for name in segment.columns]
+            aligned = positions == list(range(width))
+
+            lines = segment.read_rows([row_index - start for _, row_index in items])
+            for (position, _), fields in zip(items, lines):
+                if aligned:
+                    fields += [""] * (width - len(fields))
+                else:
+                    values = [""] * width
+                    for pos, val in zip(positions, fields):
+                        values[pos] = val
+                    fields = values
+                rows[position] = fields
+
+        return rows
+
+
+# Open result tables by resolved path, shared by the requests of a web app
+_tables = {}
+_tables_lock = threading.Lock()
+
+
+def open_result_table(csv_file):
+    """Return the up-to-date ResultTable of <csv_file>"""
+
+    key = str(Path(csv_file).resolve())
+    with _tables_lock:
+        table = _tables.get(key)
+        if table is None:
+            table = _tables[key] = ResultTable(key)
+
+    table.refresh()
+
+    return table
+
+
+def list_result_files(output_folder=OUTPUT_FOLDER):
+    """Names of the exported CSV files in <output_folder>"""
+
+    return sorted(p.name for p in Path(output_folder).glob("*.csv") if p.is_file())
@@ -0,0 +1,370 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+Streaming output of test results tables.
+
+Rows are spilled to a temporary file as they are produced while only the column
+manifest (the union of column names in order of first appearance) is kept in memory.
+The CSV file is written from the spill file once the manifest is complete.
+
+Rows are RunRecord-like objects: a shared layout (with a tuple of column names)
+and a tuple of values. Each distinct layout is merged into the manifest once.
+The source database of the rows (see watermark_key) is kept with their layout,
+for the store.
+
+The "long" format writes one row per measurement instead of one row per UUT run
+to a single file shared by all sequences (LONG_FILE), straight from the spill files.
+The "store" format loads the runs and measurements into the indexed analytical
+store of the output folder (see store.py).
+"""
+
+import csv
+import os
+import pickle
+import tempfile
+from pathlib import Path
+
+from .columnar import require_pyarrow, write_arrow, write_parquet
+from .manifest import ColumnManifest
+from .file_io import OUTPUT_FOLDER
+from .stats import TableStats, save_stats
+from .store import load_store, store_file
+
+# Output formats; columnar formats are written as dataset folders next to the CSV file
+# and "stats" merges summary statistics into a JSON file next to it
+OUTPUT_FORMATS = ["csv", "parquet", "arrow", "long", "stats", "store"]
+
+# Long (one row per measurement) output file and columns
+LONG_FILE = "Test Measurements.csv"
+LONG_COLUMNS = [
+    "UUT Result ID",
+    "Serial Number",
+    "Station ID",
+    "Test Start",
+    "Sequence",
+    "Step Name",
+    "Repeat Index",
+    "Units",
+    "Comparison",
+    "Low Limit",
+    "High Limit",
+    "Value",
+    "Step Status",
+]
+
+
+class SequenceWriter:
+    """Stream the rows of one output table to a CSV file
+
+    Rows written by other processes can be appended as spill segments with
+    add_segment; segments are read back in the order they were added.
+    <formats> lists the OUTPUT_FORMATS written on close. <source> identifies the
+    database of the rows, unless a row or segment names its own.
+    """
+
+    def __init__(self, output_file, spill_dir=None, formats=("csv",), source=None):
+        # Fail before any rows are extracted rather than when the file is written
+        require_pyarrow(formats)
+
+        self.output_file = Path(output_file) if output_file else None
+        self.formats = formats
+        self.source = source
+        self.columns = {}
+        self.layouts = []
+        # Source database of the rows of each layout index
+        self.sources = []
+        self.row_count = 0
+        self._layout_index = {}
+        self._spill_dir = spill_dir
+        self._spill = None
+        self._segments = []
+
+    def write(self, record):
+        """Spill one row to disk"""
+
+        layout = record.layout
+        source = getattr(record, "source", None) or self.source
+        index = self._layout_index.get((id(layout), source))
+        if index is None:
+            index = self._add_layout(layout, source)
+
+        if self._spill is None:
+            self._open_spill()
+
+        pickle.dump(
+            (index, record.values, record.run_id, record.statuses),
+            self._spill,
+            pickle.HIGHEST_PROTOCOL,
+        )
+        self.row_count += 1
+
+    def add_segment(self, spill_path, layouts, row_count, source=None):
+        """Append <row_count> rows spilled to <spill_path> with their own <layouts>"""
+
+        source = source or self.source
+        index_map = [self._add_layout(layout, source) for layout in layouts]
+        self._segments.append((spill_path, index_map))
+        self.row_count += row_count
+
+        # Rows written after this segment go to a new spill file
+        self._spill = None
+
+    def detach(self):
+        """Close the spill file and return (spill path, layouts, row count) for add_segment"""
+
+        spill_path = self._spill.name if self._spill else None
+        if self._spill:
+            self._spill.close()
+
+        return spill_path, self.layouts, self.row_count
+
+    def _open_spill(self):
+        if self._spill_dir:
+            self._spill = tempfile.NamedTemporaryFile(
+                dir=self._spill_dir, suffix=".spill", delete=False
+            )
+        else:
+            self._spill = tempfile.TemporaryFile()
+        self._segments.append((self._spill, None))
+
+    def _add_layout(self, layout, source=None):
+        index = self._layout_index.get((id(layout), source))
+        if index is not None:
+            return index
+
+        columns = self.columns
+        for key in layout.columns:
+            if key not in columns:
+                columns[key] = len(columns)
+
+        # Keep a reference so that id(layout) stays unique
+        index = len(self.layouts)
+        self.layouts.append(layout)
+        self.sources.append(source)
+        self._layout_index[(id(layout), source)] = index
+
+        return index
+
+    def iter_spill(self):
+        """Yield the spilled (layout index, values, run id, statuses) in the order they were written"""
+
+        for segment, index_map in self._segments:
+            if isinstance(segment, (str, Path)):
+                with open(segment, "rb") as f:
+                    yield from _load_spill(f, index_map)
+            else:
+                segment.seek(0)
+                yield from _load_spill(segment, index_map)
+
+    def iter_rows(self, fill="", columns=None):
+        """Yield the spilled rows as lists aligned to the column manifest, <fill> for missing
+
+        <columns> maps column names to their positions, by default self.columns.
+        """
+
+        columns = columns or self.columns
+        positions = [
+            [columns[key] for key in layout.columns] for layout in self.layouts
+        ]
+
+        width = len(columns)
+        for index, values, run_id, statuses in self.iter_spill():
+            row = [fill] * width
+            for pos, val in zip(positions[index], values):
+                row[pos] = val
+            yield row
+
+    def column_types(self):
+        """Types of the measurement columns not holding floats (pass/fail and string values)"""
+
+        column_types = {}
+        for layout in self.layouts:
+            # Layouts cached by earlier versions have no column types
+            column_types.update(getattr(layout, "column_types", None) or {})
+
+        return column_types
+
+    def close(self):
+        """Write the spilled rows in each of the output formats"""
+
+        if "csv" in self.formats:
+            self._write_csv()
+
+        # Columnar part files are only written when there are rows
+        if self.row_count:
+            if "parquet" in self.formats:
+                write_parquet(
+                    self.iter_rows(None),
+                    self.columns,
+                    self.output_file.with_suffix(".parquet"),
+                    self.column_types(),
+                )
+            if "arrow" in self.formats:
+                write_arrow(
+                    self.iter_rows(None),
+                    self.columns,
+                    self.output_file.with_suffix(".arrow"),
+                    self.column_types(),
+                )
+            if "long" in self.formats:
+                self._write_long()
+            if "stats" in self.formats:
+                self._write_stats()
+            if "store" in self.formats:
+                self._write_store()
+
+        self._close_segments()
+
+    def _write_csv(self):
+        """Write (or append) the spilled rows to the CSV file, aligned to its column manifest"""
+
+        # Nothing new to append (e.g. incremental run without new UUT runs)
+        if self.output_file.is_file() and not self.row_count:
+            return
+
+        manifest = ColumnManifest(self.output_file)
+        write_header = manifest.prepare(self.columns)
+        columns = {name: i for i, name in enumerate(manifest.columns)}
+
+        with open(self.output_file, "a", newline="") as f:
+            # Same line terminator as pandas.DataFrame.to_csv
+            writer = csv.writer(f, lineterminator=os.linesep)
+            if write_header and columns:
+                writer.writerow(columns)
+            writer.writerows(self.iter_rows(columns=columns))
+
+        manifest.add_rows(self.row_count)
+        manifest.save()
+
+    def iter_long_rows(self):
+        """Yield one LONG_COLUMNS row per spilled measurement"""
+
+        seq_name = self.output_file.stem
+        layouts = self.layouts
+
+        for index, values, run_id, statuses in self.iter_spill():
+            layout = layouts[index]
+            start, station, serial = values[0], values[1], values[2]
+            offset = len(layout.columns) - len(layout.measurements)
+
+            for measurement, val, status in zip(
+                layout.measurements, values[offset:], statuses
+            ):
+                step_name, units, cop, ll, hl, repeat_index = measurement
+                yield [
+                    run_id,
+                    serial,
+                    station,
+                    start,
+                    seq_name,
+                    step_name,
+                    repeat_index,
+                    units,
+                    cop,
+                    ll,
+                    hl,
+                    val,
+                    status,
+                ]
+
+    def _write_long(self):
+        """Append the spilled measurements to the long output file"""
+
+        long_file = self.output_file.parent.joinpath(LONG_FILE)
+        write_header = not long_file.is_file()
+
+        with open(long_file, "a", newline="") as f:
+            writer = csv.writer(f, lineterminator=os.linesep)
+            if write_header:
+                writer.writerow(LONG_COLUMNS)
+            writer.writerows(self.iter_long_rows())
+
+    def table_stats(self):
+        """Return the TableStats of the spilled rows"""
+
+        stats = TableStats()
+        layouts = self.layouts
+        for index, values, run_id, statuses in self.iter_spill():
+            stats.add_row(layouts[index], values)
+
+        return stats
+
+    def _write_stats(self):
+        """Merge the statistics of the spilled rows into the statistics file"""
+
+        save_stats(self.output_file, self.table_stats())
+
+    def _write_store(self):
+        """Load the spilled rows into the analytical store of the output folder"""
+
+        load_store(
+            store_file(self.output_file.parent),
+            self.output_file.stem,
+            self.iter_spill(),
+            self.layouts,
+            self.sources,
+        )
+
+    def _close_segments(self):
+        for segment, index_map in self._segments:
+            if not isinstance(segment, (str, Path)):
+                segment.close()
+        self._segments = []
+        self._spill = None
+
+
+def _load_spill(f, index_map):
+    while True:
+        try:
+            index, values, run_id, statuses = pickle.load(f)
+        except EOFError:
+            break
+        yield (index_map[index] if index_map else index), values, run_id, statuses
+
+
+def read_spill(spill_path):
+    """Yield the (layout index, values, run id, statuses) of a detached spill file"""
+
+    if spill_path is None:
+        return
+
+    with open(spill_path, "rb") as f:
+        yield from _load_spill(f, None)
+
+
+def count_csv_files(writers):
+    """Validate number of CSV files exported: the sequence tables of <writers> with a CSV file
+
+    The long output file and other CSV files of the output folder are not counted.
+    """
+
+    return sum(1 for writer in writers if writer.output_file.is_file())
+
+
+def export_stream(
+    seq_list, rows, output_folder=OUTPUT_FOLDER, formats=("csv",), source=None
+):
+    """Export (sequence name, RunRecord) pairs from <rows> to one output file per sequence
+
+    <source> identifies the database of the rows (see watermark_key)
+    """
+
+    Path(output_folder).mkdir(parents=True, exist_ok=True)
+
+    writers = {
+        seq_name: SequenceWriter(
+            Path(output_folder).joinpath(seq_name + ".csv"),
+            formats=formats,
+            source=source,
+        )
+        for seq_name in seq_list
+    }
+
+    # Finished runs go straight to disk
+    for seq_name, record in rows:
+        writers[seq_name].write(record)
+
+    for writer in writers.values():
+        writer.close()
+
+    return count_csv_files(writers.values())
@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+USE CASE :: Background extraction jobs for the web applications.
+            Uses custom file_io and database modules.
+            Called by the app.py and web_app.py web applications.
+
+Uploaded databases are extracted by a bounded pool of worker threads instead of
+the HTTP request thread. Each job has its own work folder holding the uploaded
+database and the exported results, so concurrent jobs never share files; the
+uploaded database is deleted once its job ends. Results of the most recent
+finished jobs are kept for download as a zip archive, with the run report of
+the extraction (time, rows and bytes of each stage).
+"""
+
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from database import *
+from file_io import PipelineMetrics
+
+import ts_db
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+FINISHED = "finished"
+FAILED = "failed"
+
+
+class QueueFull(Exception):
+    """Raised when a job is submitted while the queue is at capacity"""
+
+
+class Job:
+    """Extraction of one uploaded database and its progress"""
+
+    def __init__(self, work_folder, filename):
+        self.id = uuid.uuid4().hex
+        self.work_folder = Path(work_folder).joinpath(self.id)
+        self.db_filename = self.work_folder.joinpath(filename)
+        self.output_folder = self.work_folder.joinpath("results")
+        self.report_file = self.work_folder.joinpath("report.json")
+        self.db_hash = None
+        self.status = QUEUED
+        self.error = None
+        self.csv_file_count = None
+        self.runs_total = None
+        self.runs_done = 0
+        self.sequences = {}
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.metrics = None
+        self._lock = threading.Lock()
+
+    def start(self, runs_total):
+        """Record the number of UUT runs to extract"""
+
+        with self._lock:
+            self.runs_total = runs_total
+            self.runs_done = 0
+            self.sequences = {}
+
+    def advance(self, seq_name, count=1):
+        """Record <count> more UUT runs exported to <seq_name>"""
+
+        with self._lock:
+            self.runs_done += count
+            self.sequences[seq_name] = self.sequences.get(seq_name, 0) + count
+
+    def eta(self):
+        """Estimated seconds until the job finishes, or None"""
+
+        if self.status != RUNNING or not self.runs_total or not self.runs_done:
+            return None
+
+        elapsed = time.time() - self.started
+        remaining = max(self.runs_total - self.runs_done, 0)
+
+        return round(elapsed / self.runs_done * remaining, 1)
+
+    def progress(self):
+        """Progress of the job as a JSON-serializable dict"""
+
+        with self._lock:
+            sequences = dict(self.sequences)
+            runs_done = self.runs_done
+
+        return {
+            "runs_total": self.runs_total,
+            "runs_done": runs_done,
+            "sequences": sequences,
+            "eta_s": self.eta(),
+        }
+
+    def as_dict(self):
+        """Status and progress of the job as a JSON-serializable dict"""
+
+        return {
+            "id": self.id,
+            "status": self.status,
+            "filename": self.db_filename.name,
+            "error": self.error,
+            "csv_file_count": self.csv_file_count,
+            "submitted": self.submitted,
+            "started": self.started,
+            "finished": self.finished,
+            "progress": self.progress(),
+        }
+
+
+class JobQueue:
+    """Bounded pool of <workers> threads running extraction jobs in <work_folder>
+
+    At most <max_pending> jobs may be queued or running; the results of the
+    <keep_finished> most recent finished jobs are kept. Extractions are sampled
+    every <profile_interval> seconds when given. <extract_options> are passed to
+    ts_db.main.
+    """
+
+    def __init__(
+        self,
+        work_folder,
+        workers=2,
+        max_pending=16,
+        keep_finished=32,
+        profile_interval=None,
+        **extract_options,
+    ):
+        self.work_folder = Path(work_folder)
+        self.work_folder.mkdir(parents=True, exist_ok=True)
+        self.max_pending = max_pending
+        self.keep_finished = keep_finished
+        self.profile_interval = profile_interval
+        self.extract_options = extract_options
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="extract"
+        )
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, filename, save):
+        """Queue the extraction of an upload named <filename>, saved to disk by calling save(path)
+
+        <save> may return the SHA-256 of the upload to spare hashing it again.
+        """
+
+        with self._lock:
+            pending = sum(
+                1 for job in self._jobs.values() if job.status in (QUEUED, RUNNING)
+            )
+            if pending >= self.max_pending:
+                raise QueueFull(f"{pending} extraction jobs are already pending")
+
+            job = Job(self.work_folder, filename)
+            job.work_folder.mkdir(parents=True)
+            self._jobs[job.id] = job
+
+        try:
+            job.db_hash = save(job.db_filename)
+        except BaseException:
+            with self._lock:
+                del self._jobs[job.id]
+            shutil.rmtree(job.work_folder, ignore_errors=True)
+            raise
+
+        self._executor.submit(self._run, job)
+
+        return job
+
+    def get(self, job_id):
+        """Return the job <job_id> or None"""
+
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def archive(self, job):
+        """Return the path of a zip archive of the results of the finished <job>"""
+
+        archive_file = job.work_folder.joinpath("results.zip")
+        if not archive_file.is_file():
+            shutil.make_archive(
+                str(archive_file.with_suffix("")), "zip", job.output_folder
+            )
+
+        return archive_file
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+    def _run(self, job):
+        job.status = RUNNING
+        job.started = time.time()
+        job.metrics = PipelineMetrics(self.profile_interval, job=job.id)
+
+        try:
+            job.csv_file_count = ts_db.main(
+                job.db_filename,
+                output_folder=job.output_folder,
+                progress=job,
+                db_hash=job.db_hash,
+                metrics=job.metrics,
+                **self.extract_options,
+            )
+            job.status = FINISHED
+        except Exception as e:
+            job.error = str(e)
+            job.status = FAILED
+        finally:
+            job.finished = time.time()
+            job.metrics.finish()
+            job.metrics.save(job.report_file, prometheus=True)
+
+            # Only the results are kept; the database is not needed anymore
+            connection_pool.discard(job.db_filename)
+            job.db_filename.unlink(missing_ok=True)
+
+            self._prune()
+
+    def _prune(self):
+        """Delete the work folders of all but the <keep_finished> latest finished jobs"""
+
+        with self._lock:
+            done = sorted(
+                (job for job in self._jobs.values() if job.finished is not None),
+                key=lambda job: job.finished,
+            )
+            expired = done[: max(len(done) - self.keep_finished, 0)]
+            for job in expired:
+                del self._jobs[job.id]
+
+        for job in expired:
+            shutil.rmtree(job.work_folder, ignore_errors=True)
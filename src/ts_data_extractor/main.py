@@ -10,11 +10,50 @@ Data is converted to CSVs for import into another tool such as Minitab or analyz
 One CSV file will be created for each Sequence File name that was called -
 * Numeric Data - data of steps with Numeric Limit Tests; column names step names and tolerances
 
+The executable starts fast: outputs are written with the standard csv module, and
+tkinter, pyodbc, pickle and tempfile are imported only by the features using them.
+A database path given on the command line skips the file dialog:
+main.exe <database.mdb>
+
 It is assumed that the entirety of the queried data has the same basic test structure
 - step names, tolerances, and step sequences order is not drastically changing.
 Changes to this will require normalization.
 """
 
+import os
+import sys
+from itertools import groupby
+from operator import attrgetter
+
+# Generic output folder for standard input/output processing
+OUTPUT_FOLDER = r"C:\TestStand Results"
+
+# Memory budget of the output tables in MiB (TS_MEMORY_BUDGET_MB); past it, rows spill to disk
+MEMORY_BUDGET = int(os.environ.get("TS_MEMORY_BUDGET_MB", 1024)) * 1024 * 1024
+
+# Numeric step results of a range of UUT runs, ordered for grouping by run
+SQL_RUN_STEPS = """
+SELECT  STEP_RESULT.UUT_RESULT,
+        STEP_RESULT.ID,
+        STEP_RESULT.STEP_PARENT,
+        STEP_RESULT.STEP_NAME,
+        STEP_RESULT.STEP_TYPE,
+        STEP_RESULT.STATUS,
+        STEP_RESULT.ORDER_NUMBER,
+        PROP_RESULT.TYPE_NAME,
+        PROP_RESULT.DATA,
+        PROP_NUMERICLIMIT.COMP_OPERATOR AS COP,
+        PROP_NUMERICLIMIT.HIGH_LIMIT AS HL,
+        PROP_NUMERICLIMIT.LOW_LIMIT AS LL,
+        PROP_NUMERICLIMIT.UNITS AS UNITS
+FROM (STEP_RESULT LEFT JOIN PROP_RESULT ON STEP_RESULT.ID = PROP_RESULT.STEP_RESULT)
+     LEFT JOIN PROP_NUMERICLIMIT ON PROP_RESULT.ID = PROP_NUMERICLIMIT.PROP_RESULT
+WHERE STEP_RESULT.UUT_RESULT >= ? and STEP_RESULT.UUT_RESULT <= ?
+     and STEP_RESULT.STEP_TYPE = 'NumericLimitTest'
+     and PROP_RESULT.TYPE_NAME = 'NumericLimitTest'
+ORDER BY STEP_RESULT.UUT_RESULT ASC, STEP_RESULT.ORDER_NUMBER ASC
+"""
+
 
 def import_source():
     """Open TestStand database (.mdb) with user prompt"""
@@ -54,9 +93,10 @@ def connect_odbc(db_filename):
 def query_seq_calls(crsr):
     """Query Step_SeqCalls Table"""
 
+    # STEP_PARENT of the calling step links nested sequence calls to their caller
     sql_string2 = """
-    SELECT STEP_SEQCALL.STEP_RESULT, STEP_SEQCALL.SEQUENCE_FILE_PATH 
-    FROM STEP_SEQCALL
+    SELECT STEP_SEQCALL.STEP_RESULT, STEP_SEQCALL.SEQUENCE_FILE_PATH, STEP_RESULT.STEP_PARENT
+    FROM STEP_SEQCALL LEFT JOIN STEP_RESULT ON STEP_SEQCALL.STEP_RESULT = STEP_RESULT.ID
     ORDER BY STEP_SEQCALL.STEP_RESULT ASC
     """
 
@@ -69,31 +109,134 @@ def query_seq_calls(crsr):
 def create_sequence_list(sequence_calls):
     """Create list of tuples (x,y) mapping x = Step_Parent to y = Sequence_Name"""
 
-    from pathlib import Path
+    from pathlib import PureWindowsPath
 
-    seq_list = []
+    # Insertion-ordered dict of each unique sequence in the .mdb table
+    seq_names = {}
 
     for sequence in sequence_calls:
-        # Update raw filepaths to final table names
-        sequence[1] = "Test Data " + Path(sequence[1]).stem
+        # Update raw filepaths to final table names (TestStand logs Windows paths)
+        sequence[1] = "Test Data " + PureWindowsPath(sequence[1]).stem
+        seq_names[sequence[1]] = None
 
-        # Create list containing each unique sequence in the .mdb table
-        while sequence[1] not in seq_list:
-            seq_list.append(sequence[1])
+    return list(seq_names)
 
-    return seq_list
 
+def create_sequence_routes(sequence_calls):
+    """Map each sequence call step ID to the table name of its root sequence call
 
-def create_table_dict(seq_list):
-    """Query Step_SeqCalls Table"""
+    Steps are routed by their STEP_PARENT. Nested sequence calls resolve to the
+    outermost sequence call, so every step of a UUT run lands in the same table.
+    Call after create_sequence_list so that sequence names are table names.
+    """
 
-    tbl_dict = {}
+    names = {}
+    parents = {}
+    for sequence in sequence_calls:
+        names[sequence[0]] = sequence[1]
+        parents[sequence[0]] = sequence[2]
 
-    # Assign seq_list entries as keys with empty array as each entry's value (to be populated)
-    for seq_name in seq_list:
-        tbl_dict[f"{seq_name}"] = []
+    routes = {}
+    for call_id in names:
+        # Walk up to the first caller that is not itself called from a sequence call
+        chain = []
+        root = call_id
+        while root not in routes and parents[root] in names and root not in chain:
+            chain.append(root)
+            root = parents[root]
+
+        seq_name = routes.get(root, names[root])
+        routes[root] = seq_name
+        for x in chain:
+            routes[x] = seq_name
+
+    return routes
+
+
+class OutputTables(dict):
+    """Output tables by sequence name, spilled to temporary files past <memory_budget> bytes
+
+    Rows are kept in memory until the tables together exceed the budget; all rows in
+    memory are then appended to a temporary file per table. Spilled tables are read
+    back one chunk at a time on export.
+    """
+
+    def __init__(self, seq_list, memory_budget=MEMORY_BUDGET):
+        super().__init__((f"{seq_name}", []) for seq_name in seq_list)
+        self.memory_budget = memory_budget
+        self.memory_used = 0
+        self.spills = {}
+        self.columns = {}
+
+    def append(self, seq_name, data):
+        """Add row <data> to table <seq_name>, spilling every table if over budget"""
+
+        self[seq_name].append(data)
+
+        # Column names are interned and shared by all rows; count the dict and values
+        self.memory_used += sys.getsizeof(data) + sum(map(sys.getsizeof, data.values()))
+        if self.memory_used > self.memory_budget:
+            self.spill()
+
+    def spill(self):
+        """Move the rows in memory to the temporary files of their tables"""
+
+        import pickle
+        import tempfile
+
+        for seq_name, rows in self.items():
+            if not rows:
+                continue
+
+            # Union of column names in order of first appearance, as in DataFrame.from_records
+            columns = self.columns.setdefault(seq_name, {})
+            for data in rows:
+                columns.update(dict.fromkeys(data))
+
+            f = self.spills.get(seq_name)
+            if f is None:
+                f = self.spills[seq_name] = tempfile.TemporaryFile()
+            pickle.dump(rows, f, pickle.HIGHEST_PROTOCOL)
+            self[seq_name] = []
+
+        self.memory_used = 0
+
+    def chunks(self, seq_name):
+        """Yield the rows of table <seq_name> in lists, spilled rows first"""
+
+        f = self.spills.get(seq_name)
+        if f is not None:
+            import pickle
+
+            f.seek(0)
+            while True:
+                try:
+                    yield pickle.load(f)
+                except EOFError:
+                    break
+
+        if self[seq_name]:
+            yield self[seq_name]
+
+    def column_names(self, seq_name):
+        """Column names of table <seq_name>, spilled and in memory"""
+
+        columns = dict(self.columns.get(seq_name, {}))
+        for data in self[seq_name]:
+            columns.update(dict.fromkeys(data))
+
+        return list(columns)
 
-    return tbl_dict
+    def close(self):
+        for f in self.spills.values():
+            f.close()
+        self.spills = {}
+
+
+def create_table_dict(seq_list, memory_budget=MEMORY_BUDGET):
+    """Create the output tables of <seq_list>, kept in memory up to <memory_budget> bytes"""
+
+    return OutputTables(seq_list, memory_budget)
 
 
 def query_uut_runs(crsr):
@@ -131,16 +274,11 @@ def query_uut_runs(crsr):
 def generate_test_table(crsr, uut_runs, tbl_dict, sequence_calls):
     """Construct Test Results Data Table"""
 
+    routes = create_sequence_routes(sequence_calls)
+
     for run in uut_runs:
         # Identifying Metadata for each Test Run
-        data = {
-            "Test Start": run.START_DATE_TIME,
-            "Station ID": run.STATION_ID,
-            "Serial Number": run.UUT_SERIAL_NUMBER,
-            "Test Socket": run.TEST_SOCKET_INDEX,
-            "Test Status": run.UUT_STATUS,
-            "Test Time (s)": round(run.EXECUTION_TIME, None),
-        }
+        data = run_metadata(run)
 
         # Query individual step results inside each Test Run
         crsr.execute(
@@ -170,98 +308,332 @@ def generate_test_table(crsr, uut_runs, tbl_dict, sequence_calls):
         run_steps = crsr.fetchall()
 
         # Extract, construct, and append Test Data values to key-defined Test Data Tables
-        for step in run_steps:
-            # Convert data to Python types
-            val = None
-            if step.TYPE_NAME == "Boolean":
-                val = bool(step.DATA)
+        add_step_values(data, run_steps)
 
-            elif step.TYPE_NAME == "Number" or step.TYPE_NAME == "NumericLimitTest":
-                val = float(step.DATA)
+        # Append data to the appropriate output table according to dictionary value
+        seq_name = route_run(routes, run_steps)
+        if seq_name is not None:
+            tbl_dict.append(f"{seq_name}", data)
 
-            # Extract desired data
-            if (
-                step.STEP_TYPE == "NumericLimitTest"
-                and step.STATUS != "Skipped"
-                and val is not None
-            ):
-                # Construct limit info string based on comparison type
-                if step.COP == "LT":
-                    limit_info = f"< {step.LL}"
-                elif step.COP == "LE":
-                    limit_info = f"<= {step.LL}"
-                elif step.COP == "GT":
-                    limit_info = f"> {step.LL}"
-                elif step.COP == "GE":
-                    limit_info = f">= {step.LL}"
-                elif step.COP == "GTLT":
-                    limit_info = f"{step.LL} < x < {step.HL}"
-                elif step.COP == "GELE":
-                    limit_info = f"{step.LL} <= x <= {step.HL}"
-                elif step.COP == "EQT":
-                    limit_info = f"{step.LL} <= x <= {step.HL}"
-                elif step.COP == "EQ":
-                    limit_info = f" == {step.LL}"
-                else:
-                    break
+    # print("---- Test Data generated ----")
+
+
+def generate_test_table_bulk(
+    crsr, uut_runs, tbl_dict, sequence_calls, chunk_size=2000, fetch_size=5000
+):
+    """Construct Test Results Data Table with one step query per chunk of UUT runs"""
+
+    routes = create_sequence_routes(sequence_calls)
+
+    def build_chunk(chunk):
+        run_ids = {run.ID for run in chunk}
+
+        # Group step rows by UUT run (rows arrive ordered by UUT_RESULT, ORDER_NUMBER)
+        steps_by_run = {}
+        rows = iter_fetchmany(
+            query_run_steps(crsr, chunk[0].ID, chunk[-1].ID), fetch_size
+        )
+        for run_id, run_steps in groupby(rows, key=attrgetter("UUT_RESULT")):
+            if run_id in run_ids:
+                steps_by_run[run_id] = list(run_steps)
+
+        results = {}
+        for run in chunk:
+            run_steps = steps_by_run.pop(run.ID, None)
+            if not run_steps:
+                # Runs without numeric steps cannot be routed to a sequence file
+                continue
+
+            seq_name = route_run(routes, run_steps)
+            if seq_name is None:
+                continue
 
-                # Different step runs will have repeated step name.
-                repeat_index = 0
+            data = run_metadata(run)
+            add_step_values(data, run_steps)
+            results[run.ID] = seq_name, data
+
+        return results
+
+    # Build rows in the same order as the per-run query path
+    for seq_name, data in iter_chunks_in_order(uut_runs, chunk_size, build_chunk):
+        tbl_dict.append(f"{seq_name}", data)
+
+
+def iter_chunks_in_order(uut_runs, chunk_size, build_chunk):
+    """Yield the results of <build_chunk> for chunks of <uut_runs> by ID, in <uut_runs> order
+
+    The UUT runs are ordered by start time, but each step query covers the ID range
+    of one chunk: the runs are chunked in ID order so that the ranges stay dense when
+    IDs are not in start time order (merged or restored databases, identity gaps).
+    <build_chunk> maps a chunk of runs (ascending IDs) to {run ID: result}; results
+    are only held back until the runs before them in <uut_runs> are built.
+    Same as database.iter_chunks_in_order, copied because this script uses no modules.
+    """
+
+    if not chunk_size:
+        chunk_size = max(len(uut_runs), 1)
+
+    runs_by_id = sorted(uut_runs, key=attrgetter("ID"))
+    results = {}
+    position = 0
+
+    for i in range(0, len(runs_by_id), chunk_size):
+        chunk = runs_by_id[i : i + chunk_size]
+        results.update(build_chunk(chunk))
+
+        # Every run with an ID up to the end of this chunk is built
+        last_id = chunk[-1].ID
+        while position < len(uut_runs) and uut_runs[position].ID <= last_id:
+            result = results.pop(uut_runs[position].ID, None)
+            position += 1
+            if result is not None:
+                yield result
+
+
+def query_run_steps(crsr, first_id, last_id):
+    """Query numeric step results of all UUT runs with IDs in [first_id, last_id]"""
+
+    crsr.execute(SQL_RUN_STEPS, (first_id, last_id))
+
+    return crsr
+
+
+def iter_fetchmany(crsr, fetch_size=5000):
+    """Yield rows of the executed query in batches of <fetch_size>"""
+
+    while True:
+        rows = crsr.fetchmany(fetch_size)
+        if not rows:
+            break
+        yield from rows
+
+
+def run_metadata(run):
+    """Identifying Metadata for a Test Run"""
+
+    return {
+        "Test Start": run.START_DATE_TIME,
+        "Station ID": run.STATION_ID,
+        "Serial Number": run.UUT_SERIAL_NUMBER,
+        "Test Socket": run.TEST_SOCKET_INDEX,
+        "Test Status": run.UUT_STATUS,
+        "Test Time (s)": round(run.EXECUTION_TIME, None),
+    }
+
+
+def add_step_values(data, run_steps):
+    """Add the measurements of <run_steps> to <data> and return the last step processed"""
+
+    step = None
+
+    for step in run_steps:
+        # Convert data to Python types
+        val = None
+        if step.TYPE_NAME == "Boolean":
+            val = bool(step.DATA)
+
+        elif step.TYPE_NAME == "Number" or step.TYPE_NAME == "NumericLimitTest":
+            try:
+                val = float(step.DATA)
+            except ValueError:
+                print("Data is not a valid number.")
+
+        # Extract desired data
+        if (
+            step.STEP_TYPE == "NumericLimitTest"
+            and step.STATUS != "Skipped"
+            and val is not None
+        ):
+            # Construct limit info string based on comparison type
+            if step.COP == "LT":
+                limit_info = f"< {step.LL}"
+            elif step.COP == "LE":
+                limit_info = f"<= {step.LL}"
+            elif step.COP == "GT":
+                limit_info = f"> {step.LL}"
+            elif step.COP == "GE":
+                limit_info = f">= {step.LL}"
+            elif step.COP == "GTLT":
+                limit_info = f"{step.LL} < x < {step.HL}"
+            elif step.COP == "GELE":
+                limit_info = f"{step.LL} <= x <= {step.HL}"
+            elif step.COP == "EQT":
+                limit_info = f"{step.LL} <= x <= {step.HL}"
+            elif step.COP == "EQ":
+                limit_info = f" == {step.LL}"
+            else:
+                break
+
+            # Different step runs will have repeated step name.
+            repeat_index = 0
+            key_name = f"{step.STEP_NAME} ({step.UNITS}) {limit_info} [{repeat_index}]"
+
+            # Append numeric suffix to distinguish.
+            while key_name in data:
+                repeat_index += 1
                 key_name = (
                     f"{step.STEP_NAME} ({step.UNITS}) {limit_info} [{repeat_index}]"
                 )
 
-                # Append numeric suffix to distinguish.
-                while key_name in data:
-                    repeat_index += 1
-                    key_name = (
-                        f"{step.STEP_NAME} ({step.UNITS}) {limit_info} [{repeat_index}]"
-                    )
+            # Add new key-value pair with precision of 3 decimal places
+            data[sys.intern(key_name)] = round(val, 3)
 
-                # Add new key-value pair with precision of 3 decimal places
-                data[key_name] = round(val, 3)
+    return step
 
-        # Convert STEP_PARENT index to the corresponding sequence file dictionary value
-        dict_val = ""
-        for x, y in sequence_calls:
-            if x == step.STEP_PARENT:
-                dict_val = y
 
-        # Append data to the appropriate output table according to dictionary value
-        tbl_dict[f"{dict_val}"].append(data)
+def route_run(routes, run_steps):
+    """Return the table name of the UUT run made of <run_steps>, or None if it cannot be routed"""
 
-    # print("---- Test Data generated ----")
+    for step in run_steps:
+        seq_name = routes.get(step.STEP_PARENT)
+        if seq_name is not None:
+            return seq_name
 
+    return None
 
-def export_results(seq_list, tbl_dict):
-    """Export each output table to CSV file"""
 
-    import pandas as pd
-    from pathlib import Path
-    from tkinter import Tk, messagebox
+class ColumnManifest:
+    """Columns and segments of one output CSV file, in "<table>.manifest.json" next to it
 
-    # Prevent the root window from appearing
-    Tk().withdraw()
+    Rows appended to a CSV file are aligned to the union of the columns ever exported
+    to it. When new columns appear, the CSV file is moved (not rewritten) to the
+    ".segments" folder and a new one is started with the widened header; the
+    manifest lists the segments in order so they can be read back as one table.
 
-    message_title = "DB Extraction FAILED"
-    message = ""
+    Same manifest format as file_io/manifest.py, copied because this script uses no
+    modules; keep the two in step.
+    """
+
+    def __init__(self, csv_file):
+        import json
+        from pathlib import Path
+
+        self.csv_file = Path(csv_file)
+        self.manifest_file = self.csv_file.with_suffix(".manifest.json")
+        self.columns = []
+        self.segments = []
+
+        if self.manifest_file.is_file():
+            with open(self.manifest_file, "r") as f:
+                data = json.load(f)
+            if data.get("version") == 1:
+                self.columns = data["columns"]
+                self.segments = data["segments"]
+                return
+
+        # Exported before manifests: a single segment of unknown row count
+        if self.csv_file.is_file():
+            import csv
+
+            with open(self.csv_file, "r", newline="") as f:
+                self.columns = next(csv.reader(f), [])
+            self.segments = [{"file": self.csv_file.name, "rows": None}]
+
+    def prepare(self, columns):
+        """Add the new <columns> to the manifest; return True when a header must be written"""
+
+        known = set(self.columns)
+        new = [name for name in columns if name not in known]
+        self.columns.extend(new)
+
+        if self.csv_file.is_file() and known and not new:
+            return False
+
+        if self.csv_file.is_file() and known:
+            # Move the CSV file to the segment folder
+            segment_folder = self.csv_file.parent.joinpath(".segments")
+            segment_folder.mkdir(exist_ok=True)
+            index = len(self.segments) - 1
+            while True:
+                segment_file = segment_folder.joinpath(
+                    f"{self.csv_file.stem}.{index:05d}.csv"
+                )
+                if not segment_file.exists():
+                    break
+                index += 1
+            os.replace(self.csv_file, segment_file)
+            self.segments[-1]["file"] = f".segments/{segment_file.name}"
+        else:
+            # A CSV file without columns (empty table) holds no rows to keep
+            self.csv_file.write_bytes(b"")
+
+        if self.segments and self.segments[-1]["file"] == self.csv_file.name:
+            self.segments[-1]["rows"] = 0
+        else:
+            self.segments.append({"file": self.csv_file.name, "rows": 0})
+
+        return True
+
+    def add_rows(self, count):
+        if self.segments[-1]["rows"] is not None:
+            self.segments[-1]["rows"] += count
+
+    def save(self):
+        import json
+
+        data = {"version": 1, "columns": self.columns, "segments": self.segments}
+
+        # Replace the manifest in one step so an interrupted export cannot corrupt it
+        tmp_file = self.manifest_file.with_suffix(".tmp")
+        with open(tmp_file, "w") as f:
+            json.dump(data, f, indent=2)
+        tmp_file.replace(self.manifest_file)
+
+
+def write_results(seq_list, tbl_dict, output_folder=OUTPUT_FOLDER):
+    """Write each output table to its CSV file and return the file names written"""
+
+    import csv
+    from pathlib import Path
 
-    # Generic output folder for standard input/output processing
-    output_folder = r"C:\TestStand Results"
     Path(output_folder).mkdir(parents=True, exist_ok=True)
+    exported = []
 
     for seq_name in seq_list:
         filename = seq_name + ".csv"
-        output_file = output_folder + "\\" + filename
-        filepath = Path(output_file)
-        if filepath.is_file():
-            write_header = False
-        else:
-            write_header = True
-        pd.DataFrame.from_records(tbl_dict[f"{seq_name}"]).to_csv(
-            output_file, mode="a", index=False, header=write_header
-        )
+        output_file = Path(output_folder).joinpath(filename)
 
+        # Align the rows to the columns of the earlier exports
+        manifest = ColumnManifest(output_file)
+        write_header = manifest.prepare(tbl_dict.column_names(seq_name))
+        row_count = 0
+
+        with open(output_file, "a", newline="") as f:
+            # Same output as pandas.DataFrame.to_csv: empty cells for missing values
+            # and the platform line terminator
+            writer = csv.DictWriter(
+                f,
+                manifest.columns,
+                restval="",
+                extrasaction="ignore",
+                lineterminator=os.linesep,
+            )
+            if write_header:
+                writer.writeheader()
+
+            # Spilled rows are read back a chunk at a time
+            for chunk in tbl_dict.chunks(seq_name):
+                writer.writerows(chunk)
+                row_count += len(chunk)
+
+        manifest.add_rows(row_count)
+        manifest.save()
+        exported.append(filename)
+
+    return exported
+
+
+def show_results(exported, output_folder=OUTPUT_FOLDER):
+    """Tell the user which CSV files were exported"""
+
+    from tkinter import Tk, messagebox
+
+    # Prevent the root window from appearing
+    Tk().withdraw()
+
+    message_title = "DB Extraction FAILED"
+    message = ""
+    for filename in exported:
         message += f"-- {filename} was exported to {output_folder} \n"
 
     if message:
@@ -273,17 +645,34 @@ def export_results(seq_list, tbl_dict):
     )
 
 
-def main():
-    db_filename = import_source()
-    crsr = connect_odbc(db_filename)
+def export_results(seq_list, tbl_dict, output_folder=OUTPUT_FOLDER):
+    """Export each output table to CSV file"""
+
+    show_results(write_results(seq_list, tbl_dict, output_folder), output_folder)
+
+
+def extract(crsr, output_folder=OUTPUT_FOLDER, memory_budget=MEMORY_BUDGET):
+    """Extract the TestStand database of <crsr> to CSV files; return the file names written"""
+
     sequence_calls = query_seq_calls(crsr)
     seq_list = create_sequence_list(sequence_calls)
-    tbl_dict = create_table_dict(seq_list)
+    tbl_dict = create_table_dict(seq_list, memory_budget)
     uut_runs = query_uut_runs(crsr)
 
-    generate_test_table(crsr, uut_runs, tbl_dict, sequence_calls)
+    try:
+        generate_test_table_bulk(crsr, uut_runs, tbl_dict, sequence_calls)
+        return write_results(seq_list, tbl_dict, output_folder)
+    finally:
+        tbl_dict.close()
+
+
+def main(memory_budget=MEMORY_BUDGET, db_filename=None):
+    if db_filename is None:
+        db_filename = sys.argv[1] if len(sys.argv) > 1 else import_source()
+    crsr = connect_odbc(db_filename)
 
-    export_results(seq_list, tbl_dict)
+    exported = extract(crsr, OUTPUT_FOLDER, memory_budget)
+    show_results(exported, OUTPUT_FOLDER)
 
 
 if __name__ == "__main__":
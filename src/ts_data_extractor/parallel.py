@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+USE CASE :: Parallel extraction of one TestStand database across UUT_RESULT ID ranges.
+            Uses custom file_io and database modules.
+            Called by the ts_db.py script when more than one worker is requested.
+
+The ordered UUT runs are split into contiguous partitions. Each worker process opens
+its own connection, extracts the runs of one partition and spills the rows of each
+sequence to a temporary file. The parent appends the spill files to the per-sequence
+writers in partition order, so the output rows are in the same order as a serial run.
+"""
+
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from database import *
+from file_io import *
+
+# Partitions per worker, so that uneven partitions do not leave workers idle
+PARTITIONS_PER_WORKER = 4
+
+# Extraction settings of the current worker process (set by init_worker)
+_worker = {}
+
+
+def split_partitions(run_ids, partition_count):
+    """Split the ordered <run_ids> into at most <partition_count> contiguous lists"""
+
+    size = max(-(-len(run_ids) // max(partition_count, 1)), 1)
+
+    return [run_ids[i : i + size] for i in range(0, len(run_ids), size)]
+
+
+def init_worker(
+    db_filename,
+    backend,
+    routes,
+    spill_dir,
+    vectorized=False,
+    run_filter=None,
+    all_types=False,
+):
+    """Store the extraction settings shared by every partition of a worker process"""
+
+    _worker.update(
+        db_filename=db_filename,
+        backend=backend,
+        routes=routes,
+        spill_dir=spill_dir,
+        iter_rows=test_row_iterator(vectorized, all_types),
+        run_filter=run_filter,
+    )
+
+    # Connections must not be shared with the parent process (fork start method)
+    _worker["pool"] = ConnectionPool()
+
+
+def extract_partition(run_ids):
+    """Extract the UUT runs <run_ids>; return {sequence name: (spill path, layouts, row count)}"""
+
+    writers = {}
+
+    with _worker["pool"].cursor(_worker["db_filename"], _worker["backend"]) as crsr:
+        # Rows of the partition's UUT runs, in the parent's order
+        runs_by_id = {
+            run.ID: run for run in query_uut_runs(crsr, min(run_ids) - 1, max(run_ids))
+        }
+        uut_runs = [runs_by_id[run_id] for run_id in run_ids if run_id in runs_by_id]
+
+        for seq_name, record in _worker["iter_rows"](
+            crsr, uut_runs, _worker["routes"], run_filter=_worker["run_filter"]
+        ):
+            writer = writers.get(seq_name)
+            if writer is None:
+                writer = writers[seq_name] = SequenceWriter(
+                    None, spill_dir=_worker["spill_dir"]
+                )
+            writer.write(record)
+
+    return {seq_name: writer.detach() for seq_name, writer in writers.items()}
+
+
+def export_parallel(
+    db_filename,
+    backend,
+    uut_runs,
+    routes,
+    seq_list,
+    output_folder=OUTPUT_FOLDER,
+    workers=2,
+    formats=("csv",),
+    vectorized=False,
+    progress=None,
+    run_filter=None,
+    all_types=False,
+):
+    """Extract <uut_runs> with <workers> processes and export one output file per sequence"""
+
+    Path(output_folder).mkdir(parents=True, exist_ok=True)
+
+    run_ids = [run.ID for run in uut_runs]
+    partitions = split_partitions(run_ids, workers * PARTITIONS_PER_WORKER)
+
+    writers = {
+        seq_name: SequenceWriter(
+            Path(output_folder).joinpath(seq_name + ".csv"),
+            formats=formats,
+            source=watermark_key(db_filename),
+        )
+        for seq_name in seq_list
+    }
+
+    with tempfile.TemporaryDirectory() as spill_dir:
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=init_worker,
+            initargs=(
+                db_filename,
+                backend,
+                routes,
+                spill_dir,
+                vectorized,
+                run_filter,
+                all_types,
+            ),
+        ) as executor:
+            # map returns the partitions in submission order
+            for segments in executor.map(extract_partition, partitions):
+                for seq_name, (spill_path, layouts, row_count) in segments.items():
+                    writers[seq_name].add_segment(spill_path, layouts, row_count)
+                    if progress is not None:
+                        progress.advance(seq_name, row_count)
+
+        for writer in writers.values():
+            writer.close()
+
+    return count_csv_files(writers.values())
@@ -0,0 +1,319 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+USE CASE :: Routes shared by the app.py and web_app.py web applications.
+            Uses custom file_io modules, background jobs (jobs.py) and uploads (uploads.py).
+
+Uploads (single request or resumable in parts), extraction jobs and their progress,
+run report and results, the exported result tables and the result store. An app
+registers the blueprint with its job queue, upload sessions and output folder:
+
+register_routes(app, job_queue, upload_sessions, output_folder, allowed_extensions)
+
+/results and /store/* browse the output folder of the app (e.g. exported by
+ts_db.py or batch.py). Uploaded databases are extracted to the work folder of their
+job; their results are browsed with /jobs/<job_id>/results instead.
+"""
+
+from pathlib import Path
+
+from flask import Blueprint, current_app, jsonify, request, send_file, url_for
+from werkzeug.utils import secure_filename
+
+from file_io import ResultStore, list_result_files, open_result_table
+from jobs import FINISHED, QueueFull
+from uploads import InvalidUpload, UploadOffsetError
+from uploads import parse_content_range, save_stream
+
+blueprint = Blueprint("extraction", __name__)
+
+
+class RouteState:
+    """Job queue, upload sessions and folders used by the routes of one app"""
+
+    def __init__(self, job_queue, upload_sessions, output_folder, allowed_extensions):
+        self.job_queue = job_queue
+        self.upload_sessions = upload_sessions
+        self.output_folder = output_folder
+        self.allowed_extensions = allowed_extensions
+        self.result_store = ResultStore(output_folder)
+
+
+def register_routes(
+    app, job_queue, upload_sessions, output_folder, allowed_extensions=("mdb",)
+):
+    """Register the shared routes on <app>"""
+
+    app.extensions["extraction"] = RouteState(
+        job_queue, upload_sessions, output_folder, allowed_extensions
+    )
+    app.register_blueprint(blueprint)
+
+
+def state():
+    return current_app.extensions["extraction"]
+
+
+def check_file_extension(filename):
+    return filename.split(".")[-1] in state().allowed_extensions
+
+
+# Result page after user selects file to upload
+@blueprint.route("/upload", methods=["GET", "POST"])
+def upload_file():
+    if request.method == "POST":  # check if the method is post
+        f = request.files["file"]  # get the file from the files object
+
+        # Saving the file in its job's work folder and queue the extraction
+        if check_file_extension(f.filename):
+            return submit_upload(f.filename, f.stream)
+
+        else:
+            return "The file extension is not allowed"
+
+
+# Upload with the database file as the raw request body, streamed to disk
+@blueprint.route("/upload/<filename>", methods=["PUT"])
+def stream_upload(filename):
+    if not check_file_extension(filename):
+        return "The file extension is not allowed", 400
+
+    return submit_upload(filename, request.stream)
+
+
+def submit_upload(filename, stream):
+    """Save the upload <stream> to a new job's work folder and queue the extraction"""
+
+    max_bytes = current_app.config["MAX_CONTENT_LENGTH"]
+
+    try:
+        job = state().job_queue.submit(
+            secure_filename(filename),
+            lambda db_filepath: save_stream(stream, db_filepath, max_bytes),
+        )
+    except QueueFull as e:
+        return str(e), 503
+    except InvalidUpload as e:
+        return str(e), 400
+
+    status_url = url_for(".job_status", job_id=job.id)
+    return jsonify(job.as_dict()), 202, {"Location": status_url}
+
+
+# Start a resumable upload of the database file named in the "filename" parameter
+@blueprint.route("/uploads", methods=["POST"])
+def create_upload():
+    filename = request.values.get("filename", "")
+    if not check_file_extension(filename):
+        return "The file extension is not allowed", 400
+
+    upload_id = state().upload_sessions.create(secure_filename(filename))
+    upload_url = url_for(".upload_part", upload_id=upload_id)
+
+    return jsonify({"id": upload_id, "offset": 0}), 201, {"Location": upload_url}
+
+
+# Current offset of a resumable upload (GET) or next part of it (PUT)
+@blueprint.route("/uploads/<upload_id>", methods=["GET", "PUT"])
+def upload_part(upload_id):
+    upload_sessions = state().upload_sessions
+
+    try:
+        writer = upload_sessions.get(upload_id)
+    except InvalidUpload as e:
+        upload_sessions.discard(upload_id)
+        return str(e), 400
+    if writer is None:
+        return "Unknown upload", 404
+
+    if request.method == "PUT":
+        # Parts give their position as "bytes <first>-<last>/<total>"; a bad
+        # header only rejects the part, the upload can still be resumed
+        try:
+            offset = parse_content_range(request.headers.get("Content-Range"))
+        except InvalidUpload as e:
+            return str(e), 400
+
+        # Content that is not a database (or too large) ends the upload
+        try:
+            writer.write_stream(request.stream, offset)
+        except UploadOffsetError:
+            return jsonify({"id": upload_id, "offset": writer.offset}), 409
+        except InvalidUpload as e:
+            upload_sessions.discard(upload_id)
+            return str(e), 400
+
+    return jsonify({"id": upload_id, "offset": writer.offset})
+
+
+# Queue the extraction of a completely uploaded database
+@blueprint.route("/uploads/<upload_id>/complete", methods=["POST"])
+def complete_upload(upload_id):
+    upload_sessions = state().upload_sessions
+    writer = upload_sessions.get(upload_id)
+    if writer is None:
+        return "Unknown upload", 404
+
+    try:
+        job = state().job_queue.submit(
+            writer.file_path.name,
+            lambda db_filepath: upload_sessions.complete(upload_id, db_filepath),
+        )
+    except QueueFull as e:
+        return str(e), 503
+    except InvalidUpload as e:
+        upload_sessions.discard(upload_id)
+        return str(e), 400
+
+    status_url = url_for(".job_status", job_id=job.id)
+    return jsonify(job.as_dict()), 202, {"Location": status_url}
+
+
+# Status and progress of an extraction job
+@blueprint.route("/jobs/<job_id>")
+def job_status(job_id):
+    job = state().job_queue.get(job_id)
+    if job is None:
+        return "Unknown job", 404
+
+    return jsonify(job.as_dict())
+
+
+# Runs processed, per-sequence run counts and ETA of an extraction job
+@blueprint.route("/jobs/<job_id>/progress")
+def job_progress(job_id):
+    job = state().job_queue.get(job_id)
+    if job is None:
+        return "Unknown job", 404
+
+    return jsonify(job.progress())
+
+
+# Run report of an extraction job: time, rows and bytes of each stage
+@blueprint.route("/jobs/<job_id>/report")
+def job_report(job_id):
+    job = state().job_queue.get(job_id)
+    if job is None:
+        return "Unknown job", 404
+    if job.metrics is None:
+        return f"Job is {job.status}", 409
+
+    # Prometheus text exposition format on request
+    if request.args.get("format") == "prometheus":
+        return (
+            job.metrics.prometheus(),
+            200,
+            {"Content-Type": "text/plain; version=0.0.4"},
+        )
+
+    return jsonify(job.metrics.report())
+
+
+# Zip archive of the exported files of a finished extraction job
+@blueprint.route("/jobs/<job_id>/download")
+def job_download(job_id):
+    job_queue = state().job_queue
+    job = job_queue.get(job_id)
+    if job is None:
+        return "Unknown job", 404
+    if job.status != FINISHED:
+        return f"Job is {job.status}", 409
+
+    return send_file(
+        job_queue.archive(job),
+        as_attachment=True,
+        download_name=f"{job.db_filename.stem} results.zip",
+    )
+
+
+# Exported CSV files, browsed a page at a time
+@blueprint.route("/results")
+def result_files():
+    return jsonify(list_result_files(state().output_folder))
+
+
+@blueprint.route("/results/<filename>")
+def result_table(filename):
+    return view_result_table(state().output_folder, filename)
+
+
+@blueprint.route("/jobs/<job_id>/results")
+def job_result_files(job_id):
+    job = state().job_queue.get(job_id)
+    if job is None:
+        return "Unknown job", 404
+
+    return jsonify(list_result_files(job.output_folder))
+
+
+@blueprint.route("/jobs/<job_id>/results/<filename>")
+def job_result_table(job_id, filename):
+    job = state().job_queue.get(job_id)
+    if job is None:
+        return "Unknown job", 404
+
+    return view_result_table(job.output_folder, filename)
+
+
+def view_result_table(folder, filename):
+    """Page of the result table <filename> in <folder> selected by the request arguments
+
+    page, page_size, column (repeated), sort, desc and, for indexed (metadata)
+    columns, "<column>=<value>" or "<column>.min"/"<column>.max" filters
+    """
+
+    if filename not in list_result_files(folder):
+        return "Unknown result file", 404
+
+    table = open_result_table(Path(folder).joinpath(filename))
+
+    filters = {}
+    for name in table.metadata:
+        if name in request.args:
+            filters[name] = request.args[name]
+        elif f"{name}.min" in request.args or f"{name}.max" in request.args:
+            filters[name] = (
+                request.args.get(f"{name}.min"),
+                request.args.get(f"{name}.max"),
+            )
+
+    try:
+        return jsonify(
+            table.page(
+                page=request.args.get("page", 0, type=int),
+                page_size=min(request.args.get("page_size", 100, type=int), 1000),
+                columns=request.args.getlist("column"),
+                sort=request.args.get("sort"),
+                descending=request.args.get("desc", "0") not in ("0", "false"),
+                filters=filters,
+            )
+        )
+    except (KeyError, ValueError) as e:
+        return str(e), 400
+
+
+# Indexed lookups of the runs and measurements loaded by the "store" output format
+@blueprint.route("/store/runs")
+def store_runs():
+    return query_store(state().result_store.runs, 1000)
+
+
+@blueprint.route("/store/measurements")
+def store_measurements():
+    return query_store(state().result_store.measurements, 10000)
+
+
+def query_store(lookup, default_limit):
+    """Rows of the store <lookup> selected by the request arguments
+
+    serial_number (with "*" and "?" wildcards), station, sequence, status, start,
+    end, limit and, for measurements, step_name and step_status
+    """
+
+    filters = request.args.to_dict()
+    limit = filters.pop("limit", default_limit)
+
+    try:
+        return jsonify(lookup(limit=int(limit), **filters))
+    except ValueError as e:
+        return str(e), 400
@@ -19,21 +19,36 @@ from database import *
 from file_io import *
 
 
-def main():
+def main(incremental=False, metrics=None):
+    if metrics is None:
+        metrics = PipelineMetrics()
 
     # Load and set up the dataset
     db_filename = import_source()
-    crsr = connect_odbc(db_filename)
-    sequence_calls = query_seq_calls(crsr)
-    seq_list = create_sequence_list(sequence_calls)
-    tbl_dict = create_table_dict(seq_list)
-    uut_runs = query_uut_runs(crsr)
-
-    # Generate test results table by sequence name (save to memory)
-    generate_test_table(crsr, uut_runs, tbl_dict, sequence_calls)
-
-    # Export test results in memory to CSV files
-    export_results(seq_list, tbl_dict)
+    watermark = load_watermark(db_filename) if incremental else None
+    with connection_pool.cursor(db_filename) as crsr:
+        with metrics.stage("query_seq_calls") as stage:
+            sequence_calls = query_seq_calls(crsr)
+            stage.rows += len(sequence_calls)
+            seq_list = create_sequence_list(sequence_calls)
+            routes = create_sequence_routes(sequence_calls)
+        with metrics.stage("query_uut_runs") as stage:
+            uut_runs = query_uut_runs(crsr, watermark["ID"] if watermark else None)
+            uut_runs = unexported_runs(uut_runs, watermark)
+            stage.rows += len(uut_runs)
+
+        # Stream test results rows by sequence name to CSV files
+        rows = iter_test_rows(metrics.cursor(crsr, "step_queries"), uut_runs, routes)
+        rows = metrics.iterate(rows, "transform", exclude=["step_queries"])
+        with metrics.profile(), metrics.stage(
+            "export", OUTPUT_FOLDER, exclude=EXTRACT_STAGES
+        ):
+            export_stream(seq_list, rows, source=watermark_key(db_filename))
+    save_watermark(db_filename, uut_runs)
+
+    # Time, rows and bytes of each stage
+    metrics.finish()
+    metrics.save(report_file(OUTPUT_FOLDER, db_filename))
 
 
 if __name__ == "__main__":
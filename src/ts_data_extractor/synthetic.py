@@ -0,0 +1,391 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+USE CASE :: Synthetic TestStand databases for tests and benchmarks.
+            Called by the benchmarks and tests, or from the command line:
+            python synthetic.py <database.db> [run count]
+
+Builds a SQLite database with the tables of the default NI schema that the
+extractor reads (UUT_RESULT, STEP_RESULT, PROP_RESULT, PROP_NUMERICLIMIT and
+STEP_SEQCALL). Each sequence file has a fixed test program - step names, units,
+comparison types and limits - executed by every UUT run of that sequence file,
+like a production station.
+"""
+
+import datetime
+import random
+import sqlite3
+from pathlib import Path
+
+SCHEMA = """
+CREATE TABLE UUT_RESULT (
+    ID INTEGER PRIMARY KEY,
+    STATION_ID TEXT,
+    START_DATE_TIME TIMESTAMP,
+    EXECUTION_TIME REAL,
+    TEST_SOCKET_INDEX INTEGER,
+    UUT_SERIAL_NUMBER TEXT,
+    UUT_STATUS TEXT,
+    USER_LOGIN_NAME TEXT
+);
+CREATE TABLE STEP_RESULT (
+    ID INTEGER PRIMARY KEY,
+    UUT_RESULT INTEGER,
+    STEP_PARENT INTEGER,
+    ORDER_NUMBER INTEGER,
+    STEP_NAME TEXT,
+    STEP_TYPE TEXT,
+    STATUS TEXT
+);
+CREATE TABLE PROP_RESULT (
+    ID INTEGER PRIMARY KEY,
+    STEP_RESULT INTEGER,
+    PROP_PARENT INTEGER,
+    ORDER_NUMBER INTEGER,
+    NAME TEXT,
+    PATH TEXT,
+    CATEGORY INTEGER,
+    TYPE_VALUE INTEGER,
+    TYPE_NAME TEXT,
+    DISPLAY_FORMAT TEXT,
+    DATA TEXT
+);
+CREATE TABLE PROP_NUMERICLIMIT (
+    ID INTEGER PRIMARY KEY,
+    PROP_RESULT INTEGER,
+    COMP_OPERATOR TEXT,
+    HIGH_LIMIT REAL,
+    LOW_LIMIT REAL,
+    UNITS TEXT,
+    STATUS TEXT
+);
+CREATE TABLE STEP_SEQCALL (
+    ID INTEGER PRIMARY KEY,
+    STEP_RESULT INTEGER,
+    SEQUENCE_NAME TEXT,
+    SEQUENCE_FILE_PATH TEXT
+);
+"""
+
+# Foreign key indexes, as in the databases created by TestStand
+INDEXES = """
+CREATE INDEX STEP_RESULT_UUT_RESULT ON STEP_RESULT (UUT_RESULT);
+CREATE INDEX PROP_RESULT_STEP_RESULT ON PROP_RESULT (STEP_RESULT);
+CREATE INDEX PROP_NUMERICLIMIT_PROP_RESULT ON PROP_NUMERICLIMIT (PROP_RESULT);
+CREATE INDEX STEP_SEQCALL_STEP_RESULT ON STEP_SEQCALL (STEP_RESULT);
+"""
+
+COMPARISON_TYPES = ["GELE", "GTLT", "EQT", "GE", "GT", "LE", "LT", "EQ"]
+UNITS = ["V", "A", "Ohm", "Hz", "C", "dB"]
+STEP_NAME_POOL = ["Vcc", "Icc", "Vout", "Iq", "Freq", "Temp", "Gain", "Ripple"]
+
+# (name, low limit, high limit) of the measurements of the multiple numeric limit step
+RAILS = [("3V3", 3.2, 3.4), ("5V", 4.9, 5.1)]
+
+# Rows inserted per executemany
+INSERT_BATCH = 10000
+
+
+def test_program(seq_index, steps_per_run, distinct_steps, rng):
+    """Return the (step name, units, comparison, low limit, high limit) of each step"""
+
+    names = [
+        f"{STEP_NAME_POOL[i % len(STEP_NAME_POOL)]}{i // len(STEP_NAME_POOL) or ''}"
+        for i in range(distinct_steps)
+    ]
+
+    steps = []
+    for k in range(steps_per_run):
+        low = round(rng.uniform(0, 5), 3)
+        high = round(low + rng.uniform(1, 5), 3)
+        cop = COMPARISON_TYPES[(seq_index + k) % len(COMPARISON_TYPES)]
+        steps.append((names[k % distinct_steps], UNITS[k % len(UNITS)], cop, low, high))
+
+    return steps
+
+
+def generate_database(
+    db_filename,
+    runs=1000,
+    steps_per_run=8,
+    sequence_files=2,
+    distinct_steps=None,
+    nesting_depth=1,
+    stations=4,
+    fail_rate=0.05,
+    skip_rate=0.02,
+    terminated_rate=0.01,
+    seed=1,
+    indexes=True,
+    other_steps=False,
+):
+    """Write a synthetic TestStand database with <runs> UUT runs to <db_filename>
+
+    <steps_per_run> numeric limit steps of one of <sequence_files> sequence files
+    are recorded per UUT run; step names repeat when <distinct_steps> is smaller
+    than <steps_per_run>. Steps are called through <nesting_depth> levels of
+    sequence calls. With <other_steps>, each UUT run also records a pass/fail, a
+    string value and a multiple numeric limit step. Returns the number of rows
+    written to each table.
+    """
+
+    rng = random.Random(seed)
+    distinct_steps = distinct_steps or steps_per_run
+
+    db_filename = Path(db_filename)
+    db_filename.unlink(missing_ok=True)
+
+    cnxn = sqlite3.connect(db_filename)
+    cnxn.executescript(SCHEMA)
+
+    seq_files = [
+        f"C:\\TestStand\\Sequences\\Test Data {i}.seq" for i in range(sequence_files)
+    ]
+    programs = [
+        test_program(i, steps_per_run, distinct_steps, rng)
+        for i in range(sequence_files)
+    ]
+
+    counts = dict.fromkeys(
+        [
+            "UUT_RESULT",
+            "STEP_RESULT",
+            "PROP_RESULT",
+            "PROP_NUMERICLIMIT",
+            "STEP_SEQCALL",
+        ],
+        0,
+    )
+    rows = {table: [] for table in counts}
+
+    def insert(table, row):
+        rows[table].append(row)
+        counts[table] += 1
+        if len(rows[table]) >= INSERT_BATCH:
+            flush(table)
+
+    def flush(table):
+        if rows[table]:
+            marks = ",".join("?" * len(rows[table][0]))
+            cnxn.executemany(f"INSERT INTO {table} VALUES ({marks})", rows[table])
+            rows[table].clear()
+
+    start = datetime.datetime(2023, 1, 1, 8, 0, 0)
+    step_id = prop_id = limit_id = call_id = 0
+
+    for run_id in range(1, runs + 1):
+        seq_index = run_id % sequence_files
+        status = "Terminated" if rng.random() < terminated_rate else "Passed"
+
+        # Numeric steps are called through a chain of sequence calls
+        parent = 0
+        for depth in range(nesting_depth):
+            step_id += 1
+            call_id += 1
+            seq_file = (
+                seq_files[seq_index]
+                if depth == 0
+                else f"C:\\TestStand\\Sequences\\Common {depth}.seq"
+            )
+            insert(
+                "STEP_RESULT",
+                (
+                    step_id,
+                    run_id,
+                    parent,
+                    depth,
+                    "MainSequence Callback",
+                    "SequenceCall",
+                    "Passed",
+                ),
+            )
+            insert("STEP_SEQCALL", (call_id, step_id, "MainSequence", seq_file))
+            parent = step_id
+
+        for order, (name, units, cop, low, high) in enumerate(programs[seq_index]):
+            step_id += 1
+            prop_id += 1
+            limit_id += 1
+
+            if rng.random() < skip_rate:
+                step_status = "Skipped"
+                val = 0.0
+            elif rng.random() < fail_rate:
+                step_status = "Failed"
+                val = high + rng.uniform(0.1, 1)
+            else:
+                step_status = "Passed"
+                val = rng.uniform(low, high)
+
+            if step_status == "Failed" and status == "Passed":
+                status = "Failed"
+
+            insert(
+                "STEP_RESULT",
+                (
+                    step_id,
+                    run_id,
+                    parent,
+                    nesting_depth + order,
+                    name,
+                    "NumericLimitTest",
+                    step_status,
+                ),
+            )
+            insert(
+                "PROP_RESULT",
+                (
+                    prop_id,
+                    step_id,
+                    0,
+                    0,
+                    "Numeric",
+                    "Numeric",
+                    0,
+                    0,
+                    "NumericLimitTest",
+                    "",
+                    repr(val),
+                ),
+            )
+            insert(
+                "PROP_NUMERICLIMIT",
+                (limit_id, prop_id, cop, high, low, units, step_status),
+            )
+
+        if other_steps:
+            order = nesting_depth + len(programs[seq_index])
+
+            step_id += 1
+            prop_id += 1
+            passed = rng.random() >= fail_rate
+            if not passed and status == "Passed":
+                status = "Failed"
+            step_status = "Passed" if passed else "Failed"
+            insert(
+                "STEP_RESULT",
+                (
+                    step_id,
+                    run_id,
+                    parent,
+                    order,
+                    "Self Test",
+                    "PassFailTest",
+                    step_status,
+                ),
+            )
+            insert(
+                "PROP_RESULT",
+                (
+                    prop_id,
+                    step_id,
+                    0,
+                    0,
+                    "PassFail",
+                    "PassFail",
+                    0,
+                    0,
+                    "Boolean",
+                    "",
+                    str(passed),
+                ),
+            )
+
+            step_id += 1
+            prop_id += 1
+            insert(
+                "STEP_RESULT",
+                (
+                    step_id,
+                    run_id,
+                    parent,
+                    order + 1,
+                    "Firmware Version",
+                    "StringValueTest",
+                    "Passed",
+                ),
+            )
+            insert(
+                "PROP_RESULT",
+                (
+                    prop_id,
+                    step_id,
+                    0,
+                    0,
+                    "String",
+                    "String",
+                    0,
+                    0,
+                    "String",
+                    "",
+                    f"1.{run_id % 3}.0",
+                ),
+            )
+
+            step_id += 1
+            insert(
+                "STEP_RESULT",
+                (
+                    step_id,
+                    run_id,
+                    parent,
+                    order + 2,
+                    "Rails",
+                    "NI_MultipleNumericLimitTest",
+                    "Passed",
+                ),
+            )
+            for k, (name, low, high) in enumerate(RAILS):
+                prop_id += 1
+                limit_id += 1
+                insert(
+                    "PROP_RESULT",
+                    (
+                        prop_id,
+                        step_id,
+                        0,
+                        k,
+                        name,
+                        f"Measurement[{k}]",
+                        0,
+                        0,
+                        "NI_LimitMeasurement",
+                        "",
+                        repr(rng.uniform(low, high)),
+                    ),
+                )
+                insert(
+                    "PROP_NUMERICLIMIT",
+                    (limit_id, prop_id, "GELE", high, low, "V", "Passed"),
+                )
+
+        insert(
+            "UUT_RESULT",
+            (
+                run_id,
+                f"STATION{run_id % stations + 1}",
+                start + datetime.timedelta(seconds=run_id * 37),
+                round(rng.uniform(5, 60), 3),
+                run_id % 2,
+                f"SN{run_id:08d}",
+                status,
+                "operator",
+            ),
+        )
+
+    for table in rows:
+        flush(table)
+
+    if indexes:
+        cnxn.executescript(INDEXES)
+
+    cnxn.commit()
+    cnxn.close()
+
+    return counts
+
+
+if __name__ == "__main__":
+    import sys
+
+    generate_database(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else 1000)
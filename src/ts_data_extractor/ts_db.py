@@ -16,25 +16,257 @@ It is assumed that the entirety of the queried data has the same basic test stru
 Changes to this will require normalization.
 """
 
+from pathlib import Path
+
 from database import *
 from file_io import *
 
 
-def main(db_filename):
-    """Execute core python script to decompose input TestStand database file <db_filename>"""
+def main(
+    db_filename,
+    backend=None,
+    incremental=False,
+    output_folder=OUTPUT_FOLDER,
+    workers=1,
+    formats=("csv",),
+    vectorized=False,
+    cache=None,
+    progress=None,
+    db_hash=None,
+    metrics=None,
+    run_filter=None,
+    all_types=False,
+):
+    """Execute core python script to decompose input TestStand database file <db_filename>
+
+    <backend> is one of "access", "sqlserver" or "sqlite" (detected from <db_filename> when None)
+    <incremental> only extracts UUT runs newer than the watermark of the previous export;
+    filtered extractions do not advance the watermark, their runs are not all exported,
+    but record the runs they exported so that incremental extractions skip them
+    <workers> > 1 extracts ranges of UUT runs in that many worker processes
+    <formats> lists the output formats: "csv", "parquet", "arrow", "long", "stats" and/or
+    "store" (indexed SQLite store of the runs and measurements, see ResultStore)
+    <vectorized> transforms the step results with pandas/NumPy column operations
+    <cache> is an ExtractionCache reused for databases (or runs) already extracted;
+    it is not used for incremental exports
+    <progress> is told the number of UUT runs to extract (start) and each exported run (advance)
+    <metrics> is a PipelineMetrics recording the time, rows and bytes of each stage
+    <run_filter> is a RunFilter selecting the UUT runs and steps in the database queries;
+    filtered extractions do not use the <cache>
+    <all_types> extracts pass/fail, string value and multiple numeric limit measurements
+    along with the numeric limit tests, in the same step query; it does not use the <cache>
+    """
+
+    if metrics is None:
+        metrics = PipelineMetrics()
+    metrics.labels.setdefault("database", Path(db_filename).name)
+
+    if cache is not None and not incremental and not run_filter and not all_types:
+        csv_file_count = export_cached(
+            db_filename,
+            cache,
+            backend,
+            output_folder,
+            formats,
+            vectorized,
+            db_hash,
+            progress,
+            metrics,
+        )
+        metrics.finish()
+        return csv_file_count
+
+    # Last exported UUT run of this database
+    watermark = load_watermark(db_filename, output_folder) if incremental else None
 
     # Connect, clean, and extract dataset passed in as parameter
-    crsr = connect_odbc(db_filename)
-    sequence_calls = query_seq_calls(crsr)
-    seq_list = create_sequence_list(sequence_calls)
-    tbl_dict = create_table_dict(seq_list)
-    uut_runs = query_uut_runs(crsr)
+    with connection_pool.cursor(db_filename, backend) as crsr:
+        seq_list, routes, uut_runs = query_setup(crsr, metrics, watermark, run_filter)
+
+    if progress is not None:
+        progress.start(len(uut_runs))
+
+    if workers > 1:
+        # Extract partitions of the UUT runs in worker processes
+        from parallel import export_parallel
+
+        with metrics.stage("extract_parallel", output_folder):
+            csv_file_count = export_parallel(
+                db_filename,
+                backend,
+                uut_runs,
+                routes,
+                seq_list,
+                output_folder,
+                workers,
+                formats,
+                vectorized,
+                progress,
+                run_filter,
+                all_types,
+            )
+    else:
+        # Stream test results rows by sequence name to CSV files and return csv_file_count
+        with connection_pool.cursor(db_filename, backend) as crsr:
+            rows = extract_rows(
+                crsr, uut_runs, routes, vectorized, metrics, run_filter, all_types
+            )
+            rows = track_progress(rows, progress)
+            with metrics.profile(), metrics.stage(
+                "export", output_folder, exclude=EXTRACT_STAGES
+            ):
+                csv_file_count = export_stream(
+                    seq_list, rows, output_folder, formats, watermark_key(db_filename)
+                )
+
+    # Advance the watermark only once the new runs are exported
+    save_watermark(db_filename, uut_runs, output_folder, filtered=bool(run_filter))
+    metrics.finish()
+
+    return csv_file_count
+
+
+def export_cached(
+    db_filename,
+    cache,
+    backend=None,
+    output_folder=OUTPUT_FOLDER,
+    formats=("csv",),
+    vectorized=False,
+    db_hash=None,
+    progress=None,
+    metrics=None,
+):
+    """Export <db_filename> through <cache>, extracting only the UUT runs not cached yet
+
+    <db_hash> is the content hash of <db_filename> when already known
+    """
+
+    if metrics is None:
+        metrics = PipelineMetrics()
+
+    key = db_hash
+    if key is None:
+        with metrics.stage("hash_file"):
+            key = hash_file(db_filename)
+
+    # Unchanged database: export the cached rows without opening it; the entries
+    # used are pinned so that other jobs do not evict them meanwhile
+    entry = cache.get(key, pin=True)
+    metrics.labels["cache"] = "miss" if entry is None else "hit"
+    if entry is not None and progress is not None:
+        progress.start(sum(entry.row_counts().values()))
+    if entry is None:
+        with connection_pool.cursor(db_filename, backend) as crsr:
+            seq_list, routes, uut_runs = query_setup(crsr, metrics)
+
+            # Reuse the rows of an earlier copy with the same first runs
+            base = cache.find_prefix(uut_runs, pin=True)
+            new_runs = uut_runs
+            if base is not None and base.last_run is not None:
+                new_runs = [run for run in uut_runs if run.ID > base.last_run["ID"]]
+
+            if progress is not None:
+                progress.start(len(new_runs))
+
+            entry_folder = cache.create_folder()
+            try:
+                writers = {}
+                rows = extract_rows(crsr, new_runs, routes, vectorized, metrics)
+                rows = track_progress(rows, progress)
+                with metrics.profile(), metrics.stage("spill", exclude=EXTRACT_STAGES):
+                    for seq_name, record in rows:
+                        writer = writers.get(seq_name)
+                        if writer is None:
+                            writer = writers[seq_name] = SequenceWriter(
+                                None, spill_dir=entry_folder
+                            )
+                        writer.write(record)
+
+                tables = {
+                    seq_name: writer.detach() for seq_name, writer in writers.items()
+                }
+                entry = cache.put(
+                    key, entry_folder, seq_list, tables, uut_runs, base, pin=True
+                )
+            except BaseException:
+                cache.discard(entry_folder)
+                raise
+            finally:
+                if base is not None:
+                    cache.release(base)
+
+    try:
+        with metrics.stage("export", output_folder):
+            csv_file_count = export_entry(
+                entry,
+                entry.seq_list,
+                output_folder,
+                formats,
+                watermark_key(db_filename),
+            )
+    finally:
+        cache.release(entry)
+
+    # Cached rows are exported without extracting their runs again
+    if metrics.labels["cache"] == "hit" and progress is not None:
+        for seq_name, row_count in entry.row_counts().items():
+            progress.advance(seq_name, row_count)
+
+    # Advance the watermark only once the new runs are exported
+    save_watermark(db_filename, entry.watermark_runs(), output_folder)
+
+    return csv_file_count
+
+
+def query_setup(crsr, metrics, watermark=None, run_filter=None):
+    """Return the sequence list, routing table and UUT runs not exported before <watermark>
+
+    Only the UUT runs and sequence files selected by <run_filter> are returned.
+    """
+
+    with metrics.stage("query_seq_calls") as stage:
+        sequence_calls = query_seq_calls(crsr, run_filter)
+        stage.rows += len(sequence_calls)
+        seq_list = create_sequence_list(sequence_calls)
+        routes = create_sequence_routes(sequence_calls)
+        if run_filter:
+            seq_list, routes = run_filter.select_sequences(seq_list, routes)
+
+    with metrics.stage("query_uut_runs") as stage:
+        since_id = watermark["ID"] if watermark else None
+        uut_runs = query_uut_runs(crsr, since_id, run_filter=run_filter)
+        uut_runs = unexported_runs(uut_runs, watermark)
+        stage.rows += len(uut_runs)
+
+    return seq_list, routes, uut_runs
+
+
+def extract_rows(
+    crsr, uut_runs, routes, vectorized, metrics, run_filter=None, all_types=False
+):
+    """Yield (sequence name, RunRecord) pairs, measuring the step queries and the transform"""
+
+    crsr = metrics.cursor(crsr, "step_queries")
+    iter_rows = test_row_iterator(vectorized, all_types)
+    rows = iter_rows(crsr, uut_runs, routes, run_filter=run_filter)
+
+    return metrics.iterate(rows, "transform", exclude=["step_queries"])
+
+
+def track_progress(rows, progress):
+    """Pass (sequence name, RunRecord) pairs through, reporting each one to <progress>"""
+
+    if progress is None:
+        return rows
+
+    return _iter_progress(rows, progress)
 
-    # Generate test results table by sequence name (save to memory)
-    generate_test_table(crsr, uut_runs, tbl_dict, sequence_calls)
 
-    # Export test results in memory to CSV files and return csv_file_count
-    return export_results(seq_list, tbl_dict)
+def _iter_progress(rows, progress):
+    for seq_name, record in rows:
+        progress.advance(seq_name)
+        yield seq_name, record
 
 
 if __name__ == "__main__":
@@ -0,0 +1,237 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+USE CASE :: Streaming and resumable uploads of TestStand databases.
+            Called by the app.py and web_app.py web applications.
+
+Upload bodies are copied to disk in fixed-size chunks, so memory use does not
+depend on the size of the database. The SHA-256 of the content is computed and
+the file header checked (Access or SQLite) while the bytes arrive; an upload
+that is not a database is rejected after its first chunk.
+
+Resumable uploads are written in parts to "<upload folder>/partial/<id>/<filename>".
+Each part states its byte offset; a client that lost its connection asks for
+the current offset and sends the rest from there. Upload sessions survive a
+server restart: the content hash is then rebuilt from the partial file.
+"""
+
+import hashlib
+import shutil
+import threading
+import time
+import uuid
+from pathlib import Path
+
+# Bytes copied per read of an upload body
+CHUNK_SIZE = 1024 * 1024
+
+# Database file signatures: (byte offset, expected bytes)
+DATABASE_SIGNATURES = {
+    "access": [(4, b"Standard Jet DB"), (4, b"Standard ACE DB")],
+    "sqlite": [(0, b"SQLite format 3\x00")],
+}
+
+# Bytes needed to check every signature
+HEADER_SIZE = max(
+    offset + len(signature)
+    for signatures in DATABASE_SIGNATURES.values()
+    for offset, signature in signatures
+)
+
+
+class InvalidUpload(Exception):
+    """Raised when an upload is not a supported database or is too large"""
+
+
+class UploadOffsetError(Exception):
+    """Raised when an upload part does not start where the upload continues"""
+
+
+def detect_database_type(header):
+    """Return the DATABASE_SIGNATURES type of a file starting with <header>, or None"""
+
+    for db_type, signatures in DATABASE_SIGNATURES.items():
+        for offset, signature in signatures:
+            if header[offset : offset + len(signature)] == signature:
+                return db_type
+
+    return None
+
+
+class UploadWriter:
+    """Write an upload to <file_path> chunk by chunk, hashing and validating it
+
+    Uploads larger than <max_bytes> are rejected.
+    """
+
+    def __init__(self, file_path, max_bytes=None):
+        self.file_path = Path(file_path)
+        self.max_bytes = max_bytes
+        self.offset = 0
+        self.db_type = None
+        self._digest = hashlib.sha256()
+        self._header = b""
+        self._lock = threading.Lock()
+
+    @classmethod
+    def resume(cls, file_path, max_bytes=None):
+        """Continue an upload partially written to <file_path>"""
+
+        writer = cls(file_path, max_bytes)
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                writer._update(chunk)
+
+        return writer
+
+    def write_stream(self, stream, offset=None):
+        """Append the bytes of <stream> at <offset> (the current offset when None)"""
+
+        with self._lock:
+            if offset is not None and offset != self.offset:
+                raise UploadOffsetError(
+                    f"Upload continues at byte {self.offset}, not {offset}"
+                )
+
+            self.file_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.file_path, "ab") as f:
+                for chunk in iter(lambda: stream.read(CHUNK_SIZE), b""):
+                    self._check_size(len(chunk))
+                    self._update(chunk)
+                    f.write(chunk)
+
+            return self.offset
+
+    def finish(self):
+        """Validate the complete upload and return its SHA-256 hex digest"""
+
+        with self._lock:
+            if self.db_type is None:
+                raise InvalidUpload("File is not an Access or SQLite database")
+
+            return self._digest.hexdigest()
+
+    def _check_size(self, size):
+        if self.max_bytes is not None and self.offset + size > self.max_bytes:
+            raise InvalidUpload(f"Upload is larger than {self.max_bytes} bytes")
+
+    def _update(self, chunk):
+        # Check the file header as soon as enough bytes have arrived
+        if len(self._header) < HEADER_SIZE:
+            header = self._header + chunk[: HEADER_SIZE - len(self._header)]
+            if len(header) >= HEADER_SIZE:
+                self.db_type = detect_database_type(header)
+                if self.db_type is None:
+                    raise InvalidUpload("File is not an Access or SQLite database")
+            self._header = header
+
+        self._digest.update(chunk)
+        self.offset += len(chunk)
+
+
+def save_stream(stream, file_path, max_bytes=None):
+    """Copy <stream> to <file_path> in chunks; return its SHA-256 hex digest"""
+
+    writer = UploadWriter(file_path, max_bytes)
+    try:
+        writer.write_stream(stream)
+        return writer.finish()
+    except BaseException:
+        Path(file_path).unlink(missing_ok=True)
+        raise
+
+
+def parse_content_range(header):
+    """Return the first byte offset of a "bytes <first>-<last>/<total>" Content-Range header"""
+
+    if not header:
+        return None
+
+    unit, _, byte_range = header.strip().partition(" ")
+    first = byte_range.split("-", 1)[0]
+    if unit != "bytes" or not first.isdigit():
+        raise InvalidUpload(f"Invalid Content-Range header: {header}")
+
+    return int(first)
+
+
+class UploadSessions:
+    """Resumable uploads in "<folder>/partial", abandoned after <max_age> seconds"""
+
+    def __init__(self, folder, max_bytes=None, max_age=24 * 3600):
+        self.folder = Path(folder).joinpath("partial")
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._writers = {}
+        self._lock = threading.Lock()
+
+    def create(self, filename):
+        """Start an upload of <filename>; return its upload ID"""
+
+        self._prune()
+
+        upload_id = uuid.uuid4().hex
+        file_path = self.folder.joinpath(upload_id, filename)
+        file_path.parent.mkdir(parents=True)
+        file_path.touch()
+
+        with self._lock:
+            self._writers[upload_id] = UploadWriter(file_path, self.max_bytes)
+
+        return upload_id
+
+    def get(self, upload_id):
+        """Return the UploadWriter of <upload_id>, or None for unknown uploads"""
+
+        with self._lock:
+            writer = self._writers.get(upload_id)
+            if writer is not None:
+                return writer
+
+        # Upload started before a restart of the server
+        upload_folder = self.folder.joinpath(upload_id)
+        if upload_id != Path(upload_id).name or not upload_folder.is_dir():
+            return None
+
+        files = [p for p in upload_folder.iterdir() if p.is_file()]
+        if len(files) != 1:
+            return None
+
+        writer = UploadWriter.resume(files[0], self.max_bytes)
+        with self._lock:
+            return self._writers.setdefault(upload_id, writer)
+
+    def complete(self, upload_id, file_path):
+        """Move the finished upload to <file_path>; return its SHA-256 hex digest"""
+
+        writer = self.get(upload_id)
+        if writer is None:
+            raise KeyError(upload_id)
+
+        db_hash = writer.finish()
+        shutil.move(writer.file_path, file_path)
+        self.discard(upload_id)
+
+        return db_hash
+
+    def discard(self, upload_id):
+        """Forget <upload_id> and delete its partial file"""
+
+        with self._lock:
+            self._writers.pop(upload_id, None)
+
+        shutil.rmtree(self.folder.joinpath(upload_id), ignore_errors=True)
+
+    def _prune(self):
+        if not self.folder.is_dir():
+            return
+
+        # Age of an upload is the time since its last part was written
+        expired = time.time() - self.max_age
+        for upload_folder in self.folder.iterdir():
+            if not upload_folder.is_dir():
+                continue
+
+            mtimes = [p.stat().st_mtime for p in upload_folder.iterdir()]
+            if max(mtimes, default=0) < expired:
+                self.discard(upload_folder.name)
@@ -0,0 +1,8 @@
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# The extractor scripts import the database and file_io packages as top-level modules
+sys.path.insert(0, str(ROOT.joinpath("src", "ts_data_extractor")))
+sys.path.insert(0, str(ROOT.joinpath("benchmarks")))
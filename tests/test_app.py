@@ -0,0 +1,105 @@
+import time
+
+import pytest
+from flask import Flask
+
+from jobs import FINISHED, JobQueue
+from routes import register_routes
+from synthetic import generate_database
+from uploads import UploadSessions
+
+
+@pytest.fixture
+def client(tmp_path):
+    app = Flask(__name__)
+    app.config["MAX_CONTENT_LENGTH"] = 64 * 1024 * 1024
+    job_queue = JobQueue(tmp_path / "uploads", workers=1)
+    upload_sessions = UploadSessions(tmp_path / "uploads")
+    register_routes(
+        app, job_queue, upload_sessions, tmp_path / "results", allowed_extensions=["db"]
+    )
+
+    yield app.test_client()
+    job_queue.shutdown()
+
+
+def wait_for_job(client, status_url):
+    for _ in range(200):
+        job = client.get(status_url).get_json()
+        if job["finished"]:
+            return job
+        time.sleep(0.05)
+
+    raise TimeoutError(status_url)
+
+
+def test_upload_and_job_routes(client, tmp_path):
+    db_filename = tmp_path / "test.db"
+    generate_database(db_filename, runs=20, steps_per_run=3, terminated_rate=0)
+
+    assert client.put("/upload/test.mdb.txt", data=b"").status_code == 400
+
+    response = client.put("/upload/test.db", data=db_filename.read_bytes())
+    assert response.status_code == 202
+    job = wait_for_job(client, response.headers["Location"])
+    assert job["status"] == FINISHED and job["csv_file_count"] == 2
+    assert job["progress"]["runs_done"] == 20
+
+    job_url = f"/jobs/{job['id']}"
+    assert client.get(job_url + "/report").get_json()["labels"]["job"] == job["id"]
+    assert client.get(job_url + "/download").status_code == 200
+
+    # Results of uploads are in the work folder of their job
+    result_files = client.get(job_url + "/results").get_json()
+    assert result_files == ["Test Data Test Data 0.csv", "Test Data Test Data 1.csv"]
+    assert client.get("/results").get_json() == []
+
+    page = client.get(f"{job_url}/results/{result_files[1]}?page_size=5").get_json()
+    assert len(page["rows"]) == 5
+    assert client.get(job_url + "/results/missing.csv").status_code == 404
+    assert client.get("/jobs/unknown").status_code == 404
+
+
+def test_resumable_upload(client, tmp_path):
+    db_filename = tmp_path / "test.db"
+    generate_database(db_filename, runs=10, steps_per_run=3, terminated_rate=0)
+    data = db_filename.read_bytes()
+
+    upload_url = client.post("/uploads", data={"filename": "test.db"}).headers[
+        "Location"
+    ]
+    part = client.put(
+        upload_url, data=data[:100], headers={"Content-Range": "bytes 0-99/*"}
+    )
+    assert part.get_json()["offset"] == 100
+
+    # A malformed header only rejects the part
+    bad = client.put(upload_url, data=data[100:], headers={"Content-Range": "100-"})
+    assert bad.status_code == 400
+    assert client.get(upload_url).get_json()["offset"] == 100
+
+    # A part that does not continue the upload gets the offset to resume from
+    gap = client.put(
+        upload_url, data=data[200:], headers={"Content-Range": "bytes 200-/*"}
+    )
+    assert gap.status_code == 409 and gap.get_json()["offset"] == 100
+
+    rest = client.put(
+        upload_url, data=data[100:], headers={"Content-Range": "bytes 100-/*"}
+    )
+    assert rest.get_json()["offset"] == len(data)
+
+    response = client.post(upload_url + "/complete")
+    assert response.status_code == 202
+    assert wait_for_job(client, response.headers["Location"])["status"] == FINISHED
+
+
+def test_upload_header_rejected(client):
+    upload_url = client.post("/uploads", data={"filename": "test.db"}).headers[
+        "Location"
+    ]
+
+    # Content that is not a database ends the upload
+    response = client.put(upload_url, data=b"not a database" * 10)
+    assert response.status_code == 400
+    assert client.get(upload_url).status_code == 404
@@ -0,0 +1,89 @@
+import csv
+import shutil
+import sqlite3
+
+import pytest
+
+import batch
+from database import RunFilter, connection_pool
+from synthetic import generate_database
+
+
+def station_database(db_filename, prefix, runs):
+    """Synthetic database of the stations "<prefix>STATION1"..."""
+
+    generate_database(db_filename, runs=runs, steps_per_run=3, terminated_rate=0)
+    cnxn = sqlite3.connect(db_filename)
+    cnxn.execute("UPDATE UUT_RESULT SET STATION_ID = ? || STATION_ID", (prefix,))
+    cnxn.commit()
+    cnxn.close()
+    connection_pool.discard(str(db_filename))
+
+
+def data_rows(output_folder):
+    rows = []
+    for csv_file in output_folder.glob("Test Data *.csv"):
+        with open(csv_file, newline="") as f:
+            rows.extend(list(csv.reader(f))[1:])
+    return rows
+
+
+def test_batch_dedup_across_batches(tmp_path):
+    source_folder = tmp_path / "stations"
+    source_folder.mkdir()
+    output_folder = tmp_path / "output"
+    station_database(source_folder / "a.db", "A", 30)
+    station_database(source_folder / "b.db", "B", 20)
+
+    # A copy in the same batch is merged away
+    shutil.copy(source_folder / "a.db", source_folder / "a-copy.db")
+    batch.main(source_folder, output_folder, workers=2, incremental=True)
+    assert len(data_rows(output_folder)) == 50
+
+    # A backed-up copy in a later batch has no watermark, but its runs were exported
+    shutil.copy(source_folder / "a.db", source_folder / "a-backup.db")
+    batch.main(source_folder, output_folder, workers=2, incremental=True)
+    assert len(data_rows(output_folder)) == 50
+
+    # New runs are exported once, whichever copy they are found in
+    station_database(source_folder / "a.db", "A", 40)
+    shutil.copy(source_folder / "a.db", source_folder / "a-backup.db")
+    batch.main(source_folder, output_folder, workers=2, incremental=True)
+    rows = data_rows(output_folder)
+    assert len(rows) == 60
+    assert len({tuple(row[:4]) for row in rows}) == 60
+
+
+def test_batch_failures(tmp_path):
+    source_folder = tmp_path / "stations"
+    source_folder.mkdir()
+    output_folder = tmp_path / "output"
+    station_database(source_folder / "a.db", "A", 10)
+    source_folder.joinpath("broken.db").write_bytes(b"not a database")
+
+    with pytest.raises(batch.BatchFailed) as failed:
+        batch.main(source_folder, output_folder, workers=1)
+
+    # The other databases are still exported
+    assert list(failed.value.failures) == [str(source_folder / "broken.db")]
+    assert len(data_rows(output_folder)) == 10
+
+
+def test_filtered_batch_keeps_watermarks(tmp_path):
+    source_folder = tmp_path / "stations"
+    source_folder.mkdir()
+    output_folder = tmp_path / "output"
+    station_database(source_folder / "a.db", "A", 40)
+
+    run_filter = RunFilter(stations=["ASTATION4"])
+    for _ in range(2):
+        batch.main(
+            source_folder, output_folder, incremental=True, run_filter=run_filter
+        )
+        assert len(data_rows(output_folder)) == 10
+
+    # Runs of the other stations are exported by the next unfiltered batch, once
+    batch.main(source_folder, output_folder, incremental=True)
+    serials = [row[2] for row in data_rows(output_folder)]
+    assert len(serials) == 40
+    assert len(set(serials)) == 40
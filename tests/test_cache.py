@@ -0,0 +1,88 @@
+import ts_db
+from database import connection_pool
+from file_io import ExtractionCache, PipelineMetrics, export_entry, hash_file
+from synthetic import generate_database
+
+
+class Progress:
+    def __init__(self):
+        self.total = None
+
+    def start(self, total):
+        self.total = total
+
+    def advance(self, seq_name, count=1):
+        pass
+
+
+def export(db_filename, output_folder, cache=None):
+    """Export <db_filename>; return the cache label and the runs extracted"""
+
+    metrics = PipelineMetrics()
+    progress = Progress()
+    ts_db.main(
+        str(db_filename),
+        output_folder=str(output_folder),
+        formats=("csv", "long"),
+        cache=cache,
+        progress=progress,
+        metrics=metrics,
+    )
+    return metrics.labels.get("cache"), progress.total
+
+
+def read_outputs(output_folder):
+    return {p.name: p.read_bytes() for p in output_folder.glob("*.csv")}
+
+
+def test_extraction_cache(tmp_path):
+    db_filename = tmp_path / "test.db"
+    generate_database(db_filename, runs=40, steps_per_run=3, terminated_rate=0)
+    cache = ExtractionCache(tmp_path / "cache")
+
+    assert export(db_filename, tmp_path / "miss", cache) == ("miss", 40)
+    assert export(db_filename, tmp_path / "plain") == (None, 40)
+    assert read_outputs(tmp_path / "miss") == read_outputs(tmp_path / "plain")
+
+    # Unchanged database: exported from the cache without extracting any run
+    assert export(db_filename, tmp_path / "hit", cache) == ("hit", 40)
+    assert read_outputs(tmp_path / "hit") == read_outputs(tmp_path / "plain")
+
+    # A database that only gained runs reuses the cached rows of the earlier copy
+    generate_database(db_filename, runs=55, steps_per_run=3, terminated_rate=0)
+    connection_pool.discard(str(db_filename))
+    assert export(db_filename, tmp_path / "prefix", cache) == ("miss", 15)
+    assert export(db_filename, tmp_path / "full") == (None, 55)
+    assert read_outputs(tmp_path / "prefix") == read_outputs(tmp_path / "full")
+
+
+def test_cache_eviction(tmp_path):
+    cache = ExtractionCache(tmp_path / "cache", max_bytes=1)
+    for runs in (10, 11):
+        db_filename = tmp_path / f"test-{runs}.db"
+        generate_database(db_filename, runs=runs, steps_per_run=2)
+        export(db_filename, tmp_path / f"output-{runs}", cache)
+
+    # Least recently used entries are evicted once the cache is over its size
+    assert len(list(tmp_path.joinpath("cache").glob("*/entry.pickle"))) == 1
+
+
+def test_cache_eviction_pinned(tmp_path):
+    cache = ExtractionCache(tmp_path / "cache", max_bytes=1)
+    db_filenames = []
+    for runs in (10, 11, 12):
+        db_filenames.append(tmp_path / f"test-{runs}.db")
+        generate_database(db_filenames[-1], runs=runs, steps_per_run=2)
+
+    export(db_filenames[0], tmp_path / "output-10", cache)
+    entry = cache.get(hash_file(db_filenames[0]), pin=True)
+
+    # Entries in use by another export are not evicted
+    export(db_filenames[1], tmp_path / "output-11", cache)
+    export_entry(entry, entry.seq_list, tmp_path / "pinned", ("csv", "long"))
+    assert read_outputs(tmp_path / "pinned") == read_outputs(tmp_path / "output-10")
+
+    # Once released, they are evicted by the next entry stored
+    cache.release(entry)
+    export(db_filenames[2], tmp_path / "output-12", cache)
+    assert not entry.folder.exists()
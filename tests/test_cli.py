@@ -0,0 +1,94 @@
+import csv
+
+import cli
+import ts_db
+from database import connection_pool
+from synthetic import generate_database
+
+
+def read_rows(csv_file):
+    with open(csv_file, newline="") as f:
+        return list(csv.reader(f))
+
+
+def test_cli_watch(tmp_path):
+    source_folder = tmp_path / "stations"
+    source_folder.mkdir()
+    db_filename = source_folder / "station1.db"
+    output_folder = tmp_path / "output"
+    args = cli.build_parser().parse_args(
+        [str(source_folder), "-o", str(output_folder), "--watch", "--settle", "0"]
+    )
+
+    def data_rows():
+        return sum(len(read_rows(p)) - 1 for p in output_folder.glob("*.csv"))
+
+    generate_database(db_filename, runs=30, steps_per_run=4, terminated_rate=0)
+    cli.watch(args, passes=1)
+    assert data_rows() == 30
+
+    # Unchanged databases are not extracted again
+    signatures = {str(db_filename.resolve()): cli.file_signature(db_filename)}
+    assert not cli.changed_databases(args.sources, signatures)
+
+    # Only the new runs of the changed database are appended
+    generate_database(db_filename, runs=45, steps_per_run=4, terminated_rate=0)
+    assert cli.changed_databases(args.sources, signatures)
+    cli.watch(args, passes=1)
+    assert data_rows() == 45
+    assert len(list(output_folder.joinpath(".reports").glob("station1-*.json"))) >= 1
+
+    assert cli.main([str(db_filename), "-o", str(tmp_path / "once")]) == 0
+    assert cli.main([str(tmp_path / "missing.db"), "-o", str(tmp_path / "none")]) == 1
+
+
+def test_cli_watch_filtered(tmp_path):
+    db_filename = tmp_path / "station1.db"
+    output_folder = tmp_path / "output"
+    args = cli.build_parser().parse_args(
+        [str(db_filename), "-o", str(output_folder), "--watch", "--settle", "0"]
+        + ["--station", "STATION4"]
+    )
+
+    def serials():
+        serials = []
+        for csv_file in output_folder.glob("*.csv"):
+            header, *rows = read_rows(csv_file)
+            serials.extend(row[header.index("Serial Number")] for row in rows)
+        return serials
+
+    # Runs 3, 7, ... are tested on STATION4
+    generate_database(db_filename, runs=30, steps_per_run=4, terminated_rate=0)
+    cli.watch(args, passes=1)
+    assert len(serials()) == 7
+
+    # Runs extracted by earlier polls are not appended again
+    generate_database(db_filename, runs=30, steps_per_run=4, terminated_rate=0)
+    connection_pool.discard(str(db_filename))
+    cli.watch(args, passes=1)
+    assert len(serials()) == 7
+
+    generate_database(db_filename, runs=45, steps_per_run=4, terminated_rate=0)
+    connection_pool.discard(str(db_filename))
+    cli.watch(args, passes=1)
+    assert sorted(serials()) == [f"SN{run_id:08d}" for run_id in range(3, 46, 4)]
+
+
+def test_cli_sqlserver_sources(tmp_path, monkeypatch):
+    extracted = []
+
+    def extract(db_filename, backend=None, **options):
+        extracted.append((db_filename, backend))
+        return 1
+
+    monkeypatch.setattr(ts_db, "main", extract)
+    source = "SERVER=tsdb\\TESTSTAND;DATABASE=Results;Trusted_Connection=yes"
+
+    # Connection strings are passed through to the extraction as given
+    assert cli.main([source, "--backend", "sqlserver", "-o", str(tmp_path)]) == 0
+    assert extracted == [(source, "sqlserver")]
+    assert [p.name[:8] for p in tmp_path.joinpath(".reports").iterdir()] == ["Results-"]
+
+    # Other backends only extract database files
+    assert cli.main([source, "-o", str(tmp_path)]) == 1
+    assert len(extracted) == 1
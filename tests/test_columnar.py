@@ -0,0 +1,59 @@
+import importlib.util
+
+import pytest
+
+import cli
+import ts_db
+from file_io import SequenceWriter, require_pyarrow
+from synthetic import generate_database
+
+
+def test_parquet_and_arrow_datasets(tmp_path):
+    pd = pytest.importorskip("pandas")
+    pytest.importorskip("pyarrow")
+
+    db_filename = tmp_path / "test.db"
+    generate_database(db_filename, runs=40, steps_per_run=3, sequence_files=1)
+    output_folder = tmp_path / "output"
+    for incremental in (False, True):
+        ts_db.main(
+            str(db_filename),
+            incremental=incremental,
+            output_folder=str(output_folder),
+            formats=("csv", "parquet", "arrow"),
+        )
+
+    csv_file = next(output_folder.glob("*.csv"))
+    table = pd.read_csv(csv_file)
+
+    # The incremental run without new runs adds no part file
+    dataset = pd.read_parquet(csv_file.with_suffix(".parquet"))
+    assert len(list(csv_file.with_suffix(".parquet").iterdir())) == 1
+    assert list(dataset.columns) == list(table.columns)
+    assert len(dataset) == len(table) == 40
+    assert str(dataset["Test Start"].dtype).startswith("datetime64")
+    assert dataset.iloc[:, -1].tolist() == pytest.approx(
+        table.iloc[:, -1].tolist(), nan_ok=True
+    )
+
+    import pyarrow as pa
+
+    part_file = next(csv_file.with_suffix(".arrow").iterdir())
+    with pa.OSFile(str(part_file), "rb") as source:
+        assert pa.ipc.open_file(source).read_all().num_rows == 40
+
+
+def test_missing_pyarrow(tmp_path, monkeypatch):
+    find_spec = importlib.util.find_spec
+    monkeypatch.setattr(
+        importlib.util,
+        "find_spec",
+        lambda name, *args: None if name == "pyarrow" else find_spec(name, *args),
+    )
+
+    require_pyarrow(["csv", "long"])
+    with pytest.raises(ImportError, match="parquet output format requires pyarrow"):
+        SequenceWriter(tmp_path / "Test Data A.csv", formats=("csv", "parquet"))
+
+    with pytest.raises(SystemExit):
+        cli.main([str(tmp_path), "--format", "arrow"])
@@ -0,0 +1,127 @@
+import sqlite3
+
+from database import (
+    ConnectionPool,
+    connection_pool,
+    create_sequence_list,
+    create_sequence_routes,
+    create_table_dict,
+    detect_backend,
+    generate_test_table,
+    iter_test_rows,
+    query_seq_calls,
+    query_uut_runs,
+    route_run,
+)
+from synthetic import generate_database
+
+
+class RecordingCursor:
+    """Cursor recording the parameters of each executed query"""
+
+    def __init__(self, crsr):
+        self.crsr = crsr
+        self.queries = []
+
+    def execute(self, sql, params=()):
+        self.queries.append((sql, params))
+        self.crsr.execute(sql, params)
+        return self
+
+    def __getattr__(self, name):
+        return getattr(self.crsr, name)
+
+
+def shuffle_start_times(db_filename, runs):
+    """Make the UUT run IDs out of start time order, as in a merged database"""
+
+    cnxn = sqlite3.connect(db_filename)
+    cnxn.execute(
+        "UPDATE UUT_RESULT SET START_DATE_TIME = "
+        "datetime('2023-01-01 08:00:00', '+' || ((ID * 37) % ?) || ' minutes')",
+        (runs,),
+    )
+    cnxn.commit()
+    cnxn.close()
+
+
+def test_bulk_steps_out_of_order_ids(tmp_path):
+    db_filename = tmp_path / "test.db"
+    generate_database(db_filename, runs=101, steps_per_run=4, terminated_rate=0)
+    shuffle_start_times(db_filename, 101)
+
+    with connection_pool.cursor(str(db_filename)) as crsr:
+        sequence_calls = query_seq_calls(crsr)
+        seq_list = create_sequence_list(sequence_calls)
+        routes = create_sequence_routes(sequence_calls)
+        uut_runs = query_uut_runs(crsr)
+        assert [run.ID for run in uut_runs] != sorted(run.ID for run in uut_runs)
+
+        recording = RecordingCursor(crsr)
+        rows = list(iter_test_rows(recording, uut_runs, routes, chunk_size=10))
+
+        # Per-run queries of the original implementation
+        tbl_dict = create_table_dict(seq_list)
+        generate_test_table(crsr, uut_runs, tbl_dict, sequence_calls)
+
+    # Each step query covers the ID range of one chunk only
+    ranges = [params for sql, params in recording.queries]
+    assert len(ranges) == 11
+    assert all(last - first < 10 for first, last in ranges)
+
+    assert [record.run_id for seq_name, record in rows] == [run.ID for run in uut_runs]
+    for seq_name in seq_list:
+        records = [record.as_dict() for name, record in rows if name == seq_name]
+        assert records == tbl_dict[seq_name]
+
+
+def test_connection_pool(tmp_path):
+    db_filename = str(tmp_path / "test.db")
+    generate_database(db_filename, runs=5, steps_per_run=2)
+    assert detect_backend(db_filename) == "sqlite"
+
+    pool = ConnectionPool(max_idle=1)
+    with pool.cursor(db_filename) as crsr:
+        first = crsr.connection
+        assert crsr.execute("SELECT count(*) AS N FROM UUT_RESULT").fetchone().N == 5
+
+    # Released connections are reused, not reopened
+    with pool.cursor(db_filename) as crsr:
+        assert crsr.connection is first
+        with pool.cursor(db_filename) as other:
+            assert other.connection is not first
+
+    # Only <max_idle> connections are kept; discard closes them
+    assert len(pool._idle[("sqlite", db_filename)]) == 1
+    pool.discard(db_filename)
+    assert ("sqlite", db_filename) not in pool._idle
+
+
+def test_sequence_routes():
+    # (sequence call step ID, sequence file path, STEP_PARENT of the calling step)
+    sequence_calls = [
+        [10, r"C:\Sequences\Main.seq", 0],
+        [11, r"C:\Sequences\Common.seq", 10],
+        [12, r"C:\Sequences\Helpers.seq", 11],
+        [20, r"C:\Sequences\Other.seq", 0],
+        [30, r"C:\Sequences\Loop A.seq", 31],
+        [31, r"C:\Sequences\Loop B.seq", 30],
+    ]
+    seq_list = create_sequence_list(sequence_calls)
+    routes = create_sequence_routes(sequence_calls)
+
+    assert seq_list[:2] == ["Test Data Main", "Test Data Common"]
+
+    # Nested sequence calls resolve to their outermost caller
+    assert routes[10] == routes[11] == routes[12] == "Test Data Main"
+    assert routes[20] == "Test Data Other"
+
+    # Call cycles do not loop forever
+    assert routes[30] == routes[31]
+
+    class Step:
+        def __init__(self, parent):
+            self.STEP_PARENT = parent
+
+    assert route_run(routes, [Step(99), Step(12)]) == "Test Data Main"
+    assert route_run(routes, [Step(99)]) is None
@@ -0,0 +1,75 @@
+import sqlite3
+
+from database import RunFilter, connection_pool, query_uut_runs
+from synthetic import generate_database
+
+import ts_db
+
+
+def rename_sequence_file(db_filename, stem, new_stem):
+    cnxn = sqlite3.connect(db_filename)
+    cnxn.execute(
+        "UPDATE STEP_SEQCALL SET SEQUENCE_FILE_PATH = "
+        "replace(SEQUENCE_FILE_PATH, ?, ?)",
+        (f"\\{stem}.seq", f"\\{new_stem}.seq"),
+    )
+    cnxn.commit()
+    cnxn.close()
+    connection_pool.discard(str(db_filename))
+
+
+def selected_runs(db_filename, **fields):
+    with connection_pool.cursor(str(db_filename)) as crsr:
+        return query_uut_runs(crsr, run_filter=RunFilter(**fields))
+
+
+def test_run_filter_pushdown(tmp_path):
+    db_filename = tmp_path / "test.db"
+    generate_database(db_filename, runs=40, steps_per_run=3, terminated_rate=0)
+
+    runs = selected_runs(db_filename, stations=["STATION4"], start="2023-01-01 08:06")
+    assert [run.ID for run in runs] == [11, 15, 19, 23, 27, 31, 35, 39]
+
+    # "*" and "?" are the wildcards of serial numbers, "_" and "%" match themselves
+    assert len(selected_runs(db_filename, serial_numbers=["SN0000001?"])) == 10
+    assert selected_runs(db_filename, serial_numbers=["SN_0000001*"]) == []
+    assert selected_runs(db_filename, serial_numbers=["SN%1"]) == []
+
+
+def test_sequence_file_filter(tmp_path):
+    db_filename = tmp_path / "test.db"
+    generate_database(db_filename, runs=40, steps_per_run=3, nesting_depth=2)
+    rename_sequence_file(db_filename, "Test Data 0", "Board_A")
+    rename_sequence_file(db_filename, "Test Data 1", "BoardXA")
+
+    # "_" in a sequence file name is not a wildcard
+    board_a = selected_runs(db_filename, sequence_files=["Board_A.seq"])
+    board_xa = selected_runs(db_filename, sequence_files=["BoardXA"])
+    assert board_a and board_xa
+    assert not {run.ID for run in board_a} & {run.ID for run in board_xa}
+
+    output_folder = tmp_path / "output"
+    run_filter = RunFilter(sequence_files=["Board_A"])
+    assert (
+        ts_db.main(
+            str(db_filename), output_folder=str(output_folder), run_filter=run_filter
+        )
+        == 1
+    )
+    assert [p.name for p in output_folder.glob("*.csv")] == ["Test Data Board_A.csv"]
+
+    # Sequence files only called from other sequence files are not routed to
+    assert selected_runs(db_filename, sequence_files=["Common 1"]) == []
+
+
+def test_access_like_patterns():
+    run_filter = RunFilter(serial_numbers=["SN_1*", "[5]%?"], sequence_files=["B_A"])
+
+    # Access SQL has no ESCAPE clause; wildcards are escaped in brackets
+    predicates, params = run_filter.run_predicates("access")
+    assert not any("ESCAPE" in predicate for predicate in predicates)
+    assert params == ["SN[_]1%", "[[]5][%]_", "%B[_]A.seq"]
+
+    predicates, params = run_filter.run_predicates("sqlite")
+    assert all("ESCAPE" in predicate for predicate in predicates)
+    assert params == ["SN\\_1%", "[5]\\%_", "%B\\_A.seq"]
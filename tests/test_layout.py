@@ -0,0 +1,57 @@
+from database import LayoutCache, Row, build_record
+
+STEP_COLUMNS = {
+    name: i
+    for i, name in enumerate(
+        ["STEP_NAME", "STEP_TYPE", "STATUS", "TYPE_NAME", "DATA", "COP", "LL", "HL"]
+        + ["UNITS", "NAME"]
+    )
+}
+RUN_COLUMNS = {
+    name: i
+    for i, name in enumerate(
+        ["ID", "STATION_ID", "START_DATE_TIME", "EXECUTION_TIME"]
+        + ["TEST_SOCKET_INDEX", "UUT_SERIAL_NUMBER", "UUT_STATUS"]
+    )
+}
+
+
+def numeric_step(name, data, status="Passed", cop="GELE"):
+    values = [name, "NumericLimitTest", status, "NumericLimitTest", data, cop]
+    return Row(STEP_COLUMNS, values + [1.0, 2.0, "V", "Numeric"])
+
+
+def make_run(run_id):
+    return Row(
+        RUN_COLUMNS, [run_id, "STATION1", "2023-01-01", 12.4, 0, "SN1", "Passed"]
+    )
+
+
+def test_layout_cache():
+    cache = LayoutCache(max_size=2)
+    steps = [numeric_step("Vcc", "1.23456"), numeric_step("Vcc", "1.5")]
+
+    first = build_record(make_run(1), steps, cache)
+    second = build_record(make_run(2), steps, cache)
+
+    # Runs with the same step signature share one layout
+    assert first.layout is second.layout
+    assert first.layout.columns[-2:] == (
+        "Vcc (V) 1.0 <= x <= 2.0 [0]",
+        "Vcc (V) 1.0 <= x <= 2.0 [1]",
+    )
+    assert first.values[-2:] == (1.235, 1.5)
+    assert first.values[5] == 12
+
+    # Skipped steps are not part of the signature
+    skipped = build_record(make_run(3), steps + [numeric_step("Icc", "0", "Skipped")])
+    assert skipped.layout.columns == first.layout.columns
+
+    # Unknown comparison types end the measurements of the run
+    stopped = build_record(make_run(4), [steps[0], numeric_step("Icc", "1", cop="X")])
+    assert len(stopped.values) == len(first.values) - 1
+
+    # The cache starts over when full
+    layout = cache.get((("Icc", "A", "LT", 0.5, None),))
+    cache.get((("Iq", "A", "LT", 0.5, None),))
+    assert cache.get((("Icc", "A", "LT", 0.5, None),)) is not layout
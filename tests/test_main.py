@@ -0,0 +1,104 @@
+import sqlite3
+
+import bench_cold_start
+import bench_pipeline
+import main
+from database.backends import make_cursor, open_connection
+from synthetic import generate_database
+
+
+def extract(db_filename, output_folder, memory_budget):
+    # SQLite stand-in for the ODBC connection of main.connect_odbc
+    crsr = make_cursor(open_connection(str(db_filename), "sqlite"))
+    try:
+        return main.extract(crsr, str(output_folder), memory_budget)
+    finally:
+        crsr.close()
+
+
+def test_output_tables_spill():
+    tables = main.create_table_dict(["A", "B"], memory_budget=2000)
+    for i in range(20):
+        tables.append("A", {"Serial Number": f"SN{i}", "Vcc": 1.5})
+        if i % 5 == 0:
+            tables.append("B", {"Serial Number": f"SN{i}", "Icc": 0.1 * i})
+
+    # Rows past the budget are moved to disk; they are read back first, in order
+    assert set(tables.spills) == {"A", "B"}
+    assert len(tables["A"]) < 20
+    rows = [data for chunk in tables.chunks("A") for data in chunk]
+    assert [data["Serial Number"] for data in rows] == [f"SN{i}" for i in range(20)]
+    assert tables.column_names("B") == ["Serial Number", "Icc"]
+    tables.close()
+
+
+def test_memory_budget_spill(tmp_path):
+    db_filename = tmp_path / "test.db"
+    generate_database(db_filename, runs=200, steps_per_run=6, nesting_depth=2)
+
+    exported = extract(db_filename, tmp_path / "memory", main.MEMORY_BUDGET)
+    spilled = extract(db_filename, tmp_path / "spilled", 16 * 1024)
+
+    # Spilling the tables to disk does not change the exported files
+    assert spilled == exported
+    for filename in exported:
+        assert (
+            tmp_path.joinpath("spilled", filename).read_bytes()
+            == tmp_path.joinpath("memory", filename).read_bytes()
+        )
+
+
+def test_bulk_steps_out_of_order_ids(tmp_path, monkeypatch):
+    db_filename = tmp_path / "test.db"
+    generate_database(db_filename, runs=101, steps_per_run=4, terminated_rate=0)
+
+    # Run IDs out of start time order, as in a merged database
+    cnxn = sqlite3.connect(db_filename)
+    cnxn.execute(
+        "UPDATE UUT_RESULT SET START_DATE_TIME = "
+        "datetime('2023-01-01 08:00:00', '+' || ((ID * 37) % 101) || ' minutes')"
+    )
+    cnxn.commit()
+    cnxn.close()
+
+    crsr = make_cursor(open_connection(str(db_filename), "sqlite"))
+    ranges = []
+    query_run_steps = main.query_run_steps
+
+    def recording_query(crsr, first_id, last_id):
+        ranges.append((first_id, last_id))
+        return query_run_steps(crsr, first_id, last_id)
+
+    try:
+        sequence_calls = main.query_seq_calls(crsr)
+        seq_list = main.create_sequence_list(sequence_calls)
+        uut_runs = main.query_uut_runs(crsr)
+        assert [run.ID for run in uut_runs] != sorted(run.ID for run in uut_runs)
+
+        bulk = main.create_table_dict(seq_list)
+        with monkeypatch.context() as patch:
+            patch.setattr(main, "query_run_steps", recording_query)
+            main.generate_test_table_bulk(
+                crsr, uut_runs, bulk, sequence_calls, chunk_size=10
+            )
+
+        # Per-run queries of the original implementation
+        per_run = main.create_table_dict(seq_list)
+        main.generate_test_table(crsr, uut_runs, per_run, sequence_calls)
+    finally:
+        crsr.close()
+
+    # Each step query covers the ID range of one chunk only
+    assert len(ranges) == 11
+    assert all(last - first < 10 for first, last in ranges)
+    for seq_name in seq_list:
+        assert bulk[seq_name] == per_run[seq_name]
+
+
+def test_cold_start(tmp_path):
+    # The wall time budget is checked by the benchmark only, not by the unit tests
+    db_filename = bench_pipeline.database_file(tmp_path, 200, 8, 1)
+    result = bench_cold_start.run_benchmark(db_filename)
+
+    assert result["csv_files"] == 2
+    assert result["heavy_modules"] == []
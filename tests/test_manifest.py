@@ -0,0 +1,62 @@
+import csv
+
+import main
+import ts_db
+from file_io import ColumnManifest, iter_table, read_table
+from synthetic import generate_database
+
+
+def read_rows(csv_file):
+    with open(csv_file, newline="") as f:
+        return list(csv.reader(f))
+
+
+def test_append_new_columns(tmp_path):
+    output_folder = tmp_path / "output"
+    for steps_per_run in (3, 4, 3):
+        db_filename = tmp_path / f"test-{steps_per_run}.db"
+        generate_database(
+            db_filename, runs=20, steps_per_run=steps_per_run, sequence_files=1
+        )
+        ts_db.main(str(db_filename), output_folder=str(output_folder))
+
+    csv_file = next(output_folder.glob("*.csv"))
+    manifest = ColumnManifest(csv_file)
+    first, second = manifest.segment_files()
+
+    # The step added by the second extraction rolled the CSV file over
+    assert first.parent.name == ".segments"
+    assert second == csv_file
+    assert read_rows(csv_file)[0] == manifest.columns
+    assert len(read_rows(first)[0]) == len(manifest.columns) - 1
+    assert [segment["rows"] for segment in manifest.segments] == [20, 40]
+
+    header, *rows = iter_table(csv_file)
+    assert header == manifest.columns
+    assert len(rows) == 60
+    assert all(row[-1] == "" for row in rows[:20] + rows[40:])
+    assert any(row[-1] != "" for row in rows[20:40])
+    assert read_table(csv_file).shape == (60, len(header))
+
+
+def test_stand_alone_manifest(tmp_path):
+    # main.py keeps its own copy of ColumnManifest; both read each other's manifests
+    for columns in (["Serial Number", "Vcc"], ["Serial Number", "Vcc", "Icc"]):
+        tables = main.create_table_dict(["Test Data A"])
+        for i in range(3):
+            tables.append("Test Data A", {name: f"{name}{i}" for name in columns})
+        main.write_results(["Test Data A"], tables, tmp_path)
+
+    csv_file = tmp_path / "Test Data A.csv"
+    manifest = ColumnManifest(csv_file)
+    assert manifest.columns == ["Serial Number", "Vcc", "Icc"]
+    assert [segment["rows"] for segment in manifest.segments] == [3, 3]
+
+    header, *rows = iter_table(csv_file)
+    assert rows[0] == ["Serial Number0", "Vcc0", ""]
+    assert rows[5] == ["Serial Number2", "Vcc2", "Icc2"]
+
+    # Appends of the package export continue the same manifest
+    manifest.prepare(["Serial Number", "Vcc", "Icc", "Iq"])
+    manifest.save()
+    assert len(main.ColumnManifest(csv_file).segments) == 3
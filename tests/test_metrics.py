@@ -0,0 +1,80 @@
+import json
+import time
+
+import ts_db
+from file_io import PipelineMetrics, folder_size
+from synthetic import generate_database
+
+
+def test_stage_excludes_inner_stages():
+    metrics = PipelineMetrics()
+    with metrics.stage("outer", exclude=["inner"]):
+        with metrics.stage("inner"):
+            time.sleep(0.05)
+
+    report = metrics.report()["stages"]
+    assert report["inner"]["wall_s"] >= 0.05
+    assert report["outer"]["wall_s"] < 0.05
+
+
+def test_run_report(tmp_path):
+    db_filename = tmp_path / "test.db"
+    output_folder = tmp_path / "output"
+    generate_database(db_filename, runs=30, steps_per_run=3, terminated_rate=0)
+
+    metrics = PipelineMetrics(profile_interval=0.001, job="job1")
+    ts_db.main(str(db_filename), output_folder=str(output_folder), metrics=metrics)
+
+    report = metrics.report()
+    assert report["labels"] == {"job": "job1", "database": "test.db"}
+    stages = report["stages"]
+    assert stages["query_uut_runs"]["rows"] == 30
+    assert stages["step_queries"]["rows"] == 90
+    assert stages["transform"]["calls"] == 30
+    # The watermark is saved after the export
+    watermark_size = output_folder.joinpath(".watermarks.json").stat().st_size
+    assert stages["export"]["bytes_written"] == (
+        folder_size(output_folder) - watermark_size
+    )
+
+    prometheus = metrics.prometheus()
+    assert (
+        'ts_extract_stage_rows{stage="step_queries",job="job1",database="test.db"} 90'
+        in prometheus
+    )
+
+    report_file = metrics.save(tmp_path / "reports" / "run.json", prometheus=True)
+    assert json.loads(report_file.read_text())["stages"] == stages
+    assert report_file.with_suffix(".prom").read_text() == prometheus
+
+
+def test_bytes_written_subfolders(tmp_path):
+    output_folder = tmp_path / "output"
+    watermark_file = output_folder / ".watermarks.json"
+
+    def watermark_size():
+        return watermark_file.stat().st_size if watermark_file.is_file() else 0
+
+    def tree_size():
+        return sum(p.stat().st_size for p in output_folder.rglob("*") if p.is_file())
+
+    for steps_per_run in (3, 4):
+        db_filename = tmp_path / f"test-{steps_per_run}.db"
+        generate_database(
+            db_filename, runs=20, steps_per_run=steps_per_run, sequence_files=1
+        )
+        size = tree_size() - watermark_size()
+        metrics = PipelineMetrics()
+        ts_db.main(
+            str(db_filename),
+            output_folder=str(output_folder),
+            formats=("csv", "parquet"),
+            metrics=metrics,
+        )
+
+        # Parquet part files and the CSV file rolled over (by the new step) count
+        written = tree_size() - watermark_size() - size
+        assert metrics.report()["stages"]["export"]["bytes_written"] == written
+
+    assert list(output_folder.glob(".segments/*.csv"))
+    assert list(output_folder.glob("*.parquet/*"))
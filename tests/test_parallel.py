@@ -0,0 +1,33 @@
+import ts_db
+from parallel import split_partitions
+from synthetic import generate_database
+
+
+def test_split_partitions():
+    partitions = split_partitions(list(range(10)), 4)
+
+    assert partitions == [[0, 1, 2], [3, 4, 5], [6, 7, 8], [9]]
+    assert split_partitions([], 4) == []
+
+
+def test_parallel_matches_serial(tmp_path):
+    db_filename = tmp_path / "test.db"
+    generate_database(db_filename, runs=300, steps_per_run=4, sequence_files=3)
+
+    formats = ("csv", "long", "stats")
+    ts_db.main(
+        str(db_filename), output_folder=str(tmp_path / "serial"), formats=formats
+    )
+    ts_db.main(
+        str(db_filename),
+        output_folder=str(tmp_path / "parallel"),
+        workers=2,
+        formats=formats,
+    )
+
+    serial = sorted(p.name for p in tmp_path.joinpath("serial").iterdir())
+    assert serial == sorted(p.name for p in tmp_path.joinpath("parallel").iterdir())
+    for name in serial:
+        if name.endswith((".csv", ".stats.json")):
+            expected = tmp_path.joinpath("serial", name).read_bytes()
+            assert tmp_path.joinpath("parallel", name).read_bytes() == expected
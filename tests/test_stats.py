@@ -0,0 +1,72 @@
+import json
+import math
+
+import pytest
+
+import ts_db
+from database import connection_pool
+from file_io import ColumnStats, HistogramSketch, stats_file
+from synthetic import generate_database
+
+VCC = ("Vcc", "V", "GELE", 1.0, 2.0, 0)
+
+
+def test_column_stats_merge():
+    values = [1.1, 1.5, 2.5, 1.25, 0.5, 1.75]
+    whole = ColumnStats(VCC)
+    first, second = ColumnStats(VCC), ColumnStats(VCC)
+    for i, val in enumerate(values):
+        whole.add(val)
+        (first if i < 2 else second).add(val)
+    first.merge(second)
+
+    assert first.count == 6 and first.fail_count == 2
+    assert first.mean == pytest.approx(whole.mean)
+    assert first.std() == pytest.approx(whole.std())
+    assert (first.min, first.max) == (0.5, 2.5)
+    assert first.histogram.bins == whole.histogram.bins
+
+
+def test_column_stats_nonfinite():
+    stats = ColumnStats(VCC)
+    for val in [1.5, math.nan, math.inf, -math.inf, 1.7]:
+        stats.add(val)
+
+    # Non-finite values are counted but left out of the statistics
+    assert stats.count == 2 and stats.nonfinite_count == 3
+    assert stats.mean == pytest.approx(1.6)
+    assert sum(stats.histogram.bins.values()) == 2
+
+    data = ColumnStats.from_json(json.loads(json.dumps(stats.to_json())))
+    assert data.nonfinite_count == 3
+
+    sketch = HistogramSketch()
+    sketch.add(math.nan)
+    assert not sketch.bins
+
+
+def test_stats_merged_across_incremental_runs(tmp_path):
+    db_filename = tmp_path / "test.db"
+    generate_database(db_filename, runs=20, steps_per_run=3, terminated_rate=0)
+    options = {"incremental": True, "formats": ("csv", "stats")}
+
+    ts_db.main(str(db_filename), output_folder=str(tmp_path / "inc"), **options)
+    generate_database(db_filename, runs=50, steps_per_run=3, terminated_rate=0)
+    connection_pool.discard(str(db_filename))
+    ts_db.main(str(db_filename), output_folder=str(tmp_path / "inc"), **options)
+    ts_db.main(str(db_filename), output_folder=str(tmp_path / "full"), **options)
+
+    # The statistics of both runs summarize the same rows as one full run
+    csv_files = sorted(tmp_path.joinpath("full").glob("*.csv"))
+    assert csv_files
+    for csv_file in csv_files:
+        full = json.loads(stats_file(csv_file).read_text())["columns"]
+        inc = json.loads(stats_file(tmp_path / "inc" / csv_file.name).read_text())[
+            "columns"
+        ]
+        assert inc.keys() == full.keys()
+        for name, column in full.items():
+            assert inc[name]["count"] == column["count"]
+            assert inc[name]["fail_count"] == column["fail_count"]
+            assert inc[name]["mean"] == pytest.approx(column["mean"])
+            assert inc[name]["std"] == pytest.approx(column["std"], nan_ok=True)
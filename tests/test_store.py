@@ -0,0 +1,119 @@
+import sqlite3
+
+import batch
+import ts_db
+from file_io import ResultStore, store_file, watermark_key
+from synthetic import generate_database
+
+
+def test_result_store(tmp_path):
+    db_filename = tmp_path / "test.db"
+    generate_database(db_filename, runs=60, steps_per_run=4, terminated_rate=0)
+
+    output_folder = tmp_path / "output"
+    for incremental in (False, True):
+        ts_db.main(
+            str(db_filename),
+            incremental=incremental,
+            output_folder=str(output_folder),
+            formats=("csv", "store"),
+        )
+
+    store = ResultStore(output_folder)
+    runs = store.runs()
+    assert len(runs) == 60
+    assert [run["start_time"] for run in runs] == sorted(
+        (run["start_time"] for run in runs), reverse=True
+    )
+
+    run = runs[-1]
+    measurements = store.measurements(serial_number=run["serial_number"])
+    assert len(measurements) == 4
+    assert {m["uut_result"] for m in measurements} == {run["uut_result"]}
+    assert len(store.runs(serial_number=run["serial_number"][:-1] + "?")) >= 1
+
+    failures = store.measurements(
+        station=run["station_id"], start=run["start_time"], step_status="Failed"
+    )
+    assert all(m["station_id"] == run["station_id"] for m in failures)
+    assert all(m["start_time"] >= run["start_time"] for m in failures)
+    assert all(m["status"] == "Failed" for m in failures)
+
+    assert store.runs(limit=5, status="Passed")[4]["status"] == "Passed"
+    assert ResultStore(tmp_path / "none").runs() == []
+
+
+def test_store_reexport_and_sources(tmp_path):
+    first, second = tmp_path / "station1.db", tmp_path / "station2.db"
+    generate_database(first, runs=20, steps_per_run=3, terminated_rate=0)
+    generate_database(second, runs=10, steps_per_run=3, terminated_rate=0, seed=2)
+    output_folder = tmp_path / "output"
+    options = {"output_folder": str(output_folder), "formats": ("csv", "store")}
+
+    # Exporting a database again replaces its runs and measurements
+    ts_db.main(str(first), **options)
+    store = ResultStore(output_folder)
+    measurement_count = len(store.measurements())
+    ts_db.main(str(first), **options)
+    assert len(store.runs()) == 20
+    assert len(store.measurements()) == measurement_count
+
+    # The same UUT_RESULT IDs of another database are other runs
+    ts_db.main(str(second), **options)
+    runs = store.runs()
+    assert len(runs) == 30
+    assert {run["source"] for run in runs if run["uut_result"] == 1} == {
+        watermark_key(first),
+        watermark_key(second),
+    }
+    assert len(store.measurements()) > measurement_count
+
+
+def test_batch_store_sources(tmp_path):
+    source_folder = tmp_path / "stations"
+    source_folder.mkdir()
+    for name in ["a.db", "b.db"]:
+        generate_database(
+            source_folder / name, runs=15, steps_per_run=3, terminated_rate=0
+        )
+
+    # Other UUTs, with the same UUT_RESULT IDs (runs copied between stations are dropped)
+    cnxn = sqlite3.connect(source_folder / "b.db")
+    cnxn.execute("UPDATE UUT_RESULT SET UUT_SERIAL_NUMBER = 'B' || UUT_SERIAL_NUMBER")
+    cnxn.commit()
+    cnxn.close()
+    output_folder = tmp_path / "output"
+
+    batch.main(source_folder, output_folder, workers=2, formats=("csv", "store"))
+    runs = ResultStore(output_folder).runs()
+    assert len(runs) == 30
+    assert {run["source"] for run in runs} == {
+        watermark_key(source_folder / "a.db"),
+        watermark_key(source_folder / "b.db"),
+    }
+
+
+def test_store_without_sources(tmp_path):
+    # Stores loaded before runs had a source database are upgraded in place
+    output_folder = tmp_path / "output"
+    output_folder.mkdir()
+    cnxn = sqlite3.connect(store_file(output_folder))
+    cnxn.execute(
+        "CREATE TABLE runs (id INTEGER PRIMARY KEY, uut_result INTEGER, sequence TEXT, "
+        "serial_number TEXT, station_id TEXT, start_time TEXT, test_socket INTEGER, "
+        "status TEXT, test_time REAL)"
+    )
+    cnxn.execute(
+        "INSERT INTO runs VALUES (1, 1, 'Test Data A', 'SN1', 'STATION1', "
+        "'2022-01-01 08:00:00', 0, 'Passed', 10.0)"
+    )
+    cnxn.commit()
+    cnxn.close()
+
+    db_filename = tmp_path / "test.db"
+    generate_database(db_filename, runs=10, steps_per_run=3, terminated_rate=0)
+    ts_db.main(str(db_filename), output_folder=str(output_folder), formats=["store"])
+
+    runs = ResultStore(output_folder).runs()
+    assert len(runs) == 11
+    assert runs[-1]["source"] is None
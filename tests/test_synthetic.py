@@ -0,0 +1,96 @@
+import csv
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT.joinpath("src", "ts_data_extractor")))
+sys.path.insert(0, str(ROOT.joinpath("benchmarks")))
+
+import bench_pipeline
+import ts_db
+from synthetic import generate_database
+
+
+def read_rows(csv_file):
+    with open(csv_file, newline="") as f:
+        return list(csv.reader(f))
+
+
+def test_generate_database(tmp_path):
+    counts = generate_database(tmp_path / "test.db", runs=50, steps_per_run=6)
+
+    assert counts["UUT_RESULT"] == 50
+    assert counts["PROP_NUMERICLIMIT"] == 50 * 6
+    assert counts["STEP_SEQCALL"] == 50
+
+
+def test_pipeline_on_synthetic_database(tmp_path):
+    db_filename = tmp_path / "test.db"
+    generate_database(
+        db_filename,
+        runs=200,
+        steps_per_run=6,
+        sequence_files=3,
+        distinct_steps=4,
+        nesting_depth=2,
+        terminated_rate=0.1,
+    )
+
+    output_folder = tmp_path / "output"
+    ts_db.main(str(db_filename), output_folder=str(output_folder))
+
+    with ts_db.connection_pool.cursor(str(db_filename)) as crsr:
+        run_count = len(ts_db.query_uut_runs(crsr))
+
+    data_rows = 0
+    for csv_file in output_folder.glob("*.csv"):
+        rows = read_rows(csv_file)
+        if rows:
+            header, *rows = rows
+            # Repeated step names get a column per repetition
+            assert len(header) == len(set(header))
+            data_rows += len(rows)
+
+    assert 0 < run_count < 200
+    assert data_rows == run_count
+
+
+def test_all_measurement_types(tmp_path):
+    db_filename = tmp_path / "test.db"
+    generate_database(db_filename, runs=40, steps_per_run=3, other_steps=True)
+
+    output_folder = tmp_path / "output"
+    ts_db.main(
+        str(db_filename),
+        output_folder=str(output_folder),
+        formats=("csv", "parquet"),
+        all_types=True,
+    )
+
+    csv_file = next(output_folder.glob("*.csv"))
+    header, *rows = read_rows(csv_file)
+    assert {
+        "Self Test (Pass/Fail) [0]",
+        "Firmware Version (String) [0]",
+        "Rails.3V3 (V) 3.2 <= x <= 3.4 [0]",
+        "Rails.5V (V) 4.9 <= x <= 5.1 [0]",
+    } <= set(header)
+    pass_fail = header.index("Self Test (Pass/Fail) [0]")
+    assert {row[pass_fail] for row in rows} <= {"True", "False"}
+
+    import pyarrow.parquet as pq
+
+    schema = pq.read_schema(next(csv_file.with_suffix(".parquet").iterdir()))
+    assert str(schema.field("Self Test (Pass/Fail) [0]").type) == "bool"
+    assert str(schema.field("Firmware Version (String) [0]").type) == "string"
+    assert str(schema.field("Rails.5V (V) 4.9 <= x <= 5.1 [0]").type) == "double"
+
+
+def test_benchmark(tmp_path):
+    db_filename = bench_pipeline.database_file(tmp_path, 100, 4, 1)
+    result = bench_pipeline.extract(db_filename, tmp_path / "output")
+
+    assert result["runs"] > 0
+    assert result["runs_per_sec"] > 0
+    assert {"step_queries", "transform", "export"} <= set(result["stages"])
+    assert not bench_pipeline.compare({100: result}, {"100": result}, 0.2)
@@ -0,0 +1,73 @@
+import csv
+
+import ts_db
+from database import RunFilter, connection_pool
+from file_io import load_watermark
+from synthetic import generate_database
+
+
+def read_rows(csv_file):
+    with open(csv_file, newline="") as f:
+        return list(csv.reader(f))
+
+
+def data_rows(output_folder):
+    return sum(len(read_rows(p)) - 1 for p in output_folder.glob("Test Data *.csv"))
+
+
+def test_incremental_export(tmp_path):
+    db_filename = tmp_path / "test.db"
+    output_folder = tmp_path / "output"
+    generate_database(db_filename, runs=30, steps_per_run=3, terminated_rate=0)
+
+    ts_db.main(str(db_filename), incremental=True, output_folder=str(output_folder))
+    assert data_rows(output_folder) == 30
+    assert load_watermark(db_filename, output_folder)["ID"] == 30
+
+    # Nothing new: the tables and the watermark are unchanged
+    ts_db.main(str(db_filename), incremental=True, output_folder=str(output_folder))
+    assert data_rows(output_folder) == 30
+
+    # Only the runs after the watermark are appended, after a single header
+    generate_database(db_filename, runs=50, steps_per_run=3, terminated_rate=0)
+    connection_pool.discard(str(db_filename))
+    ts_db.main(str(db_filename), incremental=True, output_folder=str(output_folder))
+    assert data_rows(output_folder) == 50
+    assert load_watermark(db_filename, output_folder)["ID"] == 50
+    for csv_file in output_folder.glob("Test Data *.csv"):
+        header, *rows = read_rows(csv_file)
+        assert header[0] not in {row[0] for row in rows}
+
+    # Other databases have watermarks of their own
+    assert load_watermark(tmp_path / "other.db", output_folder) is None
+
+
+def serial_numbers(output_folder):
+    serials = []
+    for csv_file in output_folder.glob("Test Data *.csv"):
+        header, *rows = read_rows(csv_file)
+        serials.extend(row[header.index("Serial Number")] for row in rows)
+    return serials
+
+
+def test_filtered_export_keeps_watermark(tmp_path):
+    db_filename = tmp_path / "test.db"
+    output_folder = tmp_path / "output"
+    generate_database(db_filename, runs=40, steps_per_run=3, terminated_rate=0)
+    options = {"incremental": True, "output_folder": str(output_folder)}
+
+    # Filtered exports record the runs they exported instead of the watermark
+    run_filter = RunFilter(stations=["STATION4"])
+    for _ in range(3):
+        ts_db.main(str(db_filename), run_filter=run_filter, **options)
+        assert data_rows(output_folder) == 10
+    watermark = load_watermark(db_filename, output_folder)
+    assert watermark["ID"] is None and len(watermark["exported"]) == 10
+
+    # The runs of the other stations are still exported by the next export, once
+    ts_db.main(str(db_filename), **options)
+    serials = serial_numbers(output_folder)
+    assert len(serials) == 40
+    assert sorted(serials) == [f"SN{run_id:08d}" for run_id in range(1, 41)]
+    watermark = load_watermark(db_filename, output_folder)
+    assert watermark["ID"] == 40 and "exported" not in watermark
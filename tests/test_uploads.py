@@ -0,0 +1,46 @@
+import io
+import os
+
+import pytest
+
+from uploads import HEADER_SIZE, InvalidUpload, UploadSessions
+from uploads import parse_content_range
+
+SQLITE_HEADER = b"SQLite format 3\x00".ljust(HEADER_SIZE, b"\x00")
+
+
+def test_parse_content_range():
+    assert parse_content_range(None) is None
+    assert parse_content_range("bytes 1024-2047/4096") == 1024
+    with pytest.raises(InvalidUpload):
+        parse_content_range("items 0-1/2")
+
+
+def test_upload_sessions_resume(tmp_path):
+    sessions = UploadSessions(tmp_path, max_bytes=1024)
+    upload_id = sessions.create("test.db")
+    sessions.get(upload_id).write_stream(io.BytesIO(SQLITE_HEADER), 0)
+
+    # Partial uploads are picked up again after a restart
+    restarted = UploadSessions(tmp_path, max_bytes=1024)
+    writer = restarted.get(upload_id)
+    assert writer.offset == HEADER_SIZE and writer.db_type == "sqlite"
+
+    with pytest.raises(InvalidUpload):
+        writer.write_stream(io.BytesIO(b"\x00" * 1024))
+
+    assert restarted.get("../partial") is None
+
+
+def test_upload_sessions_prune(tmp_path):
+    sessions = UploadSessions(tmp_path, max_age=60)
+    old_id = sessions.create("old.db")
+    file_path = sessions.get(old_id).file_path
+    os.utime(file_path, (0, 0))
+
+    # Stray files next to the upload folders are left alone
+    sessions.folder.joinpath("notes.txt").write_text("")
+
+    new_id = sessions.create("new.db")
+    assert not file_path.exists()
+    assert sessions.get(new_id) is not None
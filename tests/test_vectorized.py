@@ -0,0 +1,100 @@
+import sqlite3
+
+import pytest
+
+import ts_db
+from database import Row, measure_steps
+from synthetic import generate_database
+
+pd = pytest.importorskip("pandas")
+
+from database.vectorized import transform_steps  # noqa: E402
+
+STEP_COLUMNS = [
+    "UUT_RESULT",
+    "STEP_PARENT",
+    "STEP_NAME",
+    "STEP_TYPE",
+    "STATUS",
+    "TYPE_NAME",
+    "DATA",
+    "COP",
+    "LL",
+    "HL",
+    "UNITS",
+]
+
+STEPS = [
+    [1, 0, "Vcc", "NumericLimitTest", "Passed", "NumericLimitTest", "1.23456"]
+    + ["GELE", 1.0, 2.0, "V"],
+    [1, 0, "Ready", "NumericLimitTest", "Passed", "Boolean", "False"]
+    + ["EQ", 0.0, None, ""],
+    [1, 0, "Armed", "NumericLimitTest", "Passed", "Boolean", "True"]
+    + ["EQ", 1.0, None, ""],
+    [1, 0, "Icc", "NumericLimitTest", "Skipped", "NumericLimitTest", "0"]
+    + ["LT", 0.5, None, "A"],
+    [1, 0, "Temp", "NumericLimitTest", "Failed", "NumericLimitTest", "bad"]
+    + ["GT", 20.0, None, "C"],
+    [1, 0, "Noise", "NumericLimitTest", "Failed", "NumericLimitTest", "NaN"]
+    + ["LT", 0.1, None, "V"],
+    [1, 0, "Drift", "NumericLimitTest", "Failed", "NumericLimitTest", float("nan")]
+    + ["LT", 0.1, None, "V"],
+    [1, 0, "Offset", "NumericLimitTest", "Passed", "NumericLimitTest", None]
+    + ["LT", 0.1, None, "V"],
+    [2, 0, "Vcc", "NumericLimitTest", "Passed", "NumericLimitTest", "1.5"]
+    + ["GELE", 1.0, 2.0, "V"],
+    [2, 0, "Gain", "NumericLimitTest", "Passed", "NumericLimitTest", "3"]
+    + ["XX", 1.0, 2.0, "dB"],
+    [2, 0, "Ripple", "NumericLimitTest", "Passed", "NumericLimitTest", "3"]
+    + ["LT", 5.0, None, "mV"],
+]
+
+
+def test_transform_matches_scalar():
+    measured = transform_steps(pd.DataFrame(STEPS, columns=STEP_COLUMNS))
+
+    columns = {name: i for i, name in enumerate(STEP_COLUMNS)}
+    for run_id in (1, 2):
+        run_steps = [Row(columns, step) for step in STEPS if step[0] == run_id]
+        signature, values, statuses, step = measure_steps(run_steps)
+
+        rows = measured[measured["UUT_RESULT"] == run_id]
+        keys = rows[["STEP_NAME", "UNITS", "COP", "LL", "HL"]].itertuples(index=False)
+        assert [tuple(key) for key in keys] == list(signature)
+
+        # Same values as written to the CSV files (Booleans as 0/1)
+        assert [str(val) for val in rows["VALUE"]] == [str(val) for val in values]
+        assert rows["STATUS"].tolist() == statuses
+
+
+def test_vectorized_export_matches_serial(tmp_path):
+    db_filename = tmp_path / "test.db"
+    generate_database(db_filename, runs=200, steps_per_run=5, sequence_files=2)
+
+    ts_db.main(str(db_filename), output_folder=str(tmp_path / "serial"))
+    ts_db.main(str(db_filename), output_folder=str(tmp_path / "vec"), vectorized=True)
+
+    for csv_file in tmp_path.joinpath("serial").glob("*.csv"):
+        vectorized = tmp_path.joinpath("vec", csv_file.name).read_bytes()
+        assert vectorized == csv_file.read_bytes()
+
+
+def test_vectorized_export_missing_data(tmp_path):
+    db_filename = tmp_path / "test.db"
+    generate_database(db_filename, runs=100, steps_per_run=5, sequence_files=2)
+
+    # NaN results are measurements, NULL results are not
+    cnxn = sqlite3.connect(db_filename)
+    cnxn.execute("UPDATE PROP_RESULT SET DATA = 'NaN' WHERE ID % 7 = 0")
+    cnxn.execute("UPDATE PROP_RESULT SET DATA = NULL WHERE ID % 11 = 0")
+    cnxn.commit()
+    cnxn.close()
+
+    ts_db.main(str(db_filename), output_folder=str(tmp_path / "serial"))
+    ts_db.main(str(db_filename), output_folder=str(tmp_path / "vec"), vectorized=True)
+
+    csv_files = list(tmp_path.joinpath("serial").glob("*.csv"))
+    assert any(b",nan" in csv_file.read_bytes() for csv_file in csv_files)
+    for csv_file in csv_files:
+        vectorized = tmp_path.joinpath("vec", csv_file.name).read_bytes()
+        assert vectorized == csv_file.read_bytes()
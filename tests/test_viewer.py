@@ -0,0 +1,89 @@
+import csv
+import datetime
+
+from database import RunRecord, layout_cache
+from file_io import ColumnManifest, ResultTable, export_stream
+from file_io import list_result_files, open_result_table
+
+START = datetime.datetime(2023, 1, 1, 8, 0, 0)
+
+HEADER = [
+    "Test Start",
+    "Station ID",
+    "Serial Number",
+    "Test Socket",
+    "Test Status",
+    "Test Time (s)",
+    "Vcc (V) 1.0 <= x <= 2.0 [0]",
+]
+
+
+def make_row(i):
+    status = "Failed" if i % 4 == 0 else "Passed"
+    start = f"2023-01-01 08:{i:02d}:00"
+    return [start, f"STATION{i % 2 + 1}", f"SN{i:03d}", i % 3, status, 10 + i, 1.5]
+
+
+def write_rows(csv_file, rows, header=None):
+    with open(csv_file, "a", newline="") as f:
+        writer = csv.writer(f)
+        if header:
+            writer.writerow(header)
+        writer.writerows(rows)
+
+
+def test_result_table_paging(tmp_path):
+    csv_file = tmp_path / "Test Data A.csv"
+    write_rows(csv_file, [make_row(i) for i in range(25)], HEADER)
+    assert list_result_files(tmp_path) == ["Test Data A.csv"]
+
+    table = open_result_table(csv_file)
+    page = table.page(page=2, page_size=10, columns=["Serial Number"])
+    assert page["rows"] == [["SN020"], ["SN021"], ["SN022"], ["SN023"], ["SN024"]]
+    assert page["total_rows"] == 25
+
+    # Numeric columns sort as numbers, filters select on the indexed columns
+    page = table.page(page_size=3, sort="Test Time (s)", descending=True)
+    assert [row[2] for row in page["rows"]] == ["SN024", "SN023", "SN022"]
+    page = table.page(filters={"Test Status": "Failed", "Test Socket": ("1", "2")})
+    assert [row[2] for row in page["rows"]] == ["SN004", "SN008", "SN016", "SN020"]
+    assert page["matched_rows"] == 4
+
+    # Appended rows are indexed on the next page request, from the saved index too
+    write_rows(csv_file, [make_row(i) for i in range(25, 30)])
+    assert table.page(page=2, page_size=10)["total_rows"] == 30
+    reopened = ResultTable(csv_file)
+    reopened.refresh()
+    assert reopened.row_count == 30
+    assert reopened.page(page=2, page_size=10)["rows"][-1][2] == "SN029"
+
+
+def make_record(run_id, signature, values):
+    metadata = (START, "STATION1", f"SN{run_id:03d}", 0, "Passed", 12)
+    statuses = ("Passed",) * len(values)
+    return RunRecord(
+        layout_cache.get(signature), metadata + tuple(values), run_id, statuses
+    )
+
+
+def test_result_table_segments(tmp_path):
+    vcc = ("Vcc", "V", "GELE", 1.0, 2.0)
+    icc = ("Icc", "A", "LT", 0.5, None)
+    csv_file = tmp_path / "Test Data A.csv"
+    export_stream(
+        ["Test Data A"], [("Test Data A", make_record(1, (vcc,), [1.5]))], tmp_path
+    )
+    table = open_result_table(csv_file)
+    assert table.row_count == 1
+
+    # New columns roll the CSV file over; the table still holds every row
+    rows = [("Test Data A", make_record(i, (vcc, icc), [1.6, 0.25])) for i in (2, 3)]
+    export_stream(["Test Data A"], rows, tmp_path)
+    assert len(ColumnManifest(csv_file).segment_files()) == 2
+
+    page = table.page(columns=["Serial Number", "Icc (A) < 0.5 [0]"])
+    assert page["total_rows"] == 3
+    assert page["rows"] == [["SN001", ""], ["SN002", "0.25"], ["SN003", "0.25"]]
+    page = table.page(page_size=2, sort="Serial Number", descending=True)
+    assert [row[2] for row in page["rows"]] == ["SN003", "SN002"]
+    assert page["columns"] == ColumnManifest(csv_file).columns
@@ -0,0 +1,82 @@
+import csv
+import datetime
+
+from database import RunRecord, layout_cache
+from file_io import LONG_COLUMNS, LONG_FILE
+from file_io import SequenceWriter, export_results, export_stream
+
+START = datetime.datetime(2023, 1, 1, 8, 0, 0)
+
+
+def make_record(run_id, signature, values):
+    metadata = (START, "STATION1", f"SN{run_id:03d}", 0, "Passed", 12)
+    statuses = ("Passed",) * len(values)
+    return RunRecord(
+        layout_cache.get(signature), metadata + tuple(values), run_id, statuses
+    )
+
+
+VCC = ("Vcc", "V", "GELE", 1.0, 2.0)
+ICC = ("Icc", "A", "LT", 0.5, None)
+
+ROWS = [
+    ("Test Data A", make_record(1, (VCC,), [1.5])),
+    ("Test Data A", make_record(2, (VCC, ICC), [1.6, 0.25])),
+    ("Test Data B", make_record(3, (ICC, ICC), [0.1, 0.2])),
+    ("Test Data A", make_record(4, (VCC,), [1.7])),
+]
+
+
+def test_export_stream_matches_export_results(tmp_path):
+    seq_list = ["Test Data A", "Test Data B"]
+    assert export_stream(seq_list, ROWS, tmp_path / "stream") == 2
+
+    tbl_dict = {seq_name: [] for seq_name in seq_list}
+    for seq_name, record in ROWS:
+        tbl_dict[seq_name].append(record.as_dict())
+    export_results(seq_list, tbl_dict, tmp_path / "dict")
+
+    for seq_name in seq_list:
+        streamed = tmp_path.joinpath("stream", seq_name + ".csv").read_bytes()
+        assert streamed == tmp_path.joinpath("dict", seq_name + ".csv").read_bytes()
+
+    header, *lines = (
+        tmp_path.joinpath("stream", "Test Data A.csv").read_text().splitlines()
+    )
+    assert header.endswith("Vcc (V) 1.0 <= x <= 2.0 [0],Icc (A) < 0.5 [0]")
+    assert lines[0].endswith(",1.5,") and lines[2].endswith(",1.7,")
+
+
+def test_sequence_writer_segments(tmp_path):
+    # Rows spilled by another writer (e.g. a worker process) keep their order
+    other = SequenceWriter(None, spill_dir=tmp_path)
+    other.write(ROWS[1][1])
+    segment = other.detach()
+
+    writer = SequenceWriter(tmp_path / "Test Data A.csv")
+    writer.write(ROWS[0][1])
+    writer.add_segment(*segment)
+    writer.write(ROWS[3][1])
+    assert writer.row_count == 3
+    run_ids = [run_id for index, values, run_id, statuses in writer.iter_spill()]
+    assert run_ids == [1, 2, 4]
+    writer.close()
+
+
+def test_long_format(tmp_path):
+    # Unrelated CSV files are not counted as exported tables
+    tmp_path.joinpath("notes.csv").write_text("a,b\n")
+
+    seq_list = ["Test Data A", "Test Data B"]
+    assert export_stream(seq_list, ROWS, tmp_path, formats=("csv", "long")) == 2
+
+    with open(tmp_path / LONG_FILE, newline="") as f:
+        header, *rows = list(csv.reader(f))
+
+    # One row per measurement, in export order of the sequences
+    assert header == LONG_COLUMNS
+    assert len(rows) == sum(len(record.statuses) for seq_name, record in ROWS)
+    assert [row[0] for row in rows] == ["1", "2", "2", "4", "3", "3"]
+    assert rows[1][5:] == ["Vcc", "0", "V", "GELE", "1.0", "2.0", "1.6", "Passed"]
+    assert rows[4][4:7] == ["Test Data B", "Icc", "0"]
+    assert rows[5][6] == "1"